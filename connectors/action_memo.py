@@ -0,0 +1,95 @@
+"""
+Action Memo
+Execution-scoped memoization of idempotent connector action calls
+"""
+import json
+import threading
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ActionMemo:
+    """
+    Results of idempotent action calls made during one sequence execution
+
+    Keyed on the action, the credential set and the resolved
+    path/query/headers/body, so a second identical call (e.g. the same status
+    lookup on several parallel branches) reuses the first call's result instead
+    of going back to the network. Only successful results are kept, and
+    nothing outlives the execution.
+
+    The memo is shared by the branches of a parallel node. Calls with the same
+    key are serialized, so concurrent branches make the request once.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_sequence(cls, sequence):
+        """Create a memo using execution_config.memoizeActions, falling back to settings"""
+        execution_config = sequence.execution_config or {}
+        return cls(enabled=bool(execution_config.get(
+            'memoizeActions', getattr(settings, 'SEQUENCE_MEMOIZE_ACTIONS', False)
+        )))
+
+    def key_for(self, action, credential_set, resolved_input):
+        """
+        Memo key of a call, or None if the call must not be memoized
+
+        Args:
+            action: ConnectorAction being called
+            credential_set: CredentialSet used for the call (or None)
+            resolved_input: Resolved input dict (path, query, headers, body)
+        """
+        if not self.enabled or not action.idempotent:
+            return None
+        try:
+            params = json.dumps(resolved_input, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            # Non-JSON values have no stable key
+            return None
+        return (action.pk, getattr(credential_set, 'pk', None), params)
+
+    def call(self, key, execute):
+        """
+        Return the memoized result for key, or run execute() and remember it
+
+        Args:
+            key: Key from key_for() (None = always execute)
+            execute: Zero-argument callable making the actual call
+
+        Returns:
+            tuple: (result, hit) where hit tells whether the result came from the memo
+        """
+        if key is None:
+            return execute(), False
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                # Shallow copy so the calling node's result is its own dict
+                return dict(cached), True
+
+            result = execute()
+            with self._lock:
+                self.misses += 1
+                if result.get('success'):
+                    self._results[key] = result
+            return result, False
+
+    def stats(self):
+        """Hit and miss counters of this execution"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._results)}
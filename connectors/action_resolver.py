@@ -0,0 +1,120 @@
+"""
+Action Resolver
+Loads the connector actions, connectors and credential sets used by a sequence in one pass
+"""
+import threading
+from django.db.models import Q
+from .models import ConnectorAction, CredentialSet
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_id(value):
+    """Model ids arrive from the flow JSON as ints or strings"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ActionResolver:
+    """
+    Execution-scoped lookup of the objects action nodes need
+
+    On first use, loads every ConnectorAction referenced by the plan together
+    with its connector and credential (one query), then every referenced or
+    default CredentialSet of those credentials (one query). Action nodes then
+    resolve their action and credential set from memory instead of issuing
+    4-5 queries each.
+
+    Objects are not shared between executions, so credential changes (e.g.
+    refreshed OAuth2 tokens) are picked up by the next run.
+    """
+
+    def __init__(self, action_ids, credential_set_ids=()):
+        self._action_ids = {_normalize_id(action_id) for action_id in action_ids} - {None}
+        self._credential_set_ids = {_normalize_id(set_id) for set_id in credential_set_ids} - {None}
+        self._actions = None
+        self._credential_sets = {}
+        self._default_credential_sets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_plan(cls, plan):
+        """Create a resolver for the actions referenced by an ExecutionPlan"""
+        return cls(plan.action_ids, plan.credential_set_ids)
+
+    def get_action(self, action_id):
+        """
+        Get a ConnectorAction (with connector and credential loaded)
+
+        Returns:
+            ConnectorAction or None if it does not exist
+        """
+        self._ensure_loaded()
+        action_id = _normalize_id(action_id)
+        action = self._actions.get(action_id)
+        if action is None and action_id is not None and action_id not in self._action_ids:
+            # Not referenced by the compiled plan - look it up on its own
+            action = (
+                ConnectorAction.objects.select_related('connector__credential')
+                .filter(id=action_id).first()
+            )
+        return action
+
+    def get_credential_set(self, action, credential_set_id=None):
+        """
+        Get the credential set to use for an action
+
+        Mirrors ConnectorService.execute_action: the requested set if it belongs
+        to the connector's credential, otherwise the credential's default set.
+
+        Returns:
+            CredentialSet or None
+        """
+        self._ensure_loaded()
+        credential = action.connector.credential
+        if not credential:
+            return None
+
+        if credential_set_id:
+            credential_set = self._credential_sets.get(_normalize_id(credential_set_id))
+            if credential_set and credential_set.credential_id == credential.id:
+                return credential_set
+            logger.warning(f"Credential set {credential_set_id} not found, falling back to default")
+
+        return self._default_credential_sets.get(credential.id)
+
+    def _ensure_loaded(self):
+        """Load all referenced objects on first use"""
+        if self._actions is not None:
+            return
+        with self._lock:
+            if self._actions is not None:
+                return
+
+            actions = {}
+            if self._action_ids:
+                queryset = ConnectorAction.objects.select_related('connector__credential').filter(
+                    id__in=self._action_ids
+                )
+                actions = {action.id: action for action in queryset}
+
+            credential_ids = {
+                action.connector.credential_id for action in actions.values()
+                if action.connector.credential_id
+            }
+            if credential_ids or self._credential_set_ids:
+                credential_sets = CredentialSet.objects.filter(
+                    Q(id__in=self._credential_set_ids) | Q(credential_id__in=credential_ids, is_default=True)
+                )
+                for credential_set in credential_sets:
+                    self._credential_sets[credential_set.id] = credential_set
+                    if credential_set.is_default:
+                        self._default_credential_sets.setdefault(credential_set.credential_id, credential_set)
+
+            logger.info(
+                f"Resolved {len(actions)} action(s) and {len(self._credential_sets)} credential set(s) for execution"
+            )
+            self._actions = actions
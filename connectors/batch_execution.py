@@ -0,0 +1,305 @@
+"""
+Batch Execution
+Runs a sequence (or every sequence listening to an event) against many trigger
+payloads, writing execution rows and logs per chunk
+"""
+import json
+import threading
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .action_resolver import ActionResolver
+from .concurrency import admit_execution
+from .execution_log_buffer import ExecutionLogBuffer
+from .execution_recovery import heartbeat_ticker
+from .models import SequenceEventSubscription, SequenceExecution
+from .trigger_filters import filter_sequences, record_filtered
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Fields an execution changes between its batch insert and the end of the run
+_FINAL_EXECUTION_FIELDS = [
+    'status', 'completed_at', 'duration_ms', 'final_output', 'variables_state', 'error_message', 'checkpoint'
+]
+
+
+class BatchPayloadError(Exception):
+    """Raised when a batch body is not a JSON array or NDJSON of objects"""
+    pass
+
+
+def iter_ndjson(lines):
+    """
+    Yield the payloads of NDJSON lines (blank lines are skipped)
+
+    Raises:
+        BatchPayloadError: If a line is not a JSON object
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            raise BatchPayloadError(f"Line {number} is not valid JSON: {str(e)}")
+        if not isinstance(payload, dict):
+            raise BatchPayloadError(f"Line {number} is not a JSON object")
+        yield payload
+
+
+def parse_payloads(text):
+    """
+    Parse a batch body: a JSON array of payload objects, or NDJSON
+
+    Returns:
+        list: Trigger payloads
+
+    Raises:
+        BatchPayloadError: If the body cannot be parsed
+    """
+    text = text.strip()
+    if not text.startswith('['):
+        return list(iter_ndjson(text.splitlines()))
+    try:
+        payloads = json.loads(text)
+    except ValueError as e:
+        raise BatchPayloadError(f"Body is not valid JSON: {str(e)}")
+    if not all(isinstance(payload, dict) for payload in payloads):
+        raise BatchPayloadError("Every payload must be a JSON object")
+    return payloads
+
+
+class ExecutionBatch:
+    """
+    Write state shared by the executions of one chunk
+
+    Node logs go to one shared buffer and finished execution rows are
+    collected, so the chunk is written with a bulk_create of its logs and a
+    bulk_update of its executions instead of per-execution statements. The
+    ActionResolver is shared too, so actions and credential sets are loaded
+    once per chunk.
+    """
+
+    def __init__(self):
+        self.log_buffer = ExecutionLogBuffer(mode='buffered', flush_every=0, flush_on_error=False)
+        self._finished = []
+        self._plan = None
+        self._action_resolver = None
+        self._lock = threading.Lock()
+
+    def get_action_resolver(self, plan):
+        """ActionResolver shared by the executions running this plan"""
+        with self._lock:
+            if self._plan is not plan:
+                self._plan = plan
+                self._action_resolver = ActionResolver.for_plan(plan)
+            return self._action_resolver
+
+    def finish(self, execution):
+        """Collect a finished execution row for the chunk's bulk update"""
+        with self._lock:
+            self._finished.append(execution)
+
+    def flush(self):
+        """Write the chunk's logs, then the final state of its executions"""
+        with self._lock:
+            finished = self._finished
+            self._finished = []
+        self.log_buffer.flush()
+        if finished:
+            SequenceExecution.objects.bulk_update(finished, _FINAL_EXECUTION_FIELDS)
+
+
+class BatchRunner:
+    """
+    Run many trigger payloads with bounded parallelism
+
+    Items are processed in chunks: the chunk's SequenceExecution rows are
+    inserted with one bulk_create, `max_workers` threads run them, and the
+    chunk's logs and final execution states are written together once the
+    chunk is done. Results are yielded in input order as soon as they are
+    available, so callers can stream them.
+
+    Concurrency limits (see concurrency.py) still apply, but batch items over
+    the limit always wait for a slot - a backfill never drops payloads.
+    """
+
+    def __init__(self, max_workers=None, chunk_size=None, trigger_source=None):
+        max_workers = max_workers or getattr(settings, 'SEQUENCE_BATCH_MAX_WORKERS', 4)
+        chunk_size = chunk_size or getattr(settings, 'SEQUENCE_BATCH_CHUNK_SIZE', 50)
+        self.max_workers = max(1, int(max_workers))
+        self.chunk_size = max(1, int(chunk_size))
+        self.trigger_source = trigger_source or {}
+
+    def run(self, items):
+        """
+        Execute items and yield one result per item
+
+        Args:
+            items: Iterable of (payload index, sequence, event, payload) tuples,
+                see sequence_items() / event_items()
+
+        Yields:
+            dict: Execution result with the payload index and sequence_id
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield from self._run_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._run_chunk(chunk)
+
+    def _run_chunk(self, chunk):
+        batch = ExecutionBatch()
+        executions = self._create_executions(chunk)
+        # Rows waiting for a worker must not look stale to the recovery command
+        heartbeat_ticker.hold([execution.pk for execution in executions])
+        results = [None] * len(chunk)
+        done = [threading.Event() for _ in chunk]
+        pending = iter(range(len(chunk)))
+        pending_lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with pending_lock:
+                        position = next(pending, None)
+                    if position is None:
+                        return
+                    try:
+                        results[position] = self._run_item(chunk[position], executions[position], batch)
+                    finally:
+                        done[position].set()
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, name=f'sequence-batch-{number}', daemon=True)
+            for number in range(min(self.max_workers, len(chunk)))
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for position in range(len(chunk)):
+                done[position].wait()
+                yield results[position]
+        finally:
+            # Also reached when the consumer stops early - the chunk still completes
+            try:
+                for thread in threads:
+                    thread.join()
+                batch.flush()
+            finally:
+                heartbeat_ticker.release([execution.pk for execution in executions])
+
+    def _create_executions(self, chunk):
+        """Insert the chunk's execution rows with one bulk_create"""
+        executions = [
+            SequenceExecution(
+                execution_id=str(uuid.uuid4()),
+                sequence=sequence,
+                triggered_by_event=event,
+                status='running',
+                started_at=timezone.now(),
+                heartbeat_at=timezone.now(),
+                trigger_payload=payload,
+                variables_state={},
+                trigger_ip=self.trigger_source.get('ip'),
+                trigger_os=self.trigger_source.get('os', ''),
+                trigger_device=self.trigger_source.get('device', ''),
+                trigger_browser=self.trigger_source.get('browser', '')
+            )
+            for _, sequence, event, payload in chunk
+        ]
+        with transaction.atomic():
+            created = SequenceExecution.objects.bulk_create(executions)
+
+        # Backends that cannot return primary keys from a bulk insert
+        if any(execution.pk is None for execution in created):
+            ids = dict(SequenceExecution.objects.filter(
+                execution_id__in=[execution.execution_id for execution in created]
+            ).values_list('execution_id', 'pk'))
+            for execution in created:
+                execution.pk = ids[execution.execution_id]
+        return created
+
+    def _run_item(self, chunk_item, execution, batch):
+        """Run one payload under its pre-created execution row, never raising"""
+        from .sequence_executor import SequenceExecutor
+
+        index, sequence, event, payload = chunk_item
+        item = {'index': index, 'sequence_id': sequence.sequence_id}
+        slot, decision = admit_execution(sequence, event)
+        try:
+            if decision != 'run' and not slot.wait():
+                return self._fail_item(item, execution, batch, 'No concurrency slot became free')
+
+            executor = SequenceExecutor(
+                sequence=sequence,
+                event=event,
+                trigger_data=payload,
+                trigger_source=self.trigger_source,
+                execution=execution,
+                batch=batch,
+                slot=slot
+            )
+            return {**item, **executor.execute()}
+        except Exception as e:
+            logger.error(f"Batch item {index} of sequence {sequence.name} failed: {str(e)}", exc_info=True)
+            return self._fail_item(item, execution, batch, str(e))
+        finally:
+            slot.release()
+
+    def _fail_item(self, item, execution, batch, error):
+        """Close an execution row that never ran"""
+        execution.status = 'failed'
+        execution.completed_at = timezone.now()
+        execution.error_message = error
+        batch.finish(execution)
+        return {**item, 'success': False, 'execution_id': execution.execution_id, 'status': 'failed', 'error': error}
+
+
+def sequence_items(sequence, payloads):
+    """Batch items running one sequence per payload"""
+    for index, payload in enumerate(payloads):
+        yield index, sequence, None, payload
+
+
+def event_items(event, payloads):
+    """
+    Batch items running every sequence listening to the event, per payload
+
+    Payloads a subscription's trigger filter rejects yield no item; the skips
+    are added to the subscription counters once the payloads are consumed.
+    """
+    sequences = list(SequenceEventSubscription.get_active_sequences(event))
+    filtered_counts = Counter()
+    try:
+        for index, payload in enumerate(payloads):
+            matched, filtered = filter_sequences(event, sequences, payload, record=False)
+            filtered_counts.update(sequence.pk for sequence in filtered)
+            for sequence in matched:
+                yield index, sequence, event, payload
+    finally:
+        if filtered_counts:
+            record_filtered(event, filtered_counts)
+
+
+def summarize(results):
+    """Count results while passing them through - the summary dict fills as they are consumed"""
+    summary = {'total': 0, 'succeeded': 0, 'failed': 0}
+
+    def counted():
+        for result in results:
+            summary['total'] += 1
+            summary['succeeded' if result.get('success') else 'failed'] += 1
+            yield result
+    return counted(), summary
@@ -0,0 +1,113 @@
+"""
+Execution Cancellation
+Cooperative cancellation of running sequence executions - the worker stops at
+the next node boundary
+"""
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from .models import SequenceExecution
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionCancelled(Exception):
+    """Raised between nodes once cancellation of the execution was requested"""
+
+    def __init__(self, message, node_id=None):
+        super().__init__(message)
+        self.node_id = node_id
+
+
+class CancellationToken:
+    """
+    Cancellation flag of one running execution
+
+    Cancels requested in this process set the flag right away. Cancels
+    requested by another process are seen through
+    SequenceExecution.cancel_requested_at, read at most every
+    SEQUENCE_CANCEL_CHECK_INTERVAL seconds. A child execution started by an
+    awaited event node is cancelled together with its parent.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.execution_pk = None  # Set once the execution row exists
+        self.check_interval = getattr(settings, 'SEQUENCE_CANCEL_CHECK_INTERVAL', 1)
+        self._event = threading.Event()
+        self._last_check = time.monotonic()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        """Whether this execution (or its parent) should stop"""
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.is_cancelled():
+            self._event.set()
+            return True
+        if self.execution_pk is not None and time.monotonic() - self._last_check >= self.check_interval:
+            self._last_check = time.monotonic()
+            if SequenceExecution.objects.filter(pk=self.execution_pk, cancel_requested_at__isnull=False).exists():
+                self._event.set()
+        return self._event.is_set()
+
+
+# Tokens of the executions running in this process, by execution_id
+_running_tokens = {}
+_running_lock = threading.Lock()
+
+
+def register(execution, token):
+    """Make a running execution cancellable from this process without a DB round trip"""
+    token.execution_pk = execution.pk
+    with _running_lock:
+        _running_tokens[execution.execution_id] = token
+
+
+def unregister(execution):
+    with _running_lock:
+        _running_tokens.pop(execution.execution_id, None)
+
+
+def request_cancel(execution):
+    """
+    Ask the worker running an execution to stop
+
+    Executions whose worker stopped sending heartbeats have nobody left to
+    stop them, so they are marked cancelled right away.
+
+    Returns:
+        str: 'cancelling' (the worker stops at its next node), 'cancelled'
+            (stale, closed here) or None if the execution is not running or
+            was already asked to cancel
+    """
+    from .concurrency import release_execution_slot
+    from .execution_recovery import is_stale
+
+    now = timezone.now()
+    requested = SequenceExecution.objects.filter(
+        pk=execution.pk, status='running', cancel_requested_at__isnull=True
+    ).update(cancel_requested_at=now)
+    if not requested:
+        return None
+    execution.cancel_requested_at = now
+
+    with _running_lock:
+        token = _running_tokens.get(execution.execution_id)
+    if token is not None:
+        token.cancel()
+        return 'cancelling'
+
+    if is_stale(execution):
+        closed = SequenceExecution.objects.filter(pk=execution.pk, status='running').update(
+            status='cancelled', error_message='Execution cancelled', completed_at=now
+        )
+        if closed:
+            logger.info(f"Cancelled stale execution {execution.execution_id}")
+            release_execution_slot(execution)
+            return 'cancelled'
+    return 'cancelling'
@@ -0,0 +1,217 @@
+"""
+Execution Concurrency
+Per-sequence and per-event limits on executions running at once, shared across processes
+"""
+import time
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import ExecutionConcurrencyCounter, SequenceExecution
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+OVERFLOW_POLICIES = ('queue', 'drop', 'reject')
+
+# Counter rows known to exist in this process (saves a get_or_create per admission)
+_known_counters = set()
+
+
+def _ensure_counter(scope, object_id):
+    if (scope, object_id) in _known_counters:
+        return
+    ExecutionConcurrencyCounter.objects.get_or_create(scope=scope, object_id=object_id)
+    _known_counters.add((scope, object_id))
+
+
+def _increment_in_flight(scope, object_id, limit):
+    """Take one in-flight slot if the counter is below the limit (0 = no limit)"""
+    _ensure_counter(scope, object_id)
+    counters = ExecutionConcurrencyCounter.objects.filter(scope=scope, object_id=object_id)
+    if limit:
+        counters = counters.filter(in_flight__lt=limit)
+    return counters.update(in_flight=F('in_flight') + 1, updated_at=timezone.now()) == 1
+
+
+def _decrement(scope, object_id, field):
+    ExecutionConcurrencyCounter.objects.filter(
+        scope=scope, object_id=object_id, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1, 'updated_at': timezone.now()})
+
+
+class ExecutionSlot:
+    """
+    Admission of one execution against the concurrency limits of its sequence
+    and of the event that triggered it
+
+    The counters live in ExecutionConcurrencyCounter rows and are changed with
+    conditional UPDATEs, so the limits hold across gunicorn workers. Counts are
+    kept even for sequences without a limit so the API can show them.
+
+    Once the execution row exists the slot is attached to it
+    (SequenceExecution.holds_concurrency_slot). A worker that is killed never
+    runs its release(), so the stale-execution detector gives the slot back
+    with release_execution_slot() when it fails, resumes or cancels the
+    execution; whichever of the two clears the flag first decrements the
+    counters.
+
+    Limits come from execution_config.maxConcurrentExecutions and
+    Event.max_concurrent_executions (falling back to settings, 0 = no limit).
+    What happens to an execution over the limit comes from
+    execution_config.concurrencyOverflowPolicy:
+    - 'queue': wait for a slot (up to SEQUENCE_CONCURRENCY_QUEUE_TIMEOUT seconds)
+    - 'drop': skip the execution
+    - 'reject': refuse the trigger (webhooks answer 429)
+    """
+
+    def __init__(self, sequence, event=None):
+        execution_config = sequence.execution_config or {}
+        self.sequence = sequence
+
+        sequence_limit = execution_config.get(
+            'maxConcurrentExecutions', getattr(settings, 'SEQUENCE_MAX_CONCURRENT_EXECUTIONS', 0)
+        )
+        self.limits = [('sequence', sequence.pk, int(sequence_limit or 0))]
+        if event is not None:
+            event_limit = event.max_concurrent_executions
+            if event_limit is None:
+                event_limit = getattr(settings, 'SEQUENCE_EVENT_MAX_CONCURRENT_EXECUTIONS', 0)
+            self.limits.append(('event', event.pk, int(event_limit or 0)))
+
+        policy = execution_config.get('concurrencyOverflowPolicy') or getattr(
+            settings, 'SEQUENCE_CONCURRENCY_OVERFLOW_POLICY', 'queue'
+        )
+        if policy not in OVERFLOW_POLICIES:
+            logger.warning(f"Unknown concurrency overflow policy '{policy}', using 'queue'")
+            policy = 'queue'
+        self.overflow_policy = policy
+
+        self.queue_timeout = getattr(settings, 'SEQUENCE_CONCURRENCY_QUEUE_TIMEOUT', 60)
+        self.poll_interval = getattr(settings, 'SEQUENCE_CONCURRENCY_POLL_INTERVAL', 0.2)
+        self.acquired = False
+        self.queued = False
+        self._queued_at = None
+        self._execution_pk = None  # Execution row the slot is attached to
+
+    def try_acquire(self):
+        """Take a slot on every counter, or none of them"""
+        if self.acquired:
+            return True
+        taken = []
+        for scope, object_id, limit in self.limits:
+            if not _increment_in_flight(scope, object_id, limit):
+                for taken_scope, taken_id in taken:
+                    _decrement(taken_scope, taken_id, 'in_flight')
+                return False
+            taken.append((scope, object_id))
+        self.acquired = True
+        self._leave_queue()
+        return True
+
+    def enqueue(self):
+        """Count this execution as waiting for a slot"""
+        if self.queued:
+            return
+        for scope, object_id, _ in self.limits:
+            _ensure_counter(scope, object_id)
+            ExecutionConcurrencyCounter.objects.filter(scope=scope, object_id=object_id).update(
+                queued=F('queued') + 1, updated_at=timezone.now()
+            )
+        self.queued = True
+        self._queued_at = time.monotonic()
+
+    def queue_expired(self):
+        """Whether a queued execution has waited longer than the queue timeout"""
+        return self.queued and time.monotonic() - self._queued_at >= self.queue_timeout
+
+    def wait(self, should_stop=None):
+        """
+        Block until a slot is free or the queue timeout passes
+
+        Args:
+            should_stop: Optional callable, checked between polls - gives up
+                the wait when it returns True (e.g. the parent was cancelled)
+
+        Returns:
+            bool: True if the slot was acquired
+        """
+        self.enqueue()
+        while not self.try_acquire():
+            if should_stop is not None and should_stop():
+                self._leave_queue()
+                return False
+            if self.queue_expired():
+                logger.warning(f"Sequence {self.sequence.name} waited {self.queue_timeout}s for a concurrency slot, giving up")
+                self._leave_queue()
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def attach(self, execution):
+        """Record on the execution row that it holds this slot"""
+        if not self.acquired or self._execution_pk == execution.pk:
+            return
+        SequenceExecution.objects.filter(pk=execution.pk).update(holds_concurrency_slot=True)
+        self._execution_pk = execution.pk
+
+    def release(self):
+        """Give back the slot (and the queue place, if still waiting)"""
+        if self.acquired:
+            # Unless the stale-execution detector already gave it back
+            if self._execution_pk is None or SequenceExecution.objects.filter(
+                pk=self._execution_pk, holds_concurrency_slot=True
+            ).update(holds_concurrency_slot=False):
+                for scope, object_id, _ in self.limits:
+                    _decrement(scope, object_id, 'in_flight')
+            self.acquired = False
+            self._execution_pk = None
+        self._leave_queue()
+
+    def _leave_queue(self):
+        if not self.queued:
+            return
+        for scope, object_id, _ in self.limits:
+            _decrement(scope, object_id, 'queued')
+        self.queued = False
+
+
+def release_execution_slot(execution):
+    """
+    Give back the slot of an execution whose worker stopped sending heartbeats
+
+    The slot was taken against the execution's sequence and the event that
+    triggered it, so those are the counters decremented.
+
+    Returns:
+        bool: True if the execution still held a slot
+    """
+    released = SequenceExecution.objects.filter(
+        pk=execution.pk, holds_concurrency_slot=True
+    ).update(holds_concurrency_slot=False)
+    if not released:
+        return False
+    _decrement('sequence', execution.sequence_id, 'in_flight')
+    if execution.triggered_by_event_id is not None:
+        _decrement('event', execution.triggered_by_event_id, 'in_flight')
+    logger.info(f"Released the concurrency slot of stale execution {execution.execution_id}")
+    return True
+
+
+def admit_execution(sequence, event=None):
+    """
+    Try to admit an execution of a sequence
+
+    Returns:
+        tuple: (slot, decision) where decision is 'run' (slot acquired),
+        'queue' (counted as queued - acquire later with try_acquire()/wait()),
+        'drop' or 'reject'
+    """
+    slot = ExecutionSlot(sequence, event)
+    if slot.try_acquire():
+        return slot, 'run'
+    logger.info(f"Sequence {sequence.name} is at its concurrency limit, overflow policy '{slot.overflow_policy}'")
+    if slot.overflow_policy == 'queue':
+        slot.enqueue()
+        return slot, 'queue'
+    return slot, slot.overflow_policy
@@ -0,0 +1,442 @@
+"""
+Sequence Dispatcher
+Runs event-triggered sequence executions on an in-process worker pool so that
+webhook endpoints can acknowledge immediately
+"""
+import atexit
+import heapq
+import itertools
+import queue
+import threading
+import time
+import zlib
+from django.conf import settings
+from django.db import close_old_connections, connections
+from .sequence_compiler import lookup_path, variable_reference_path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_FULL_POLICIES = ('reject', 'sync')
+
+_STOP = object()
+
+
+class DispatcherQueueFull(Exception):
+    """Raised when a batch of jobs does not fit in the dispatcher queue"""
+    pass
+
+
+def partition_key(sequence, trigger_data):
+    """
+    Value of the sequence's execution_config.partitionKey in a trigger payload
+
+    The key is a path into the payload ("customer_id", "document.id" or
+    "@event.document.id"). Returns None if the sequence declares no key or the
+    payload does not contain it.
+    """
+    path = (sequence.execution_config or {}).get('partitionKey')
+    if not path:
+        return None
+    parts = variable_reference_path(path)
+    if parts[0] == 'trigger':
+        parts = parts[1:]
+    value = lookup_path(trigger_data or {}, parts)
+    if value is None:
+        logger.warning(f"Trigger payload of sequence {sequence.name} has no partition key '{path}', running unordered")
+        return None
+    return str(value)
+
+
+class SequenceDispatcher:
+    """
+    Bounded queue + fixed pool of worker threads, plus ordered lanes
+
+    Jobs are plain callables. A batch of jobs is enqueued all-or-nothing, so a
+    webhook delivery either has all of its sequences queued or none of them.
+    With max_workers=0 every job runs synchronously in the caller's thread.
+
+    Jobs submitted with a partition key are hashed to one of `lanes` FIFO
+    queues, each served by a single worker thread: jobs with the same key run
+    one after another in submission order, jobs with different keys run in
+    parallel across lanes. Keyless jobs use the shared pool.
+
+    Jobs waiting for a concurrency slot are parked off the pool (see park()).
+    """
+
+    def __init__(self, max_workers, max_queue_size, queue_full_policy='reject', lanes=0, lane_queue_size=None):
+        if queue_full_policy not in QUEUE_FULL_POLICIES:
+            logger.warning(f"Unknown dispatcher queue-full policy '{queue_full_policy}', using 'reject'")
+            queue_full_policy = 'reject'
+        self.max_workers = max(0, max_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.queue_full_policy = queue_full_policy
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._workers = []
+        self._active = 0
+        self._lock = threading.Lock()
+        self._shutting_down = False  # No new submissions
+        self._stopping = False  # Parked jobs are dropped, workers told to stop
+
+        # Ordered lanes - worker threads start when a lane gets its first job
+        self.lane_queue_size = max(1, lane_queue_size or self.max_queue_size)
+        self._lanes = [queue.Queue(maxsize=self.lane_queue_size) for _ in range(max(0, lanes))]
+        self._lane_workers = {}
+        self._busy_lanes = set()
+
+        # Parked jobs - (due, order, job, slot, delay) heap served by one timer thread
+        self._parked = []
+        self._parked_order = itertools.count()
+        self._parked_wakeup = threading.Condition(self._lock)
+        self._parker = None
+
+    def lane_for(self, key):
+        """Index of the lane serving a partition key (stable across processes), None for keyless jobs"""
+        if key is None or not self._lanes:
+            return None
+        return zlib.crc32(key.encode('utf-8')) % len(self._lanes)
+
+    def submit(self, jobs, keys=None):
+        """
+        Queue a batch of jobs
+
+        Args:
+            jobs: List of zero-argument callables
+            keys: Optional list of partition keys, one per job (None = unordered)
+
+        Returns:
+            str: 'queued' if the jobs were queued, 'sync' if they were run inline
+
+        Raises:
+            DispatcherQueueFull: If the batch does not fit and the policy is
+                'reject', or a lane is full - ordered jobs are never run inline,
+                that would overtake the jobs already queued for their key
+        """
+        if not jobs:
+            return 'queued'
+
+        if self.max_workers == 0:
+            self._run_inline(jobs)
+            return 'sync'
+
+        lanes = [self.lane_for(key) for key in keys] if keys else [None] * len(jobs)
+        with self._lock:
+            self._ensure_workers()
+            # Only this method adds to the queues (under the lock), so checking the
+            # free space first makes the batch all-or-nothing
+            shared_count = lanes.count(None)
+            fits = not self._shutting_down and self._queue.qsize() + shared_count <= self.max_queue_size
+            lanes_fit = all(
+                self._lanes[lane].qsize() + lanes.count(lane) <= self.lane_queue_size
+                for lane in set(lanes) if lane is not None
+            )
+            if fits and lanes_fit:
+                for job, lane in zip(jobs, lanes):
+                    if lane is None:
+                        self._queue.put_nowait(job)
+                    else:
+                        self._ensure_lane_worker(lane)
+                        self._lanes[lane].put_nowait(job)
+                return 'queued'
+
+        if not lanes_fit:
+            raise DispatcherQueueFull(f"Dispatcher lane queue is full ({self.lane_queue_size} jobs)")
+
+        if self.queue_full_policy == 'sync' and shared_count == len(jobs):
+            logger.warning(f"Dispatcher queue full, running {len(jobs)} job(s) synchronously")
+            self._run_inline(jobs)
+            return 'sync'
+
+        raise DispatcherQueueFull(f"Dispatcher queue is full ({self.max_queue_size} jobs)")
+
+    def requeue(self, job):
+        """
+        Put a single job back at the end of the queue (e.g. a parked one whose
+        concurrency slot was acquired)
+
+        Returns:
+            bool: False if the queue is full, inline or stopping
+        """
+        if self.max_workers == 0:
+            return False
+        with self._lock:
+            if self._stopping:
+                return False
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                return False
+            return True
+
+    def park(self, job, slot):
+        """
+        Hold a job whose concurrency slot is still queued until the slot frees up
+
+        Parked jobs do not occupy a worker. One timer thread retries their
+        slots, backing off from the slot's poll interval up to
+        SEQUENCE_CONCURRENCY_MAX_POLL_INTERVAL, and puts a job back on the
+        queue once its slot is acquired; wake_parked() retries them right away.
+        A job whose slot does not free up within the queue timeout is dropped.
+
+        Returns:
+            bool: False if jobs run inline or the dispatcher is stopping
+                (the caller then waits for the slot itself)
+        """
+        if self.max_workers == 0:
+            return False
+        with self._lock:
+            if self._stopping:
+                return False
+            self._push_parked(job, slot, slot.poll_interval)
+            if self._parker is None:
+                self._parker = threading.Thread(target=self._parker_loop, name='sequence-dispatcher-parked', daemon=True)
+                self._parker.start()
+        return True
+
+    def wake_parked(self):
+        """Retry the slots of all parked jobs now (e.g. after a slot was released)"""
+        with self._lock:
+            if not self._parked:
+                return
+            now = time.monotonic()
+            self._parked = [(now,) + entry[1:] for entry in self._parked]
+            heapq.heapify(self._parked)
+            self._parked_wakeup.notify()
+
+    def _push_parked(self, job, slot, delay):
+        """Add a job to the parked heap (caller holds the lock)"""
+        heapq.heappush(self._parked, (time.monotonic() + delay, next(self._parked_order), job, slot, delay))
+        self._parked_wakeup.notify()
+
+    def _parker_loop(self):
+        """Retry the slots of parked jobs as they come due; exits when none are left"""
+        try:
+            while True:
+                with self._lock:
+                    while True:
+                        if not self._parked or self._stopping:
+                            self._parker = None
+                            return
+                        wait = self._parked[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._parked_wakeup.wait(wait)
+                    now = time.monotonic()
+                    due = []
+                    while self._parked and self._parked[0][0] <= now:
+                        due.append(heapq.heappop(self._parked))
+
+                close_old_connections()
+                for _, _, job, slot, delay in due:
+                    self._retry_parked(job, slot, delay)
+        finally:
+            connections.close_all()
+
+    def _retry_parked(self, job, slot, delay):
+        try:
+            acquired = slot.try_acquire()
+        except Exception as e:
+            logger.error(f"Could not retry the concurrency slot of a parked job: {str(e)}", exc_info=True)
+            acquired = False
+
+        if acquired and self.requeue(job):
+            return
+        if not acquired and slot.queue_expired():
+            logger.warning(f"Sequence {slot.sequence.name} execution dropped: no concurrency slot became free")
+            slot.release()
+            return
+
+        max_delay = getattr(settings, 'SEQUENCE_CONCURRENCY_MAX_POLL_INTERVAL', 5)
+        with self._lock:
+            if not self._stopping:
+                # Acquired but the queue is full: keep the slot and try again shortly
+                self._push_parked(job, slot, slot.poll_interval if acquired else min(delay * 2, max_delay))
+                return
+        logger.warning(f"Sequence {slot.sequence.name} execution dropped: dispatcher stopped while it was parked")
+        slot.release()
+
+    def stats(self):
+        """Current queue and worker counters, with the depth of every lane"""
+        lane_depths = [lane.qsize() for lane in self._lanes]
+        return {
+            'workers': len(self._workers),
+            'active': self._active,
+            'queued': self._queue.qsize(),
+            'parked': len(self._parked),
+            'max_queue_size': self.max_queue_size,
+            'lanes': {
+                'count': len(self._lanes),
+                'workers': len(self._lane_workers),
+                'busy': len(self._busy_lanes),
+                'queued': sum(lane_depths),
+                'max_depth': max(lane_depths, default=0),
+                'max_queue_size': self.lane_queue_size,
+                'depths': lane_depths,
+            },
+        }
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting jobs and wait for queued, parked and running jobs to finish
+
+        Parked jobs keep going back on the queue as their slots free up until
+        the timeout; those still parked then are dropped.
+
+        Args:
+            timeout: Maximum seconds to wait for the queue to drain (None = forever)
+        """
+        with self._lock:
+            if self._shutting_down:
+                return
+            self._shutting_down = True
+            workers = list(self._workers)
+            lane_workers = dict(self._lane_workers)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                # The timer thread exits once nothing is parked
+                if self._parker is None or (deadline is not None and time.monotonic() >= deadline):
+                    self._stopping = True
+                    parked, self._parked = self._parked, []
+                    self._parked_wakeup.notify()
+                    break
+            time.sleep(0.05)
+
+        if parked:
+            logger.warning(f"Dispatcher dropping {len(parked)} job(s) still waiting for a concurrency slot on shutdown")
+            for _, _, _, slot, _ in parked:
+                slot.release()
+
+        if not workers and not lane_workers:
+            return
+
+        queued = self._queue.qsize() + sum(lane.qsize() for lane in self._lanes)
+        logger.info(f"Dispatcher draining {queued} queued job(s) on shutdown")
+        for _ in workers:
+            self._queue.put(_STOP)
+        for lane in lane_workers:
+            self._lanes[lane].put(_STOP)
+        workers = workers + list(lane_workers.values())
+        for worker in workers:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            worker.join(remaining)
+
+        if any(worker.is_alive() for worker in workers):
+            logger.warning(f"Dispatcher shutdown timed out with {self._queue.qsize()} job(s) still queued")
+
+    def _ensure_workers(self):
+        """Start the worker threads on first use (caller holds the lock)"""
+        if self._workers or self._shutting_down:
+            return
+        for index in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f'sequence-dispatcher-{index}', daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _ensure_lane_worker(self, lane):
+        """Start the single worker of a lane on its first job (caller holds the lock)"""
+        if lane in self._lane_workers:
+            return
+        worker = threading.Thread(
+            target=self._worker_loop, args=(lane,), name=f'sequence-lane-{lane}', daemon=True
+        )
+        worker.start()
+        self._lane_workers[lane] = worker
+
+    def _worker_loop(self, lane=None):
+        """Take jobs off the shared queue (or one lane) until told to stop"""
+        jobs = self._queue if lane is None else self._lanes[lane]
+        try:
+            while True:
+                job = jobs.get()
+                if job is _STOP:
+                    break
+                with self._lock:
+                    self._active += 1
+                    if lane is not None:
+                        self._busy_lanes.add(lane)
+                try:
+                    close_old_connections()
+                    job()
+                except Exception as e:
+                    logger.error(f"Dispatched job failed: {str(e)}", exc_info=True)
+                finally:
+                    with self._lock:
+                        self._active -= 1
+                        self._busy_lanes.discard(lane)
+                    close_old_connections()
+        finally:
+            connections.close_all()
+
+    def _run_inline(self, jobs):
+        """Run jobs in the calling thread"""
+        for job in jobs:
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"Dispatched job failed: {str(e)}", exc_info=True)
+
+
+def execute_sequence_job(sequence, event=None, trigger_data=None, trigger_source=None, slot=None, ordered=False,
+                         **executor_options):
+    """
+    Build a dispatcher job that runs one sequence execution
+
+    Args:
+        slot: ExecutionSlot from admit_execution(). A job whose slot is still
+            queued is parked (see SequenceDispatcher.park()) until a slot
+            frees up, so waiting executions do not hold a worker. The slot is
+            released when the execution ends.
+        ordered: The job runs on a lane (see partition_key()) - it waits for its
+            slot in place, parking would let later jobs of its key overtake it
+        **executor_options: Extra SequenceExecutor arguments (e.g. parent_execution, depth, lineage)
+    """
+    def job():
+        if slot is not None and not slot.try_acquire():
+            if not ordered and sequence_dispatcher.park(job, slot):
+                return None
+            # Ordered, or no dispatcher to park on - wait in this thread
+            if not slot.wait():
+                logger.warning(f"Sequence {sequence.name} execution dropped: no concurrency slot became free")
+                return None
+
+        from .sequence_executor import SequenceExecutor
+        try:
+            executor = SequenceExecutor(
+                sequence=sequence,
+                event=event,
+                trigger_data=trigger_data,
+                trigger_source=trigger_source,
+                slot=slot,
+                **executor_options
+            )
+            result = executor.execute()
+        finally:
+            if slot is not None:
+                slot.release()
+                sequence_dispatcher.wake_parked()
+        if not result.get('success'):
+            logger.warning(f"Sequence {sequence.name} execution failed: {result.get('error')}")
+        return result
+    return job
+
+
+sequence_dispatcher = SequenceDispatcher(
+    max_workers=getattr(settings, 'SEQUENCE_DISPATCH_WORKERS', 4),
+    max_queue_size=getattr(settings, 'SEQUENCE_DISPATCH_QUEUE_SIZE', 100),
+    queue_full_policy=getattr(settings, 'SEQUENCE_DISPATCH_QUEUE_FULL_POLICY', 'reject'),
+    lanes=getattr(settings, 'SEQUENCE_DISPATCH_LANES', 8),
+    lane_queue_size=getattr(settings, 'SEQUENCE_DISPATCH_LANE_QUEUE_SIZE', 100),
+)
+
+
+def shutdown_dispatcher():
+    """Drain the dispatcher - called from the gunicorn worker_exit hook and at interpreter exit"""
+    sequence_dispatcher.shutdown(timeout=getattr(settings, 'SEQUENCE_DISPATCH_DRAIN_TIMEOUT', 25))
+
+
+atexit.register(shutdown_dispatcher)
@@ -0,0 +1,163 @@
+"""
+Execution Context
+Copy-on-write variable store shared by the nodes of one sequence execution
+"""
+import sys
+from collections.abc import Mapping, MutableMapping
+
+
+_DELETED = object()
+
+
+class ExecutionContext(MutableMapping):
+    """
+    Mapping of context variables (trigger payload, node results, assignments)
+
+    Values are stored by reference - nothing is copied when a node result is
+    stored or read. branch() creates an empty overlay on top of this context in
+    O(1): reads fall through to the parent, writes stay in the overlay until
+    they are folded back with merge(). Parallel branches use this instead of
+    copying the context.
+    """
+
+    def __init__(self, initial=None, parent=None):
+        self._values = dict(initial or {})
+        self._parent = parent
+
+    def __getitem__(self, key):
+        context = self
+        while context is not None:
+            value = context._values.get(key, _DELETED)
+            if value is not _DELETED:
+                return value
+            if key in context._values:
+                # Deleted in this overlay
+                raise KeyError(key)
+            context = context._parent
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        # Hot path for variable lookups - avoids the KeyError round trip of Mapping.get
+        context = self
+        while context is not None:
+            value = context._values.get(key, _DELETED)
+            if value is not _DELETED:
+                return value
+            if key in context._values:
+                return default
+            context = context._parent
+        return default
+
+    def __contains__(self, key):
+        return self.get(key, _DELETED) is not _DELETED
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if self._parent is not None and key in self._parent:
+            self._values[key] = _DELETED
+        else:
+            del self._values[key]
+
+    def __iter__(self):
+        seen = set()
+        context = self
+        while context is not None:
+            for key, value in context._values.items():
+                if key in seen:
+                    continue
+                seen.add(key)
+                if value is not _DELETED:
+                    yield key
+            context = context._parent
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ExecutionContext({dict(self)!r})"
+
+    def branch(self):
+        """Create a copy-on-write overlay of this context"""
+        return ExecutionContext(parent=self)
+
+    def copy(self):
+        """Copy-on-write copy - same as branch(), so dict-style callers stay cheap"""
+        return self.branch()
+
+    def merge(self, overlay):
+        """Fold the writes of a branch overlay back into this context"""
+        for key, value in overlay._values.items():
+            if value is _DELETED:
+                self.pop(key, None)
+            else:
+                self[key] = value
+
+    def to_dict(self):
+        """Flatten into a plain dict (values are not copied)"""
+        return dict(self.items())
+
+    def project(self, paths):
+        """
+        Build a compact snapshot holding only the given variable paths
+
+        Args:
+            paths: Iterable of path tuples, e.g. ('trigger', 'user_id') or ('node_1',)
+
+        Returns:
+            dict: Nested dict with just the selected values. A path that runs into
+            a non-mapping value keeps that whole value.
+        """
+        snapshot = {}
+        for path in sorted(set(paths), key=len):
+            if not path:
+                continue
+            value = self
+            target = snapshot
+            for depth, part in enumerate(path):
+                if not isinstance(value, Mapping) or part not in value:
+                    break
+                value = value[part]
+                last = depth == len(path) - 1 or not isinstance(value, Mapping)
+                existing = target.get(part, _DELETED)
+                if existing is not _DELETED and not isinstance(existing, dict):
+                    # A shorter path already took the whole value
+                    break
+                if last:
+                    if existing is _DELETED:
+                        target[part] = value
+                    break
+                if existing is _DELETED:
+                    target[part] = {}
+                target = target[part]
+        return snapshot
+
+    def memory_usage(self):
+        """
+        Approximate bytes held by the values of this context (and its parents)
+
+        Objects referenced more than once are only counted once.
+        """
+        seen = set()
+        total = 0
+        stack = []
+        context = self
+        while context is not None:
+            stack.append(context._values)
+            context = context._parent
+
+        while stack:
+            obj = stack.pop()
+            if obj is _DELETED or id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+        return total
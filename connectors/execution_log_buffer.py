@@ -0,0 +1,149 @@
+"""
+Execution Log Buffer
+Collects ExecutionLog rows for one sequence execution and writes them in bulk
+"""
+import threading
+from django.conf import settings
+from .models import ExecutionLog
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+LOG_MODES = ('buffered', 'stream')
+
+
+class ExecutionLogBuffer:
+    """
+    Execution-scoped buffer of ExecutionLog rows
+
+    In 'buffered' mode rows are kept in memory and written with bulk_create at
+    the flush points: end of run, every `flush_every` nodes (0 disables) and,
+    if `flush_on_error` is set, as soon as an error row is added.
+    In 'stream' mode every row is written immediately (one INSERT per node),
+    which is useful for watching a run live.
+
+    Rows are written in the order they were added. The buffer is shared by the
+    branches of a parallel node, so adding and flushing are serialized.
+    """
+
+    def __init__(self, mode='buffered', flush_every=0, flush_on_error=True):
+        if mode not in LOG_MODES:
+            logger.warning(f"Unknown execution log mode '{mode}', using 'buffered'")
+            mode = 'buffered'
+        self.mode = mode
+        self.flush_every = max(0, int(flush_every or 0))
+        self.flush_on_error = flush_on_error
+        self._pending = []
+        self._added_since_flush = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_sequence(cls, sequence):
+        """Create a buffer using the sequence's execution_config, falling back to settings"""
+        execution_config = sequence.execution_config or {}
+        return cls(
+            mode=execution_config.get('logMode') or getattr(settings, 'SEQUENCE_LOG_MODE', 'buffered'),
+            flush_every=execution_config.get('logFlushEvery', getattr(settings, 'SEQUENCE_LOG_FLUSH_EVERY', 0)),
+            flush_on_error=getattr(settings, 'SEQUENCE_LOG_FLUSH_ON_ERROR', True),
+        )
+
+    def add(self, **fields):
+        """
+        Add a log row
+
+        Args:
+            **fields: ExecutionLog field values
+        """
+        with self._lock:
+            self._pending.append(ExecutionLog(**fields))
+            self._added_since_flush += 1
+
+            if (
+                self.mode == 'stream'
+                or (self.flush_every and self._added_since_flush >= self.flush_every)
+                or (self.flush_on_error and fields.get('log_level') == 'error')
+            ):
+                self._flush_locked()
+
+    def flush(self):
+        """Write all pending rows"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """Write pending rows - caller must hold the lock so flushes stay ordered"""
+        rows = self._pending
+        self._pending = []
+        self._added_since_flush = 0
+        if not rows:
+            return
+        if len(rows) == 1:
+            rows[0].save()
+        else:
+            ExecutionLog.objects.bulk_create(rows)
+
+
+class ExecutionLogAggregator:
+    """
+    Stand-in for ExecutionLogBuffer that summarizes log rows instead of writing them
+
+    Used for the items of a map node, so N items running an M-node sub-graph
+    add one summary to the map node's log row instead of N x M rows. Keeps
+    per node the number of runs, runs per status and the total duration,
+    plus the first `max_errors` errors with the index of their item.
+    """
+
+    mode = 'aggregate'
+
+    def __init__(self, max_errors=10):
+        self.max_errors = max_errors
+        self._nodes = {}
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def for_item(self, index):
+        """Log sink for one item - what its executor uses as log_buffer"""
+        return _ItemLogSink(self, index)
+
+    def add(self, index=None, **fields):
+        with self._lock:
+            entry = self._nodes.get(fields.get('node_id'))
+            if entry is None:
+                entry = {'node_type': fields.get('node_type', ''), 'node_name': fields.get('node_name', ''),
+                         'runs': 0, 'statuses': {}, 'duration_ms': 0}
+                self._nodes[fields.get('node_id')] = entry
+            status = fields.get('status', 'completed')
+            entry['runs'] += 1
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['duration_ms'] += fields.get('duration_ms') or 0
+            if fields.get('log_level') == 'error' and len(self._errors) < self.max_errors:
+                self._errors.append({'index': index, 'node_id': fields.get('node_id'), 'message': fields.get('message', '')})
+
+    def flush(self):
+        """Nothing to write - the summary goes out with the map node's own log row"""
+        pass
+
+    def summary(self):
+        """Per-node counters and the sampled errors"""
+        with self._lock:
+            return {
+                'nodes': {node_id: dict(entry, statuses=dict(entry['statuses'])) for node_id, entry in self._nodes.items()},
+                'errors': list(self._errors),
+            }
+
+
+class _ItemLogSink:
+    """Tags the rows of one map item with its index"""
+
+    mode = 'aggregate'
+
+    def __init__(self, aggregator, index):
+        self._aggregator = aggregator
+        self._index = index
+
+    def add(self, **fields):
+        self._aggregator.add(index=self._index, **fields)
+
+    def flush(self):
+        pass
@@ -0,0 +1,225 @@
+"""
+Execution Recovery
+Finds sequence executions whose worker stopped sending heartbeats and resumes
+them from their last checkpoint
+"""
+import threading
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import SequenceExecution
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RESUMABLE_STATUSES = ('running', 'failed', 'timed_out')
+
+
+class HeartbeatTicker:
+    """
+    Keeps the heartbeat of the executions held by this process fresh
+
+    One thread per process stamps heartbeat_at of every registered execution
+    every SEQUENCE_HEARTBEAT_INTERVAL seconds with a single UPDATE. Executions
+    stay alive while a node runs for a long time (a parallel branch, a map
+    node, an awaited child execution) and while batch rows wait for their
+    turn in a chunk. The thread exits once nothing is registered.
+    """
+
+    def __init__(self):
+        self._held = Counter()  # execution pk -> registrations
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def hold(self, execution_pks):
+        """Start keeping executions alive"""
+        with self._lock:
+            self._held.update(pk for pk in execution_pks if pk is not None)
+            if self._held and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sequence-heartbeat', daemon=True)
+                self._thread.start()
+
+    def release(self, execution_pks):
+        """Stop keeping executions alive"""
+        with self._lock:
+            self._held.subtract(pk for pk in execution_pks if pk is not None)
+            self._held = +self._held  # Drop pks no longer held
+            if not self._held:
+                self._wakeup.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    self._wakeup.wait(getattr(settings, 'SEQUENCE_HEARTBEAT_INTERVAL', 30))
+                    if not self._held:
+                        self._thread = None
+                        return
+                    execution_pks = list(self._held)
+                try:
+                    SequenceExecution.objects.filter(pk__in=execution_pks, status='running').update(
+                        heartbeat_at=timezone.now()
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not record heartbeats: {str(e)}")
+        finally:
+            connections.close_all()
+
+
+heartbeat_ticker = HeartbeatTicker()
+
+
+def stale_executions(stale_after=None):
+    """
+    Running executions without a heartbeat for `stale_after` seconds
+    (default SEQUENCE_STALE_AFTER)
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, 'SEQUENCE_STALE_AFTER', 300)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return SequenceExecution.objects.filter(status='running').annotate(
+        last_seen=Coalesce('heartbeat_at', 'started_at')
+    ).filter(last_seen__lt=cutoff)
+
+
+def is_stale(execution, stale_after=None):
+    """Whether a running execution has stopped sending heartbeats"""
+    return stale_executions(stale_after).filter(pk=execution.pk).exists()
+
+
+def claim_execution(execution):
+    """
+    Take over an execution for resuming
+
+    The claim is a conditional update on the heartbeat the caller saw, so when
+    several workers (or detector runs) try to resume the same execution only
+    one of them wins. The winner gives back the concurrency slot the dead
+    worker still held - resume_execution() admits the execution again.
+
+    Returns:
+        bool: True if this caller may resume the execution
+    """
+    from .concurrency import release_execution_slot
+
+    if execution.status not in RESUMABLE_STATUSES:
+        return False
+    now = timezone.now()
+    claimed = SequenceExecution.objects.filter(
+        pk=execution.pk, status=execution.status, heartbeat_at=execution.heartbeat_at
+    ).update(heartbeat_at=now, resume_count=F('resume_count') + 1)
+    if claimed:
+        execution.heartbeat_at = now
+        execution.resume_count += 1
+        release_execution_slot(execution)
+    return claimed == 1
+
+
+def unclaim_execution(execution, heartbeat_at):
+    """
+    Undo a claim_execution() whose resume could not be started, restoring the
+    heartbeat the claim replaced so the execution can be claimed again
+
+    Only applies while nobody else has touched the execution since the claim.
+
+    Returns:
+        bool: True if the claim was rolled back
+    """
+    unclaimed = SequenceExecution.objects.filter(
+        pk=execution.pk, status=execution.status, heartbeat_at=execution.heartbeat_at,
+        resume_count=execution.resume_count
+    ).update(heartbeat_at=heartbeat_at, resume_count=F('resume_count') - 1)
+    if unclaimed:
+        execution.heartbeat_at = heartbeat_at
+        execution.resume_count -= 1
+    return unclaimed == 1
+
+
+def execution_lineage(execution):
+    """
+    IDs of the sequences running above an execution in its event chain,
+    rebuilt from the parent_execution links
+
+    Returns:
+        set: Sequence pks of the execution's ancestors
+    """
+    lineage = set()
+    seen = set()
+    parent_id = execution.parent_execution_id
+    while parent_id is not None and parent_id not in seen:
+        seen.add(parent_id)
+        row = SequenceExecution.objects.filter(pk=parent_id).values_list('sequence_id', 'parent_execution_id').first()
+        if row is None:
+            break
+        sequence_id, parent_id = row
+        lineage.add(sequence_id)
+    return lineage
+
+
+def resume_execution(execution):
+    """
+    Resume a claimed execution from its last checkpoint
+
+    The resumed run keeps its place in the event chain (depth and lineage, so
+    the recursion guards still hold) and is admitted against the concurrency
+    limits like a new execution - over the limit it waits for a slot, whatever
+    the overflow policy. When none frees up the execution is left as it is;
+    a running one goes stale again and is picked up by a later detector run.
+
+    Returns:
+        dict: Execution result (see SequenceExecutor.execute)
+    """
+    from .concurrency import admit_execution
+    from .sequence_executor import SequenceExecutor
+
+    slot, decision = admit_execution(execution.sequence, execution.triggered_by_event)
+    try:
+        if decision != 'run' and not slot.wait():
+            logger.warning(f"Not resuming execution {execution.execution_id}: no concurrency slot became free")
+            return {
+                'success': False,
+                'execution_id': execution.execution_id,
+                'status': execution.status,
+                'error': 'No concurrency slot became free'
+            }
+
+        executor = SequenceExecutor(
+            sequence=execution.sequence,
+            event=execution.triggered_by_event,
+            trigger_data=execution.trigger_payload,
+            trigger_source={
+                'ip': execution.trigger_ip,
+                'os': execution.trigger_os,
+                'device': execution.trigger_device,
+                'browser': execution.trigger_browser,
+            },
+            parent_execution=execution.parent_execution,
+            depth=execution.depth,
+            lineage=execution_lineage(execution),
+            execution=execution,
+            slot=slot
+        )
+        logger.info(f"Resuming execution {execution.execution_id} (resume #{execution.resume_count})")
+        return executor.resume()
+    finally:
+        slot.release()
+
+
+def mark_failed(execution, reason):
+    """
+    Give up on a stale execution, keeping its checkpoint for a later manual
+    resume, and give back its concurrency slot
+    """
+    from .concurrency import release_execution_slot
+
+    failed = SequenceExecution.objects.filter(pk=execution.pk, status='running').update(
+        status='failed', error_message=reason, completed_at=timezone.now()
+    ) == 1
+    if failed:
+        release_execution_slot(execution)
+    return failed
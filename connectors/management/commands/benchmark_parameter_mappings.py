@@ -0,0 +1,96 @@
+"""
+Benchmark action parameter mapping resolution
+
+Compares runtime resolution (SequenceExecutor._resolve_variables) with the
+plan's compiled resolvers on action nodes with wide body mappings. INFO
+logging is disabled while timing so only resolution itself is measured.
+"""
+import logging
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from connectors.execution_context import ExecutionContext
+from connectors.sequence_compiler import build_action_input, compile_action_input
+from connectors.sequence_executor import SequenceExecutor
+
+
+def build_action_node_data(width):
+    """Action node config with `width` body fields mixing variables, templates and literals"""
+    body = {}
+    for index in range(width):
+        kind = index % 4
+        if kind == 0:
+            body[f'field_{index}'] = {'type': 'variable', 'value': f'@event.field_{index}'}
+        elif kind == 1:
+            body[f'field_{index}'] = {'type': 'variable', 'value': '@trigger.@event.customer.id'}
+        elif kind == 2:
+            body[f'field_{index}'] = '{{node_1.body.items}}'
+        else:
+            body[f'field_{index}'] = {'type': 'static', 'value': f'literal {index}'}
+    return {
+        'actionConfig': {
+            'actionId': 1,
+            'parameterMappings': {
+                'path': {'id': {'type': 'variable', 'value': '@event.customer.id'}},
+                'headers': {'X-Request-Id': '{{execution_id}}'},
+                'body': body,
+            },
+        },
+    }
+
+
+def build_context(width):
+    trigger = {f'field_{index}': index for index in range(width)}
+    trigger['customer'] = {'id': 42}
+    return ExecutionContext({
+        'trigger': trigger,
+        'execution_id': 'benchmark',
+        'node_1': {'body': {'items': [1, 2, 3]}},
+    })
+
+
+class Command(BaseCommand):
+    help = 'Benchmark runtime vs compiled resolution of action parameter mappings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--widths', default='10,100,1000',
+                            help='Comma-separated numbers of body fields')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Resolutions per width and resolver')
+
+    def handle(self, *args, **options):
+        widths = [int(width) for width in options['widths'].split(',') if width.strip()]
+        repeat = max(1, options['repeat'])
+        sequence = SimpleNamespace(sequence_id='benchmark', name='benchmark', execution_config={})
+
+        self.stdout.write(f"{'fields':>8} {'runtime us':>12} {'compiled us':>12} {'speedup':>8}")
+
+        logging.disable(logging.INFO)
+        try:
+            for width in widths:
+                node_data = build_action_node_data(width)
+                executor = SequenceExecutor(sequence)
+                executor.context = build_context(width)
+                compiled = compile_action_input('benchmark', node_data)
+
+                expected = executor._resolve_variables(build_action_input(node_data))
+                if compiled(executor.context) != expected:
+                    self.stderr.write(f"Compiled resolution differs from runtime resolution at width {width}")
+                    continue
+
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    executor._resolve_variables(build_action_input(node_data))
+                runtime = (time.perf_counter() - started) / repeat
+
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    compiled(executor.context)
+                compiled_time = (time.perf_counter() - started) / repeat
+
+                self.stdout.write(
+                    f"{width:>8} {runtime * 1000000:>12.1f} {compiled_time * 1000000:>12.1f} "
+                    f"{runtime / compiled_time:>7.1f}x"
+                )
+        finally:
+            logging.disable(logging.NOTSET)
@@ -0,0 +1,89 @@
+"""
+Benchmark the sequence interpreter on synthetic linear flows
+
+Compares the per-node overhead of the stack-based SequenceExecutor against a
+reference recursive walker. Flows are made of api_call nodes (no I/O) and run
+against an in-memory plan, so nothing is written to the database.
+"""
+import sys
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from connectors.sequence_executor import SequenceExecutor, FlowFrame
+from connectors.sequence_plan import ExecutionPlan
+
+
+class RecursiveSequenceExecutor(SequenceExecutor):
+    """Reference walker - recurses once per node like the original interpreter"""
+
+    def _execute_flow(self, node_id, plan):
+        return self._resolve_step(self._step_node(node_id, plan), plan)
+
+    def _resolve_step(self, step, plan):
+        if not isinstance(step, FlowFrame):
+            return step
+        for op, target in step.pending:
+            if op == 'merge':
+                step.results.append(self._resolve_step(self._continue_after_merge(target, plan), plan))
+            else:
+                step.results.append(self._execute_flow(target, plan))
+        return step.value()
+
+
+def build_linear_flow(size):
+    """Trigger node followed by `size` api_call nodes in a chain"""
+    nodes = [{'id': 'trigger', 'type': 'event_trigger', 'data': {'label': 'Trigger'}}]
+    edges = []
+    previous = 'trigger'
+    for index in range(size):
+        node_id = f'node_{index}'
+        nodes.append({'id': node_id, 'type': 'api_call', 'data': {'label': f'Step {index}'}})
+        edges.append({'id': f'e_{index}', 'source': previous, 'target': node_id})
+        previous = node_id
+    return nodes, edges
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-node overhead of the sequence interpreter against a recursive walker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000',
+                            help='Comma-separated flow sizes (number of nodes)')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Runs per flow size and interpreter')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f"Python recursion limit: {sys.getrecursionlimit()}")
+        self.stdout.write(f"{'nodes':>8} {'interpreter':>12} {'total ms':>10} {'us/node':>10}")
+
+        for size in sizes:
+            nodes, edges = build_linear_flow(size)
+            plan = ExecutionPlan(nodes, edges)
+            for label, executor_class in (('stack', SequenceExecutor), ('recursive', RecursiveSequenceExecutor)):
+                try:
+                    elapsed = self._run(executor_class, plan, repeat)
+                except RecursionError:
+                    self.stdout.write(f"{size:>8} {label:>12} {'RecursionError':>21}")
+                    continue
+                per_run_ms = elapsed / repeat * 1000
+                per_node_us = elapsed / (repeat * size) * 1000000
+                self.stdout.write(f"{size:>8} {label:>12} {per_run_ms:>10.2f} {per_node_us:>10.2f}")
+
+    def _run(self, executor_class, plan, repeat):
+        """Total seconds for `repeat` walks of the plan"""
+        sequence = SimpleNamespace(
+            sequence_id='benchmark', name='benchmark', execution_config={'maxNodeVisits': 0}
+        )
+        elapsed = 0.0
+        for _ in range(repeat):
+            executor = executor_class(sequence)
+            executor.context = {'trigger': {}}
+            started = time.perf_counter()
+            executor._execute_flow(plan.start_node, plan)
+            elapsed += time.perf_counter() - started
+            # Logs are only buffered in memory, never written
+            executor.log_buffer._pending.clear()
+        return elapsed
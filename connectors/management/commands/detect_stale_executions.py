@@ -0,0 +1,51 @@
+"""
+Find sequence executions stuck at "running" without a heartbeat
+
+A worker that dies mid-sequence leaves its execution at "running" forever.
+This lists those executions and can resume them from their last checkpoint
+(--resume) or mark them failed (--mark-failed). Meant to run periodically,
+e.g. from cron; concurrent runs never resume the same execution twice.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from connectors.execution_recovery import claim_execution, mark_failed, resume_execution, stale_executions
+
+
+class Command(BaseCommand):
+    help = 'List, resume or fail running sequence executions that stopped sending heartbeats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, default=None,
+                            help='Seconds without heartbeat before an execution is stale (default SEQUENCE_STALE_AFTER)')
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--resume', action='store_true', help='Resume stale executions from their checkpoint')
+        action.add_argument('--mark-failed', action='store_true', help='Mark stale executions as failed')
+        parser.add_argument('--max-resumes', type=int, default=3,
+                            help='Mark executions failed instead of resuming them after this many resumes')
+
+    def handle(self, *args, **options):
+        if options['stale_after'] is not None and options['stale_after'] < 0:
+            raise CommandError('--stale-after must not be negative')
+
+        executions = list(
+            stale_executions(options['stale_after']).select_related('sequence', 'triggered_by_event', 'parent_execution')
+        )
+        if not executions:
+            self.stdout.write('No stale executions')
+            return
+
+        for execution in executions:
+            completed = len((execution.checkpoint or {}).get('completed_nodes', []))
+            self.stdout.write(
+                f"{execution.execution_id} sequence={execution.sequence.name} last_seen={execution.last_seen.isoformat()} "
+                f"checkpointed_nodes={completed} resumes={execution.resume_count}"
+            )
+
+            if options['mark_failed'] or (options['resume'] and execution.resume_count >= options['max_resumes']):
+                if mark_failed(execution, 'Execution stopped sending heartbeats'):
+                    self.stdout.write('  -> marked failed')
+            elif options['resume']:
+                if not claim_execution(execution):
+                    self.stdout.write('  -> already claimed by another worker, skipped')
+                    continue
+                result = resume_execution(execution)
+                self.stdout.write(f"  -> resumed: {result.get('status')}")
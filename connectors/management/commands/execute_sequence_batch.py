@@ -0,0 +1,77 @@
+"""
+Run a sequence, or every sequence listening to an event, against many trigger payloads
+
+Payloads are read from a file (or stdin with "-") holding a JSON array or
+NDJSON; NDJSON input is consumed line by line, so large backfills are not
+loaded into memory. One NDJSON result line is written per execution, followed
+by a summary line.
+"""
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from connectors.batch_execution import (
+    BatchPayloadError, BatchRunner, event_items, iter_ndjson, parse_payloads, sequence_items, summarize
+)
+from connectors.models import Event, Sequence
+
+
+class Command(BaseCommand):
+    help = 'Execute a sequence or event against a JSON array / NDJSON file of trigger payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Payload file (JSON array or NDJSON), "-" for stdin')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--sequence', type=int, help='ID of the sequence to execute')
+        target.add_argument('--event', type=int, help='ID of the event whose sequences to execute')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Executions running at once (default SEQUENCE_BATCH_MAX_WORKERS)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Executions written per batch (default SEQUENCE_BATCH_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options['input'] == '-' else self._open(options['input'])
+        try:
+            payloads = self._read_payloads(source)
+            if options['sequence'] is not None:
+                try:
+                    sequence = Sequence.objects.get(pk=options['sequence'])
+                except Sequence.DoesNotExist:
+                    raise CommandError(f"Sequence {options['sequence']} not found")
+                items = sequence_items(sequence, payloads)
+            else:
+                try:
+                    event = Event.objects.get(pk=options['event'])
+                except Event.DoesNotExist:
+                    raise CommandError(f"Event {options['event']} not found")
+                items = event_items(event, payloads)
+
+            runner = BatchRunner(max_workers=options['workers'], chunk_size=options['chunk_size'])
+            results, summary = summarize(runner.run(items))
+            for result in results:
+                self.stdout.write(json.dumps(result, default=str))
+        except BatchPayloadError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.stdout.write(json.dumps({'summary': summary}))
+        if summary['failed']:
+            self.stderr.write(f"{summary['failed']} of {summary['total']} executions failed")
+
+    def _open(self, path):
+        try:
+            return open(path, encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {str(e)}")
+
+    def _read_payloads(self, source):
+        """JSON arrays are parsed whole, NDJSON is streamed line by line"""
+        first_line = source.readline()
+        if first_line.lstrip().startswith('['):
+            return parse_payloads(first_line + source.read())
+
+        def lines():
+            yield first_line
+            yield from source
+        return iter_ndjson(lines())
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0029_add_oauth2_client_credentials'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequence',
+            name='execution_config',
+            field=models.JSONField(blank=True, default=dict, help_text="Execution settings for this sequence (e.g. {'maxParallelBranches': 4, 'parallelFailurePolicy': 'collect'})"),
+        ),
+    ]
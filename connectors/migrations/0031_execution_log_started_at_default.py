@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0030_sequence_execution_config'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='executionlog',
+            options={'ordering': ['sequence_execution', 'started_at', 'id']},
+        ),
+        migrations.AlterField(
+            model_name='executionlog',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_event_subscriptions(apps, schema_editor):
+    Sequence = apps.get_model('connectors', 'Sequence')
+    Event = apps.get_model('connectors', 'Event')
+    SequenceEventSubscription = apps.get_model('connectors', 'SequenceEventSubscription')
+
+    event_ids = set(Event.objects.values_list('id', flat=True))
+    subscriptions = []
+    for sequence in Sequence.objects.only('id', 'trigger_events'):
+        for event_id in sequence.trigger_events or []:
+            try:
+                event_id = int(event_id)
+            except (TypeError, ValueError):
+                continue
+            if event_id in event_ids:
+                subscriptions.append(SequenceEventSubscription(sequence_id=sequence.id, event_id=event_id))
+    SequenceEventSubscription.objects.bulk_create(subscriptions, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0031_execution_log_started_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceEventSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sequence_subscriptions', to='connectors.event')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_subscriptions', to='connectors.sequence')),
+            ],
+            options={
+                'unique_together': {('event', 'sequence')},
+            },
+        ),
+        migrations.RunPython(populate_event_subscriptions, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0032_sequenceeventsubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, help_text='Number of event-node hops from the root execution'),
+        ),
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='parent_execution',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='child_executions', to='connectors.sequenceexecution'),
+        ),
+    ]
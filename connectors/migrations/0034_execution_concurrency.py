@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0033_sequence_execution_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='max_concurrent_executions',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum sequence executions triggered by this event running at once (empty = settings default, 0 = no limit)', null=True),
+        ),
+        migrations.CreateModel(
+            name='ExecutionConcurrencyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('sequence', 'Sequence'), ('event', 'Event')], max_length=10)),
+                ('object_id', models.IntegerField(help_text='Sequence or Event primary key')),
+                ('in_flight', models.IntegerField(default=0)),
+                ('queued', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('scope', 'object_id')},
+            },
+        ),
+    ]
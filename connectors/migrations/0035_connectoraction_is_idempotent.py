@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0034_execution_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectoraction',
+            name='is_idempotent',
+            field=models.BooleanField(blank=True, help_text='Whether repeating the call with the same parameters returns the same result (empty = GET actions only)', null=True),
+        ),
+    ]
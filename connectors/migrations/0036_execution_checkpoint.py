@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0035_connectoraction_is_idempotent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict, help_text='Interpreter stack, completed nodes and context at the last checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last sign of life of the worker running this execution', null=True),
+        ),
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='resume_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of times this execution was resumed'),
+        ),
+    ]
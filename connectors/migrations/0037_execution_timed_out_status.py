@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0036_execution_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sequenceexecution',
+            name='status',
+            field=models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('timed_out', 'Timed Out'), ('cancelled', 'Cancelled')], default='running', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0037_execution_timed_out_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='cancel_requested_at',
+            field=models.DateTimeField(blank=True, help_text='When cancellation was requested - the worker stops at the next node', null=True),
+        ),
+    ]
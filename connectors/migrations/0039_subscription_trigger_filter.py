@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0038_execution_cancel_requested'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequenceeventsubscription',
+            name='filtered_count',
+            field=models.PositiveBigIntegerField(default=0, help_text='Deliveries skipped because the payload did not match'),
+        ),
+        migrations.AddField(
+            model_name='sequenceeventsubscription',
+            name='last_filtered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sequenceeventsubscription',
+            name='trigger_filter',
+            field=models.JSONField(blank=True, default=dict, help_text='Condition set the event payload must match to start the sequence (empty = always)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0039_subscription_trigger_filter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='executionlog',
+            name='node_type',
+            field=models.CharField(choices=[('trigger', 'Trigger'), ('action', 'Action'), ('condition', 'Condition'), ('event', 'Event'), ('custom_rule', 'Custom Rule'), ('map', 'Map')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connectors', '0040_execution_log_map_node_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sequenceexecution',
+            name='holds_concurrency_slot',
+            field=models.BooleanField(default=False, help_text='Whether the execution holds an in-flight slot (see concurrency.ExecutionSlot)'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import json
 
 
@@ -392,6 +393,10 @@ class ConnectorAction(models.Model):
     description = models.TextField(blank=True)
     http_method = models.CharField(max_length=10, choices=HTTP_METHODS, default='GET')
     endpoint_path = models.CharField(max_length=500, help_text="Path to append to base URL with optional templates (e.g., /api/users/{userId})")
+    is_idempotent = models.BooleanField(
+        null=True, blank=True,
+        help_text="Whether repeating the call with the same parameters returns the same result (empty = GET actions only)"
+    )
 
     # Action execution type
     action_type = models.CharField(max_length=10, choices=ACTION_TYPES, default='sync', help_text="Whether this action executes synchronously or asynchronously")
@@ -495,6 +500,13 @@ class ConnectorAction(models.Model):
     def __str__(self):
         return f"{self.connector.name} - {self.name}"
 
+    @property
+    def idempotent(self):
+        """is_idempotent if set, otherwise GET actions are treated as idempotent"""
+        if self.is_idempotent is not None:
+            return self.is_idempotent
+        return self.http_method == 'GET'
+
     class Meta:
         ordering = ['connector__name', 'name']
         unique_together = ['connector', 'name']
@@ -688,6 +700,10 @@ class Event(models.Model):
 
     # Legacy fields (keeping for backward compatibility)
     parameters = models.JSONField(default=list, blank=True, help_text="List of parameter names in scope for this event")
+    max_concurrent_executions = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Maximum sequence executions triggered by this event running at once (empty = settings default, 0 = no limit)"
+    )
     schema = models.JSONField(default=dict, blank=True, help_text="JSON schema defining event structure")
 
     # Metadata
@@ -760,6 +776,7 @@ class Sequence(models.Model):
     trigger_events = models.JSONField(default=list, blank=True, help_text="Events that trigger this sequence")
     version = models.CharField(max_length=20, default='1.0', help_text="Sequence version")
     variables = models.JSONField(default=list, blank=True, help_text="Sequence variables for storing workflow data")
+    execution_config = models.JSONField(default=dict, blank=True, help_text="Execution settings for this sequence (e.g. {'maxParallelBranches': 4, 'parallelFailurePolicy': 'collect'})")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -781,10 +798,99 @@ class Sequence(models.Model):
             if not Sequence.objects.filter(sequence_id=sequence_id).exists():
                 return sequence_id
 
+    def sync_event_subscriptions(self):
+        """Bring the SequenceEventSubscription rows in line with trigger_events"""
+        wanted_ids = set()
+        for event_id in self.trigger_events or []:
+            try:
+                wanted_ids.add(int(event_id))
+            except (TypeError, ValueError):
+                continue
+        # Ignore references to events that no longer exist
+        wanted_ids = set(Event.objects.filter(id__in=wanted_ids).values_list('id', flat=True))
+
+        existing_ids = set(self.event_subscriptions.values_list('event_id', flat=True))
+
+        stale_ids = existing_ids - wanted_ids
+        if stale_ids:
+            self.event_subscriptions.filter(event_id__in=stale_ids).delete()
+
+        missing_ids = wanted_ids - existing_ids
+        if missing_ids:
+            SequenceEventSubscription.objects.bulk_create([
+                SequenceEventSubscription(sequence=self, event_id=event_id) for event_id in missing_ids
+            ], ignore_conflicts=True)
+
     class Meta:
         ordering = ['name']
 
 
+class SequenceEventSubscription(models.Model):
+    """
+    Reverse index from an Event to the Sequences listing it in trigger_events
+
+    Kept in sync by a post_save signal on Sequence; rows cascade away when
+    either side is deleted. Lets trigger resolution be one indexed query
+    instead of loading every active sequence.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='sequence_subscriptions')
+    sequence = models.ForeignKey(Sequence, on_delete=models.CASCADE, related_name='event_subscriptions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Trigger-time filter (see trigger_filters.py)
+    trigger_filter = models.JSONField(default=dict, blank=True,
+                                      help_text="Condition set the event payload must match to start the sequence (empty = always)")
+    filtered_count = models.PositiveBigIntegerField(default=0, help_text="Deliveries skipped because the payload did not match")
+    last_filtered_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event.name} -> {self.sequence.name}"
+
+    @staticmethod
+    def get_active_sequences(event):
+        """
+        Active sequences subscribed to an event, each with the trigger_filter
+        of its subscription
+
+        Flow JSON is deferred - it is only loaded if a sequence is executed and
+        its compiled plan is not cached yet.
+        """
+        return Sequence.objects.filter(
+            status='active',
+            event_subscriptions__event=event
+        ).annotate(
+            trigger_filter=models.F('event_subscriptions__trigger_filter')
+        ).defer('flow_nodes', 'flow_edges')
+
+    class Meta:
+        unique_together = ['event', 'sequence']
+
+
+class ExecutionConcurrencyCounter(models.Model):
+    """
+    In-flight and queued execution counts per sequence or per event
+
+    Shared by every worker process through the database and only changed with
+    conditional F() updates, so limits hold across processes (see concurrency.py).
+    """
+    SCOPE_CHOICES = [
+        ('sequence', 'Sequence'),
+        ('event', 'Event'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.IntegerField(help_text="Sequence or Event primary key")
+    in_flight = models.IntegerField(default=0)
+    queued = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id}: {self.in_flight} in flight, {self.queued} queued"
+
+    class Meta:
+        unique_together = ['scope', 'object_id']
+
+
 class ActivityLog(models.Model):
     """
     Tracks all CRUD operations on key entities (actions, credentials, sequences, events, connectors)
@@ -849,6 +955,7 @@ class SequenceExecution(models.Model):
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('timed_out', 'Timed Out'),
         ('cancelled', 'Cancelled'),
     ]
 
@@ -859,6 +966,11 @@ class SequenceExecution(models.Model):
     triggered_by_event = models.ForeignKey(Event, on_delete=models.SET_NULL, null=True, blank=True)
     trigger_payload = models.JSONField(default=dict, help_text="Event payload that triggered this execution")
 
+    # Executions started by an event node of another execution
+    parent_execution = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                         related_name='child_executions')
+    depth = models.PositiveIntegerField(default=0, help_text="Number of event-node hops from the root execution")
+
     # Trigger source information
     trigger_ip = models.GenericIPAddressField(null=True, blank=True, help_text="IP address that triggered the event")
     trigger_os = models.CharField(max_length=100, blank=True, help_text="Operating system of the triggering device")
@@ -878,9 +990,31 @@ class SequenceExecution(models.Model):
     final_output = models.JSONField(default=dict, blank=True, help_text="Final output/results of the sequence")
     variables_state = models.JSONField(default=dict, blank=True, help_text="Final state of sequence variables")
 
+    # Checkpoint / resume
+    checkpoint = models.JSONField(default=dict, blank=True,
+                                  help_text="Interpreter stack, completed nodes and context at the last checkpoint")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life of the worker running this execution")
+    resume_count = models.PositiveIntegerField(default=0, help_text="Number of times this execution was resumed")
+    holds_concurrency_slot = models.BooleanField(
+        default=False, help_text="Whether the execution holds an in-flight slot (see concurrency.ExecutionSlot)"
+    )
+
+    # Cancellation
+    cancel_requested_at = models.DateTimeField(null=True, blank=True,
+                                               help_text="When cancellation was requested - the worker stops at the next node")
+
     def __str__(self):
         return f"{self.sequence.name} - {self.execution_id} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        """Override save so a full save never overwrites holds_concurrency_slot - it only changes with conditional updates"""
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'holds_concurrency_slot']
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-started_at']
         indexes = [
@@ -906,6 +1040,7 @@ class ExecutionLog(models.Model):
         ('condition', 'Condition'),
         ('event', 'Event'),
         ('custom_rule', 'Custom Rule'),
+        ('map', 'Map'),
     ]
 
     sequence_execution = models.ForeignKey(SequenceExecution, on_delete=models.CASCADE, related_name='logs')
@@ -920,13 +1055,15 @@ class ExecutionLog(models.Model):
     message = models.TextField(help_text="Log message describing what happened")
 
     # Execution details
-    status = models.CharField(max_length=20, default='started')  # started, completed, failed, skipped
+    status = models.CharField(max_length=20, default='started')  # started, completed, failed, skipped, timed_out, cancelled
     input_data = models.JSONField(default=dict, blank=True, help_text="Input data for this node")
     output_data = models.JSONField(default=dict, blank=True, help_text="Output data from this node")
     error_details = models.JSONField(default=dict, blank=True, help_text="Error details if node failed")
 
     # Timing
-    started_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: logs are written in bulk after the node ran, so the
+    # executor passes the node's real start time
+    started_at = models.DateTimeField(default=timezone.now)
     completed_at = models.DateTimeField(null=True, blank=True)
     duration_ms = models.IntegerField(null=True, blank=True)
 
@@ -937,7 +1074,7 @@ class ExecutionLog(models.Model):
         return f"{self.sequence_execution.execution_id} - {self.node_name} ({self.log_level})"
 
     class Meta:
-        ordering = ['sequence_execution', 'started_at']
+        ordering = ['sequence_execution', 'started_at', 'id']
         indexes = [
             models.Index(fields=['sequence_execution', 'started_at']),
             models.Index(fields=['log_level', 'started_at']),
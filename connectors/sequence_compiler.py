@@ -0,0 +1,390 @@
+"""
+Sequence Compiler
+Compiles node configuration into resolvers that run without any string parsing
+"""
+import re
+from collections.abc import Mapping
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def lookup_path(context, path):
+    """
+    Get a value from the context by a pre-split path tuple
+
+    Same semantics as SequenceExecutor._get_context_value: only mappings are
+    walked, anything else along the way resolves to None.
+    """
+    value = context
+    for part in path:
+        # Plain dicts first - the ABC check is comparatively slow
+        if isinstance(value, dict) or isinstance(value, Mapping):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+def variable_reference_path(var_ref):
+    """
+    Split a {"type": "variable", "value": ...} reference into a context path
+
+    @event.field maps to trigger.field, and duplicated "@event." prefixes
+    (trigger.@event.field) are collapsed, as in SequenceExecutor._resolve_variables.
+    """
+    if var_ref.startswith('@'):
+        attr_path = var_ref[1:]
+        if attr_path.startswith('event.'):
+            attr_path = 'trigger.' + attr_path[6:]
+        while attr_path.startswith('trigger.@event.'):
+            attr_path = 'trigger.' + attr_path[15:]
+    else:
+        attr_path = var_ref
+    return tuple(attr_path.split('.'))
+
+
+class CompileError(Exception):
+    """Raised when node configuration cannot be compiled"""
+    pass
+
+
+def compile_value(data):
+    """
+    Compile a (possibly nested) value with variable references into a resolver
+
+    Variable references become path getters and everything else becomes a
+    literal slot, so resolving it for an execution is a walk over prebuilt
+    getters. Mirrors SequenceExecutor._resolve_variables.
+
+    Args:
+        data: Parameter mapping value (dict/list/str/literal)
+
+    Returns:
+        callable: resolver(context) -> resolved value
+
+    Raises:
+        CompileError: If the value contains a malformed variable reference
+    """
+    if isinstance(data, dict):
+        if data.get('type') == 'variable' and 'value' in data:
+            var_ref = data['value']
+            if not isinstance(var_ref, str):
+                raise CompileError(f"Variable reference must be a string, got {type(var_ref).__name__}")
+            path = variable_reference_path(var_ref)
+            return lambda context: lookup_path(context, path)
+
+        # Dict of getters and literal slots, rebuilt per execution
+        getters = [(key, compile_value(value)) for key, value in data.items()]
+        return lambda context: {key: getter(context) for key, getter in getters}
+
+    if isinstance(data, list):
+        getters = [compile_value(item) for item in data]
+        return lambda context: [getter(context) for getter in getters]
+
+    if isinstance(data, str) and data.startswith('{{') and data.endswith('}}'):
+        path = tuple(data[2:-2].strip().split('.'))
+        return lambda context: lookup_path(context, path)
+
+    return lambda context: data
+
+
+def build_action_input(node_data):
+    """
+    Raw (unresolved) input of an action node
+
+    Built from actionConfig.parameterMappings per parameter type, falling back
+    to the legacy inputData format.
+    """
+    action_config = node_data.get('actionConfig', {})
+    parameter_mappings = action_config.get('parameterMappings', {})
+
+    input_data = {}
+    for param_type in ['path', 'query', 'headers', 'body']:
+        if param_type in parameter_mappings:
+            type_params = parameter_mappings[param_type]
+            if isinstance(type_params, dict):
+                for key, value in type_params.items():
+                    if not input_data.get(param_type):
+                        input_data[param_type] = {}
+                    input_data[param_type][key] = value
+
+    # Fallback to old inputData format if no parameter mappings
+    if not input_data:
+        input_data = node_data.get('inputData', {})
+
+    return input_data
+
+
+def compile_action_input(node_id, node_data):
+    """Compile an action node's input, or None if it has to be resolved at runtime"""
+    try:
+        return compile_value(build_action_input(node_data))
+    except CompileError as e:
+        logger.warning(f"Could not compile parameter mappings of node {node_id}: {str(e)}")
+        return None
+
+
+def _as_number(value):
+    """Number of an int/float or numeric string operand, else None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        number = _coerce_number(value.strip())
+        if not isinstance(number, str):
+            return number
+    return None
+
+
+def _ordered(compare):
+    """
+    Ordering comparison that is False (not an error) for missing or incomparable operands.
+    Numeric strings - common in webhook payloads - compare as numbers when the
+    other operand is numeric too, like rule_dsl's conditions.
+    """
+    def evaluate(left, right):
+        if isinstance(left, str) or isinstance(right, str):
+            left_number, right_number = _as_number(left), _as_number(right)
+            if left_number is not None and right_number is not None:
+                left, right = left_number, right_number
+        try:
+            return compare(left, right)
+        except TypeError:
+            return False
+    return evaluate
+
+
+def _contains(left, right):
+    return right in left if isinstance(left, (str, list)) else False
+
+
+def _not_contains(left, right):
+    return right not in left if isinstance(left, (str, list)) else True
+
+
+def _length(value):
+    return len(value) if isinstance(value, (str, list, dict)) else None
+
+
+def _matches_regex(left, right):
+    if not isinstance(left, str) or right is None:
+        return False
+    pattern = right if hasattr(right, 'search') else re.compile(str(right))
+    return pattern.search(left) is not None
+
+
+def _in_list(left, right):
+    if isinstance(right, str):
+        right = [item.strip() for item in right.split(',')]
+    return left in right if isinstance(right, (list, tuple, set)) else False
+
+
+# Condition operators (frontend names and symbolic aliases) -> fn(left, right)
+CONDITION_OPERATORS = {
+    'equals': lambda left, right: left == right,
+    'not_equals': lambda left, right: left != right,
+    'greater_than': _ordered(lambda left, right: left > right),
+    'less_than': _ordered(lambda left, right: left < right),
+    'greater_than_or_equal': _ordered(lambda left, right: left >= right),
+    'less_than_or_equal': _ordered(lambda left, right: left <= right),
+    'contains': _contains,
+    'not_contains': _not_contains,
+    'starts_with': lambda left, right: isinstance(left, str) and left.startswith(str(right)),
+    'ends_with': lambda left, right: isinstance(left, str) and left.endswith(str(right)),
+    'matches_regex': _matches_regex,
+    'length_equals': lambda left, right: _length(left) is not None and _length(left) == right,
+    'length_gt': _ordered(lambda left, right: _length(left) is not None and _length(left) > right),
+    'length_lt': _ordered(lambda left, right: _length(left) is not None and _length(left) < right),
+    'in': _in_list,
+    'not_in': lambda left, right: not _in_list(left, right),
+    'is_empty': lambda left, right: left is None or left == '' or left == [] or left == {},
+    'is_not_empty': lambda left, right: not (left is None or left == '' or left == [] or left == {}),
+    'is_null': lambda left, right: left is None,
+    'is_not_null': lambda left, right: left is not None,
+}
+CONDITION_OPERATORS.update({
+    '==': CONDITION_OPERATORS['equals'],
+    '!=': CONDITION_OPERATORS['not_equals'],
+    '>': CONDITION_OPERATORS['greater_than'],
+    '<': CONDITION_OPERATORS['less_than'],
+    '>=': CONDITION_OPERATORS['greater_than_or_equal'],
+    '<=': CONDITION_OPERATORS['less_than_or_equal'],
+})
+
+# Operators whose static value is entered as a number
+_NUMERIC_OPERATORS = (
+    'greater_than', 'less_than', 'greater_than_or_equal', 'less_than_or_equal', '>', '<', '>=', '<=',
+    'length_equals', 'length_gt', 'length_lt',
+)
+
+# Extra evaluation cost per operator, used to order conditions cheapest first
+_OPERATOR_COST = {'matches_regex': 4, 'contains': 1, 'not_contains': 1, 'in': 1, 'not_in': 1}
+
+_CONDITION_ROOT_ALIASES = {'event': ('trigger',), 'trigger': ('trigger',), 'sequence': (), 'workflow': ()}
+
+
+def condition_variable_path(variable):
+    """
+    Context path of a condition's left-hand variable
+
+    @event.x / @trigger.x read the trigger payload, @sequence.x / @workflow.x
+    read context variables and any other @root.path is read from the context
+    root. Un-prefixed variables refer to the trigger payload.
+    """
+    if variable.startswith('@'):
+        parts = tuple(variable[1:].split('.'))
+        if parts[0] in _CONDITION_ROOT_ALIASES:
+            parts = _CONDITION_ROOT_ALIASES[parts[0]] + parts[1:]
+        return parts
+    return ('trigger',) + tuple(variable.split('.'))
+
+
+def _coerce_number(value):
+    """Numeric static values arrive as strings from the condition drawer"""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+def _compile_operand(value):
+    """Compile a right-hand operand: {{path}} or @reference become getters, anything else a literal"""
+    if isinstance(value, str) and value.startswith('{{') and value.endswith('}}'):
+        path = tuple(value[2:-2].strip().split('.'))
+        return (lambda context: lookup_path(context, path)), len(path)
+    if isinstance(value, str) and value.startswith('@'):
+        path = condition_variable_path(value)
+        return (lambda context: lookup_path(context, path)), len(path)
+    return (lambda context: value), 0
+
+
+def _compile_operator(operator):
+    evaluate = CONDITION_OPERATORS.get(operator)
+    if evaluate is None:
+        raise CompileError(f"Unknown operator: {operator}")
+    return evaluate
+
+
+def compile_condition(condition):
+    """
+    Compile one condition of a condition set
+
+    Returns:
+        tuple: (predicate(context) -> bool, cost)
+    """
+    variable = condition.get('variable')
+    if not isinstance(variable, str) or not variable:
+        raise CompileError('Condition has no variable')
+    operator = condition.get('operator')
+    evaluate = _compile_operator(operator)
+
+    left_path = condition_variable_path(variable)
+    cost = len(left_path) + _OPERATOR_COST.get(operator, 0)
+
+    if condition.get('valueType') == 'static':
+        right_value = condition.get('staticValue')
+        # Remove escaped quotes if present
+        if isinstance(right_value, str) and right_value.startswith('"') and right_value.endswith('"'):
+            right_value = right_value[1:-1]
+        if operator in _NUMERIC_OPERATORS:
+            right_value = _coerce_number(right_value)
+        elif operator == 'matches_regex' and isinstance(right_value, str):
+            try:
+                right_value = re.compile(right_value)
+            except re.error as e:
+                raise CompileError(f"Invalid regex '{right_value}': {str(e)}")
+
+        def predicate(context):
+            return evaluate(lookup_path(context, left_path), right_value)
+    else:
+        get_right, right_cost = _compile_operand(condition.get('dynamicVariable'))
+        cost += right_cost
+
+        def predicate(context):
+            return evaluate(lookup_path(context, left_path), get_right(context))
+
+    return predicate, cost
+
+
+def compile_condition_set(condition_set):
+    """
+    Compile a condition set into a single predicate, or None if it has no conditions
+
+    Conditions are joined by each condition's logicGate with AND binding
+    tighter than OR, i.e. the set is an OR of AND groups. Evaluation short
+    circuits, and within each AND group (and across OR groups) the cheapest
+    conditions - literal comparisons on shallow paths - are checked first.
+    """
+    groups = []
+    for index, condition in enumerate(condition_set.get('conditions', [])):
+        compiled = compile_condition(condition)
+        if index == 0 or str(condition.get('logicGate') or 'AND').upper() != 'OR':
+            if not groups:
+                groups.append([])
+            groups[-1].append(compiled)
+        else:
+            groups.append([compiled])
+
+    if not groups:
+        return None
+
+    # Cost-ordered: conditions are pure, so only the amount of work changes
+    ordered_groups = []
+    for group in groups:
+        group.sort(key=lambda compiled: compiled[1])
+        ordered_groups.append(([predicate for predicate, _ in group], sum(cost for _, cost in group)))
+    ordered_groups.sort(key=lambda group: group[1])
+    and_groups = [predicates for predicates, _ in ordered_groups]
+
+    def predicate(context):
+        return any(all(check(context) for check in checks) for checks in and_groups)
+
+    return predicate
+
+
+class CompiledConditionNode:
+    """
+    Compiled conditionSets of a condition node
+
+    Sets are tried in order and the first matching set wins, so its index
+    selects the "set-N" edge to follow.
+    """
+
+    def __init__(self, set_predicates):
+        self.set_predicates = set_predicates  # [(set index, predicate)]
+
+    def evaluate(self, context):
+        """Index of the first matching condition set, or None"""
+        for index, predicate in self.set_predicates:
+            if predicate(context):
+                return index
+        return None
+
+
+def compile_condition_node(node_data):
+    """
+    Compile a condition node's conditionSets
+
+    Returns:
+        CompiledConditionNode, or None if the node uses the legacy
+        single-condition format
+
+    Raises:
+        CompileError: If a condition is malformed (e.g. unknown operator)
+    """
+    condition_sets = node_data.get('conditionSets', [])
+    if not condition_sets:
+        return None
+    set_predicates = []
+    for index, condition_set in enumerate(condition_sets):
+        predicate = compile_condition_set(condition_set)
+        if predicate is not None:
+            set_predicates.append((index, predicate))
+    return CompiledConditionNode(set_predicates)
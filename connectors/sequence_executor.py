@@ -2,25 +2,166 @@
 Sequence Executor Service
 Executes sequences triggered by events and logs execution details
 """
+import copy
 import json
 import uuid
 import time
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from .models import Sequence, Event, SequenceExecution, ExecutionLog, ConnectorAction
+from django.db import transaction, connections
+from .models import Sequence, SequenceEventSubscription, Event, SequenceExecution, ExecutionLog, ConnectorAction
+from .sequence_plan import get_execution_plan, TRIGGER_NODE_TYPES
+from .execution_log_buffer import ExecutionLogBuffer, ExecutionLogAggregator
+from .action_memo import ActionMemo
+from .action_resolver import ActionResolver
+from .execution_context import ExecutionContext
+from .dispatcher import sequence_dispatcher, execute_sequence_job, partition_key, DispatcherQueueFull
+from .concurrency import admit_execution
+from .trigger_filters import filter_sequences
+from .execution_recovery import heartbeat_ticker
+from .cancellation import CancellationToken, ExecutionCancelled, register as register_cancellation, unregister as unregister_cancellation
+from .sequence_compiler import build_action_input, compile_condition_node, CompileError, CONDITION_OPERATORS
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+PARALLEL_FAILURE_POLICIES = ('collect', 'fail_fast')
+CHILD_EXECUTION_MODES = ('await', 'fire_and_forget')
+MAP_LOG_MODES = ('aggregate', 'detailed')
+
+# Global cap on parallel branch threads across all executions in this process.
+# Branches that cannot get a slot run inline in the dispatching thread, so nested
+# parallel nodes can never deadlock waiting for the pool.
+_parallel_max_workers = max(1, getattr(settings, 'SEQUENCE_PARALLEL_MAX_WORKERS', 16))
+_parallel_branch_pool = ThreadPoolExecutor(max_workers=_parallel_max_workers, thread_name_prefix='sequence-branch')
+_parallel_branch_slots = threading.BoundedSemaphore(_parallel_max_workers)
+
+
+class ParallelBranchAborted(Exception):
+    """Raised inside a parallel branch when a sibling failed under the fail_fast policy"""
+    pass
+
+
+class NodeVisitBudgetExceeded(Exception):
+    """Raised when an execution visits more nodes than its node-visit budget allows"""
+    pass
+
+
+class ExecutionTimedOut(Exception):
+    """Raised when an execution or one of its nodes runs out of its time budget"""
+    pass
+
+
+class ExecutionDeadline:
+    """
+    Wall-clock time budget of an execution or a node
+
+    A deadline never outlives its parent: a node's deadline is the earlier of
+    its own timeout and the sequence's, and child executions started by an
+    awaited event node inherit the remaining budget of their parent.
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        self.seconds = seconds or None  # None/0 = no limit of its own
+        self.expires_at = time.monotonic() + float(self.seconds) if self.seconds else None
+        if parent is not None and parent.expires_at is not None:
+            self.expires_at = parent.expires_at if self.expires_at is None else min(self.expires_at, parent.expires_at)
+
+    def child(self, seconds=None):
+        """Deadline of a node or child execution running under this one"""
+        return ExecutionDeadline(seconds, parent=self)
+
+    def remaining(self):
+        """Seconds left, or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+class NodeVisitBudget:
+    """
+    Caps the number of node visits of one execution to stop runaway flows
+    (e.g. cycles in the flow graph). Shared by all branches of the execution.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(0, int(limit or 0))  # 0 disables the budget
+        self.visits = 0
+        self._lock = threading.Lock()
+
+    def spend(self, node_id):
+        """Charge one node visit, raising NodeVisitBudgetExceeded when over the limit"""
+        with self._lock:
+            self.visits += 1
+            if self.limit and self.visits > self.limit:
+                raise NodeVisitBudgetExceeded(
+                    f"Node visit budget of {self.limit} exceeded at node {node_id}"
+                )
+
+
+class FlowFrame:
+    """
+    One fan-out point on the interpreter's work stack
+
+    Holds the (op, node_id) steps still to run after a node - op is 'node' to
+    visit a node or 'merge' to continue past a joined merge node - and the
+    values of the steps already run. Frames only hold ids and results.
+    """
+
+    __slots__ = ('source', 'pending', 'index', 'results')
+
+    def __init__(self, source, pending):
+        self.source = source
+        self.pending = pending
+        self.index = 0
+        self.results = []
+
+    @classmethod
+    def for_nodes(cls, source, node_ids):
+        """Frame visiting the given nodes in order, or None if there are none"""
+        if not node_ids:
+            return None
+        return cls(source, [('node', node_id) for node_id in node_ids])
+
+    def value(self):
+        """Single child value, or the list of child values on a fan-out"""
+        return self.results[0] if len(self.results) == 1 else self.results
+
+    def to_checkpoint(self):
+        """JSON-serializable state of the frame"""
+        return {
+            'source': self.source,
+            'pending': [list(step) for step in self.pending],
+            'index': self.index,
+            'results': self.results,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data):
+        """Rebuild a frame saved with to_checkpoint()"""
+        frame = cls(data.get('source'), [tuple(step) for step in data.get('pending', [])])
+        frame.index = data.get('index', 0)
+        frame.results = list(data.get('results', []))
+        return frame
+
+
 class SequenceExecutor:
     """
     Executes sequences node by node, following the flow graph
     Creates execution logs for tracking and debugging
     """
 
-    def __init__(self, sequence, event=None, trigger_data=None, trigger_source=None):
+    def __init__(self, sequence, event=None, trigger_data=None, trigger_source=None,
+                 parent_execution=None, depth=0, lineage=(), execution=None, batch=None, deadline=None,
+                 cancellation=None, slot=None):
         """
         Initialize the sequence executor
 
@@ -29,47 +170,128 @@ class SequenceExecutor:
             event: Optional Event that triggered this sequence
             trigger_data: Optional data from the trigger event
             trigger_source: Optional dict with IP, OS, Device, Browser info
+            parent_execution: Optional SequenceExecution whose event node started this one
+            depth: Number of event-node hops from the root execution
+            lineage: IDs of the sequences already running in this event chain
+            execution: Optional pre-created SequenceExecution row to run under
+            batch: Optional ExecutionBatch that writes logs and the final
+                execution row together with the rest of its chunk
+            deadline: Optional ExecutionDeadline of the parent execution to stay within
+            cancellation: Optional CancellationToken of the parent execution - cancelling
+                the parent cancels this execution too
+            slot: Optional ExecutionSlot the caller admitted this execution with;
+                attached to the execution row once it exists. The caller still
+                releases it.
         """
         self.sequence = sequence
         self.event = event
         self.trigger_data = trigger_data or {}
         self.trigger_source = trigger_source or {}
-        self.execution = None
-        self.context = {}  # Shared context for passing data between nodes
+        self.parent_execution = parent_execution
+        self.depth = depth
+        self.lineage = frozenset(lineage) | {getattr(sequence, 'pk', None)}
+        self.execution = execution
+        self.batch = batch
+        self.slot = slot
+        self.context = ExecutionContext()  # Shared context for passing data between nodes
         self.action_executor = ActionExecutor()
-
-    def execute(self):
+        self.plan = None  # Compiled ExecutionPlan, set once the execution starts
+        self.action_resolver = None
+        self.log_buffer = batch.log_buffer if batch is not None else ExecutionLogBuffer.for_sequence(sequence)
+        self.action_memo = ActionMemo.for_sequence(sequence)
+        self._node_log_metadata = {}  # Extra ExecutionLog metadata of the node being executed
+        self._log_metadata_base = {}  # Metadata on every log row (e.g. the map item being run)
+
+        execution_config = sequence.execution_config or {}
+        self._visit_budget = NodeVisitBudget(
+            execution_config.get('maxNodeVisits', getattr(settings, 'SEQUENCE_MAX_NODE_VISITS', 10000))
+        )
+
+        # Checkpoints every N executed nodes (0 = only at nodes flagged "checkpoint");
+        # heartbeats come from heartbeat_ticker while execute() runs
+        self._checkpoint_every = max(0, int(execution_config.get(
+            'checkpointEvery', getattr(settings, 'SEQUENCE_CHECKPOINT_EVERY', 0)
+        ) or 0))
+
+        # Time budget - starts when execute() runs (0 = no limit)
+        self._timeout_seconds = execution_config.get('timeoutSeconds', getattr(settings, 'SEQUENCE_TIMEOUT', 0))
+        self._parent_deadline = deadline
+        self._deadline = ExecutionDeadline()
+        self._node_deadline = self._deadline
+        self._cancellation = CancellationToken(parent=cancellation)  # Shared with branch copies
+        self._completed_nodes = []  # Shared with branch copies, so branch nodes count too
+        self._checkpointed_nodes = 0
+
+        # Parallel branch state - only set on branch copies of the executor
+        self._in_branch = False
+        self._merge_arrivals = []  # (merge node id, last result) reached by this branch
+        self._last_result = None
+        self._abort_event = None
+        self._branch_slots = None  # Per-execution cap on concurrently running branches
+
+    def execute(self, resume_from=None):
         """
         Execute the sequence and return the result
 
+        Args:
+            resume_from: Checkpoint of self.execution to continue from (see resume())
+
         Returns:
             dict: Execution result with status, output, and execution_id
         """
-        execution_id = str(uuid.uuid4())
+        execution_id = self.execution.execution_id if self.execution else str(uuid.uuid4())
         start_time = timezone.now()
+        plan = None
+        resuming = resume_from is not None
+        held_pk = None
 
         try:
-            # Create the sequence execution record
-            with transaction.atomic():
-                self.execution = SequenceExecution.objects.create(
-                    execution_id=execution_id,
-                    sequence=self.sequence,
-                    triggered_by_event=self.event,
-                    status='running',
-                    started_at=start_time,
-                    trigger_payload=self.trigger_data,
-                    variables_state={},
-                    trigger_ip=self.trigger_source.get('ip'),
-                    trigger_os=self.trigger_source.get('os', ''),
-                    trigger_device=self.trigger_source.get('device', ''),
-                    trigger_browser=self.trigger_source.get('browser', '')
+            if resuming:
+                # Durations keep counting from the original start
+                start_time = self.execution.started_at or start_time
+                self.execution.status = 'running'
+                self.execution.error_message = ''
+                self.execution.completed_at = None
+                self.execution.heartbeat_at = timezone.now()
+                SequenceExecution.objects.filter(pk=self.execution.pk).update(
+                    status='running', error_message='', completed_at=None, heartbeat_at=self.execution.heartbeat_at
                 )
 
-            logger.info(f"Starting sequence execution {execution_id} for sequence '{self.sequence.name}'")
+            # Create the sequence execution record (unless it was created with its batch)
+            elif self.execution is None:
+                with transaction.atomic():
+                    self.execution = SequenceExecution.objects.create(
+                        execution_id=execution_id,
+                        sequence=self.sequence,
+                        triggered_by_event=self.event,
+                        parent_execution=self.parent_execution,
+                        depth=self.depth,
+                        status='running',
+                        started_at=start_time,
+                        heartbeat_at=start_time,
+                        trigger_payload=self.trigger_data,
+                        variables_state={},
+                        trigger_ip=self.trigger_source.get('ip'),
+                        trigger_os=self.trigger_source.get('os', ''),
+                        trigger_device=self.trigger_source.get('device', ''),
+                        trigger_browser=self.trigger_source.get('browser', '')
+                    )
+
+            # Rows created ahead of time (batch chunks) start their heartbeat now
+            else:
+                self._heartbeat()
+
+            held_pk = self.execution.pk
+            heartbeat_ticker.hold([held_pk])
+            if self.slot is not None:
+                self.slot.attach(self.execution)
+
+            logger.info(f"{'Resuming' if resuming else 'Starting'} sequence execution {execution_id} for sequence '{self.sequence.name}'")
+            register_cancellation(self.execution, self._cancellation)
 
             # Log the event trigger as the first execution log entry
-            if self.event:
-                ExecutionLog.objects.create(
+            if self.event and not resuming:
+                self.log_buffer.add(
                     sequence_execution=self.execution,
                     node_id='trigger',
                     node_type='trigger',
@@ -89,33 +311,45 @@ class SequenceExecutor:
                     duration_ms=0
                 )
 
+            # Start the time budget of the run
+            self._deadline = ExecutionDeadline(self._timeout_seconds, parent=self._parent_deadline)
+
+            # Per-execution cap on concurrently running parallel branches
+            execution_config = self.sequence.execution_config or {}
+            max_branches = execution_config.get('maxParallelBranches') or getattr(settings, 'SEQUENCE_PARALLEL_MAX_BRANCHES', 4)
+            self._branch_slots = threading.BoundedSemaphore(max(1, int(max_branches)))
+
             # Initialize context with trigger data
-            self.context = {
+            self.context = ExecutionContext({
                 'trigger': self.trigger_data,
                 'sequence': {
                     'id': self.sequence.sequence_id,
                     'name': self.sequence.name,
                 },
                 'execution_id': execution_id
-            }
+            })
 
-            # Parse the flow graph
-            nodes_list = self.sequence.flow_nodes or []
-            edges = self.sequence.flow_edges or []
+            # Get the compiled flow graph (cached per sequence version)
+            plan = get_execution_plan(self.sequence)
+            self.plan = plan
+            if self.batch is not None:
+                self.action_resolver = self.batch.get_action_resolver(plan)
+            else:
+                self.action_resolver = ActionResolver.for_plan(plan)
 
-            if not nodes_list:
+            if not plan.nodes:
                 raise ValueError("Sequence has no nodes defined")
 
-            # Convert nodes list to dict for easier lookup
-            nodes = {node['id']: node for node in nodes_list}
-
             # Find the trigger/start node
-            start_node = self._find_start_node(nodes)
+            start_node = plan.start_node
             if not start_node:
                 raise ValueError("No trigger node found in sequence")
 
+            # Continue from the checkpoint, if there is one
+            stack = self._restore_checkpoint(resume_from, plan) if resuming else None
+
             # Execute the flow starting from the trigger node
-            result = self._execute_flow(start_node, nodes, edges)
+            result = self._execute_flow(start_node, plan, stack=stack)
 
             # Calculate duration
             end_time = timezone.now()
@@ -126,8 +360,9 @@ class SequenceExecutor:
             self.execution.completed_at = end_time
             self.execution.duration_ms = duration_ms
             self.execution.final_output = result if result is not None else {}
-            self.execution.variables_state = self.context
-            self.execution.save()
+            self.execution.variables_state = self._get_variables_state(plan)
+            self.execution.checkpoint = {}
+            self._save_execution()
 
             logger.info(f"Sequence execution {execution_id} completed successfully in {duration_ms}ms")
 
@@ -140,94 +375,292 @@ class SequenceExecutor:
             }
 
         except Exception as e:
-            logger.error(f"Sequence execution {execution_id} failed: {str(e)}", exc_info=True)
+            if isinstance(e, ExecutionCancelled):
+                logger.info(f"Sequence execution {execution_id} cancelled: {str(e)}")
+            else:
+                logger.error(f"Sequence execution {execution_id} failed: {str(e)}", exc_info=True)
 
             # Calculate duration
             end_time = timezone.now()
             duration_ms = int((end_time - start_time).total_seconds() * 1000)
 
             # Update execution record with failure
+            if isinstance(e, ExecutionCancelled):
+                final_status = 'cancelled'
+            elif isinstance(e, ExecutionTimedOut):
+                final_status = 'timed_out'
+            else:
+                final_status = 'failed'
             if self.execution:
-                self.execution.status = 'failed'
+                if final_status == 'cancelled':
+                    self._log_cancelled(e, plan, end_time, duration_ms)
+                self.execution.status = final_status
                 self.execution.completed_at = end_time
                 self.execution.duration_ms = duration_ms
                 self.execution.error_message = str(e)
-                self.execution.variables_state = self.context
-                self.execution.save()
+                self.execution.variables_state = self._get_variables_state(plan)
+                self._save_execution()
 
             return {
                 'success': False,
                 'execution_id': execution_id,
-                'status': 'failed',
+                'status': final_status,
                 'duration_ms': duration_ms,
                 'error': str(e)
             }
 
-    def _find_start_node(self, nodes):
-        """Find the trigger/start node in the flow"""
-        for node_id, node_data in nodes.items():
-            node_type = node_data.get('type', '')
-            if node_type in ['event_trigger', 'trigger']:
-                return node_id
-        return None
+        finally:
+            if held_pk is not None:
+                heartbeat_ticker.release([held_pk])
+            if self.execution is not None:
+                unregister_cancellation(self.execution)
+
+    def resume(self):
+        """
+        Continue self.execution from its last checkpoint
+
+        Nodes completed before the checkpoint are not run again; nodes that ran
+        after it (before the worker died) run again. Without a checkpoint the
+        flow restarts from the trigger node. Fails if the sequence was edited
+        after the checkpoint was taken.
+        """
+        return self.execute(resume_from=self.execution.checkpoint or {})
+
+    def _log_cancelled(self, error, plan, end_time, duration_ms):
+        """Buffer the final log row of a cancelled execution"""
+        node = plan.nodes.get(error.node_id, {}) if plan is not None else {}
+        self.log_buffer.add(
+            sequence_execution=self.execution,
+            node_id=error.node_id or 'cancel',
+            node_type=node.get('type', ''),
+            node_name=node.get('data', {}).get('label', error.node_id or ''),
+            log_level='warning',
+            status='cancelled',
+            message=str(error),
+            error_details={'error_type': 'cancelled', 'completed_nodes': len(self._completed_nodes)},
+            started_at=end_time,
+            completed_at=end_time,
+            duration_ms=0,
+            metadata={'execution_duration_ms': duration_ms}
+        )
+
+    def _checkpoint_version(self):
+        """Identifies the flow a checkpoint belongs to"""
+        updated_at = getattr(self.sequence, 'updated_at', None)
+        return updated_at.isoformat() if updated_at else None
+
+    def _maybe_checkpoint(self, node_id, stack, plan):
+        """Checkpoint after node_id if a boundary was reached"""
+        node_data = plan.nodes.get(node_id, {}).get('data', {})
+        nodes_since_checkpoint = len(self._completed_nodes) - self._checkpointed_nodes
+        if (
+            (self._checkpoint_every and nodes_since_checkpoint >= self._checkpoint_every)
+            or (node_data.get('checkpoint') and nodes_since_checkpoint)
+        ):
+            self._save_checkpoint(stack, plan)
+
+    def _heartbeat(self, **fields):
+        """Record that this execution is still alive (plus any extra fields)"""
+        now = timezone.now()
+        SequenceExecution.objects.filter(pk=self.execution.pk).update(heartbeat_at=now, **fields)
+        self.execution.heartbeat_at = now
+
+    def _save_checkpoint(self, stack, plan):
+        """
+        Persist the interpreter stack, completed nodes and the context variables
+        the rest of the flow can read
+        """
+        # Logs of the checkpointed nodes must not be lost with the worker
+        self.log_buffer.flush()
+        checkpoint = {
+            'version': self._checkpoint_version(),
+            'stack': [frame.to_checkpoint() for frame in stack],
+            'completed_nodes': list(self._completed_nodes),
+            'visits': self._visit_budget.visits,
+            'context': self._get_checkpoint_context(plan),
+        }
+        try:
+            self._heartbeat(checkpoint=checkpoint)
+        except (TypeError, ValueError) as e:
+            # Node results that are not JSON - keep the previous checkpoint
+            logger.warning(f"Could not checkpoint execution {self.execution.execution_id}: {str(e)}")
+            return
+        self.execution.checkpoint = checkpoint
+        self._checkpointed_nodes = len(checkpoint['completed_nodes'])
+
+    def _get_checkpoint_context(self, plan):
+        """Context variables to checkpoint - trigger, sequence and execution_id are rebuilt on resume"""
+        if plan.reads_full_context:
+            snapshot = self.context.to_dict()
+        else:
+            snapshot = self.context.project(self._get_state_paths(plan))
+        for key in ('trigger', 'sequence', 'execution_id'):
+            snapshot.pop(key, None)
+        return snapshot
+
+    def _restore_checkpoint(self, checkpoint, plan):
+        """
+        Restore context, visit count and completed nodes from a checkpoint
+
+        Returns:
+            list: The checkpointed FlowFrame stack, or None to start from the trigger node
+        """
+        if not checkpoint.get('stack'):
+            return None
+        if checkpoint.get('version') != self._checkpoint_version():
+            raise ValueError("Sequence was changed after the checkpoint was taken, cannot resume")
+
+        self.context.update(checkpoint.get('context', {}))
+        self._visit_budget.visits = checkpoint.get('visits', 0)
+        self._completed_nodes.extend(checkpoint.get('completed_nodes', []))
+        self._checkpointed_nodes = len(self._completed_nodes)
+        logger.info(f"Resuming after {len(self._completed_nodes)} completed node(s)")
+        return [FlowFrame.from_checkpoint(frame) for frame in checkpoint['stack']]
+
+    def _save_execution(self):
+        """
+        Write the buffered node logs, then the final state of the execution row
+
+        Executions that are part of a batch hand both to the batch, which
+        writes them together with the rest of its chunk.
+        """
+        if self.batch is not None:
+            self.batch.finish(self.execution)
+            return
+        self.log_buffer.flush()
+        self.execution.save()
+
+    def get_memory_usage(self):
+        """Approximate bytes held by this execution's context variables"""
+        return self.context.memory_usage()
+
+    def _get_variables_state(self, plan):
+        """
+        Snapshot of the context to persist as SequenceExecution.variables_state
 
-    def _execute_flow(self, node_id, nodes, edges):
+        In 'referenced' mode (default) only the variable paths referenced by the
+        flow's nodes plus the declared Sequence.variables are kept, so full HTTP
+        responses are not written back unless something reads them. 'full'
+        persists the whole context. Flows that read the whole context (custom_rule
+        nodes) always persist it too, like their checkpoints.
+        """
+        execution_config = self.sequence.execution_config or {}
+        mode = execution_config.get('variablesState') or getattr(settings, 'SEQUENCE_VARIABLES_STATE', 'referenced')
+        if mode == 'full' or (plan is not None and plan.reads_full_context):
+            return self.context.to_dict()
+        return self.context.project(self._get_state_paths(plan))
+
+    def _get_state_paths(self, plan):
+        """Variable paths referenced by the flow's nodes plus the declared Sequence.variables"""
+        paths = set(plan.referenced_paths) if plan is not None else set()
+        for variable in self.sequence.variables or []:
+            name = variable.get('name') if isinstance(variable, dict) else variable
+            if name:
+                paths.add((name,))
+        return paths
+
+    def _execute_flow(self, node_id, plan, stack=None):
         """
         Execute the flow starting from a given node
-        Recursively follows edges to execute subsequent nodes
+
+        Walks the graph with an explicit stack of FlowFrames instead of recursing
+        once per node, so long flows do not grow the Python stack. Children are
+        visited depth-first in edge order, which keeps results and log order the
+        same as a recursive walk.
+
+        The main flow (not parallel branches) is checkpointed between nodes so a
+        stalled execution can be resumed with the saved stack.
 
         Args:
-            node_id: ID of the current node to execute
-            nodes: Dictionary of all nodes in the flow
-            edges: List of all edges in the flow
+            node_id: ID of the node to start from
+            plan: Compiled ExecutionPlan of the sequence
+            stack: FlowFrame stack restored from a checkpoint (replaces node_id)
 
         Returns:
             Result from the final node(s) in the flow
         """
-        if node_id not in nodes:
+        if not stack:
+            stack = [FlowFrame(None, [('node', node_id)])]
+
+        while True:
+            frame = stack[-1]
+
+            if frame.index < len(frame.pending):
+                op, target = frame.pending[frame.index]
+                frame.index += 1
+                if op == 'merge':
+                    step = self._continue_after_merge(target, plan)
+                else:
+                    step = self._step_node(target, plan)
+
+                # A frame means the node fanned out - descend into its children first
+                if isinstance(step, FlowFrame):
+                    stack.append(step)
+                else:
+                    frame.results.append(step)
+
+                if not self._in_branch and self.execution is not None:
+                    self._maybe_checkpoint(target, stack, plan)
+                continue
+
+            # All children of this frame are done - hand its value to the parent
+            stack.pop()
+            value = frame.value()
+            if not stack:
+                return value
+            stack[-1].results.append(value)
+
+    def _step_node(self, node_id, plan):
+        """
+        Visit a single node of the flow
+
+        Args:
+            node_id: ID of the node to visit
+            plan: Compiled ExecutionPlan of the sequence
+
+        Returns:
+            A FlowFrame of the nodes to visit next, or the node's final value
+            if the flow ends here
+        """
+        if self._abort_event is not None and self._abort_event.is_set():
+            raise ParallelBranchAborted(f"Branch aborted before node {node_id}: a sibling branch failed")
+        if self._cancellation.is_cancelled():
+            raise ExecutionCancelled(f"Execution cancelled before node {node_id}", node_id=node_id)
+
+        self._visit_budget.spend(node_id)
+
+        node = plan.nodes.get(node_id)
+        if node is None:
             logger.warning(f"Node {node_id} not found in flow")
             return None
 
-        node = nodes[node_id]
         node_type = node.get('type', '')
 
         # Skip trigger nodes (they just initiate the flow)
-        if node_type in ['event_trigger', 'trigger']:
-            # Find next nodes
-            next_nodes = self._find_next_nodes(node_id, edges)
-            if next_nodes:
-                # Execute all next nodes (usually just one after trigger)
-                results = []
-                for next_node_id in next_nodes:
-                    result = self._execute_flow(next_node_id, nodes, edges)
-                    results.append(result)
-                return results[0] if len(results) == 1 else results
-            return None
+        if node_type in TRIGGER_NODE_TYPES:
+            # Execute all next nodes (usually just one after trigger)
+            return FlowFrame.for_nodes(node_id, plan.get_next_nodes(node_id))
 
         # Handle parallel nodes - execute all branches in parallel
         if node_type == 'parallel':
-            return self._handle_parallel_flow(node_id, nodes, edges)
+            return self._handle_parallel_flow(node_id, plan)
 
         # Handle merge nodes - wait for all incoming branches
         if node_type == 'merge':
-            return self._handle_merge_flow(node_id, nodes, edges)
+            return self._handle_merge_flow(node_id, plan)
 
         # Execute the node based on its type
         result = self._execute_node(node_id, node)
 
         # Handle conditions - they determine the next path
         if node_type == 'condition':
-            return self._handle_condition_flow(node_id, result, nodes, edges)
+            target = self._handle_condition_flow(node_id, result, plan)
+            return FlowFrame.for_nodes(node_id, [target] if target else [])
 
-        # For other nodes, follow the default edge
-        next_nodes = self._find_next_nodes(node_id, edges)
+        # For other nodes, follow the default edges
+        next_nodes = plan.get_next_nodes(node_id)
         if next_nodes:
-            # Execute all next nodes
-            results = []
-            for next_node_id in next_nodes:
-                result = self._execute_flow(next_node_id, nodes, edges)
-                results.append(result)
-            return results[0] if len(results) == 1 else results
+            return FlowFrame.for_nodes(node_id, next_nodes)
 
         # This is a terminal node, return its result
         return result
@@ -249,33 +682,49 @@ class SequenceExecutor:
 
         start_time = timezone.now()
         start_ms = time.time()
+        self._node_log_metadata = dict(self._log_metadata_base)
+
+        # Node budget: node_data.timeoutSeconds, capped by what is left of the sequence's
+        self._node_deadline = self._deadline.child(node_data.get('timeoutSeconds'))
+        if self._node_deadline.expired():
+            message = f'Time budget ran out before node {node_id}'
+            self._log_timed_out(node_id, node_type, node_name, node_data, message, start_time, 0)
+            raise ExecutionTimedOut(message)
 
         logger.info(f"Executing node {node_id} ({node_type}): {node_name}")
 
         try:
             # Execute based on node type
             if node_type == 'action':
-                result = self._execute_action_node(node_data)
+                result = self._execute_action_node(node_id, node_data)
             elif node_type == 'condition':
-                result = self._execute_condition_node(node_data)
+                result = self._execute_condition_node(node_id, node_data)
             elif node_type == 'custom_rule':
                 result = self._execute_custom_rule_node(node_data)
             elif node_type == 'api_call':
                 result = self._execute_api_call_node(node_data)
             elif node_type == 'event':
                 result = self._execute_event_node(node_data)
+            elif node_type == 'map':
+                result = self._execute_map_node(node_id, node_data)
             else:
                 result = {'success': False, 'error': f'Unknown node type: {node_type}'}
 
             # Calculate duration
             duration_ms = int((time.time() - start_ms) * 1000)
 
+            # Running out of budget fails the whole execution as timed out
+            if result.get('timed_out') or self._node_deadline.expired():
+                message = result.get('error') or f'Node {node_id} ran out of its time budget'
+                self._log_timed_out(node_id, node_type, node_name, node_data, message, start_time, duration_ms, result)
+                raise ExecutionTimedOut(message)
+
             # Determine log level and status
             log_level = 'success' if result.get('success', True) else 'error'
             status = 'completed' if result.get('success', True) else 'failed'
 
-            # Create execution log
-            ExecutionLog.objects.create(
+            # Buffer execution log
+            self.log_buffer.add(
                 sequence_execution=self.execution,
                 node_id=node_id,
                 node_type=node_type,
@@ -286,21 +735,27 @@ class SequenceExecutor:
                 input_data=node_data,
                 output_data=result,
                 started_at=start_time,
-                duration_ms=duration_ms
+                duration_ms=duration_ms,
+                metadata=self._node_log_metadata
             )
 
             # Store result in context for next nodes
             self.context[node_id] = result
+            self._last_result = result
+            self._completed_nodes.append(node_id)
 
             return result
 
+        except (ExecutionTimedOut, ExecutionCancelled):
+            # Already logged as timed out / logged once the execution ends
+            raise
         except Exception as e:
             logger.error(f"Error executing node {node_id}: {str(e)}", exc_info=True)
 
             duration_ms = int((time.time() - start_ms) * 1000)
 
-            # Create error log
-            ExecutionLog.objects.create(
+            # Buffer error log (flushed right away unless disabled)
+            self.log_buffer.add(
                 sequence_execution=self.execution,
                 node_id=node_id,
                 node_type=node_type,
@@ -311,12 +766,32 @@ class SequenceExecutor:
                 input_data=node_data,
                 output_data={'error': str(e)},
                 started_at=start_time,
-                duration_ms=duration_ms
+                duration_ms=duration_ms,
+                metadata=self._node_log_metadata
             )
 
             raise
 
-    def _execute_action_node(self, node_data):
+    def _log_timed_out(self, node_id, node_type, node_name, node_data, message, start_time, duration_ms, result=None):
+        """Buffer the log row of a node that ran out of its time budget"""
+        logger.warning(f"Node {node_id} timed out: {message}")
+        self.log_buffer.add(
+            sequence_execution=self.execution,
+            node_id=node_id,
+            node_type=node_type,
+            node_name=node_name,
+            log_level='error',
+            status='timed_out',
+            message=message,
+            input_data=node_data,
+            output_data=result or {},
+            error_details={'error_type': 'timeout', 'timeout_seconds': self._node_deadline.seconds},
+            started_at=start_time,
+            duration_ms=duration_ms,
+            metadata=self._node_log_metadata
+        )
+
+    def _execute_action_node(self, node_id, node_data):
         """Execute a connector action node"""
         # Try to get actionId from nested actionConfig first (new format)
         action_config = node_data.get('actionConfig', {})
@@ -325,42 +800,52 @@ class SequenceExecutor:
         if not action_id:
             return {'success': False, 'error': 'No action ID specified'}
 
-        try:
-            action = ConnectorAction.objects.get(id=action_id)
-
-            # Get credential set ID from actionConfig (optional)
-            credential_set_id = action_config.get('credentialSetId')
-
-            # Get parameter mappings from actionConfig
-            parameter_mappings = action_config.get('parameterMappings', {})
-
-            # Build input data from parameter mappings
-            input_data = {}
-            for param_type in ['path', 'query', 'headers', 'body']:
-                if param_type in parameter_mappings:
-                    type_params = parameter_mappings[param_type]
-                    if isinstance(type_params, dict):
-                        for key, value in type_params.items():
-                            if not input_data.get(param_type):
-                                input_data[param_type] = {}
-                            input_data[param_type][key] = value
-
-            # Fallback to old inputData format if no parameter mappings
-            if not input_data:
-                input_data = node_data.get('inputData', {})
-
-            # Resolve variables in the input data
-            resolved_input = self._resolve_variables(input_data)
+        # Action, connector and credential sets come preloaded for the whole sequence
+        action = self.action_resolver.get_action(action_id)
+        if action is None:
+            return {'success': False, 'error': f'Action {action_id} not found'}
 
-            # Execute the action with optional credential set ID
-            result = self.action_executor.execute_action(action, resolved_input, credential_set_id)
+        # Get credential set ID from actionConfig (optional)
+        credential_set_id = action_config.get('credentialSetId')
+        credential_set = self.action_resolver.get_credential_set(action, credential_set_id)
 
-            return result
+        # Resolve the input with the plan's compiled parameter mappings
+        compiled_input = self.plan.action_inputs.get(node_id) if self.plan else None
+        if compiled_input is not None:
+            resolved_input = compiled_input(self.context)
+        else:
+            resolved_input = self._resolve_variables(build_action_input(node_data))
+
+        # Each call gets min(remaining budget, connector timeout)
+        timeout = None
+        remaining = self._node_deadline.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                return {'success': False, 'timed_out': True, 'error': f'No time budget left for action {action.name}'}
+            if remaining < self.action_executor.connector_service.timeout:
+                timeout = round(remaining, 3)
+                self._node_log_metadata['timeout_seconds'] = timeout
+
+        # Execute the action with the resolved credential set - identical calls to
+        # idempotent actions are answered from the execution's memo when enabled
+        memo_key = self.action_memo.key_for(action, credential_set, resolved_input)
+        result, cache_hit = self.action_memo.call(
+            memo_key,
+            lambda: self.action_executor.execute_action(
+                action, resolved_input, credential_set_id, credential_set=credential_set, timeout=timeout
+            )
+        )
+        if timeout is not None and result.get('error_type') == 'timeout':
+            # The budget, not the connector's own timeout, cut the call short
+            result['timed_out'] = True
+        if memo_key is not None:
+            self._node_log_metadata['cache_hit'] = cache_hit
+            if cache_hit:
+                logger.info(f"Action {action.name} answered from the execution memo")
 
-        except ConnectorAction.DoesNotExist:
-            return {'success': False, 'error': f'Action {action_id} not found'}
+        return result
 
-    def _execute_condition_node(self, node_data):
+    def _execute_condition_node(self, node_id, node_data):
         """Execute a condition node (evaluates a condition)"""
         # Handle new conditionSets format from frontend
         condition_sets = node_data.get('conditionSets', [])
@@ -372,51 +857,40 @@ class SequenceExecutor:
             operator = condition.get('operator')
             right = self._resolve_value(condition.get('right'))
             result = self._evaluate_condition(left, operator, right)
-        else:
-            # Evaluate conditionSets (currently only first set, first condition)
-            # TODO: Support multiple condition sets with AND/OR logic
-            first_set = condition_sets[0]
-            conditions = first_set.get('conditions', [])
+            return {
+                'success': True,
+                'result': result,
+                'condition': {},
+                'message': f'Condition evaluated to {result}'
+            }
 
-            if not conditions:
-                return {
-                    'success': True,
-                    'result': False,
-                    'condition': {},
-                    'message': 'No conditions to evaluate'
-                }
+        # Condition sets are compiled with the plan; only nodes that failed to
+        # compile get here without one
+        compiled = self.plan.condition_nodes.get(node_id) if self.plan else None
+        if compiled is None:
+            try:
+                compiled = compile_condition_node(node_data)
+            except CompileError as e:
+                return {'success': False, 'result': False, 'error': f'Invalid condition: {str(e)}'}
 
-            # Evaluate first condition
-            cond = conditions[0]
-            variable = cond.get('variable')
-            operator = cond.get('operator')
-            value_type = cond.get('valueType')
-
-            # Get the variable value from context
-            # Handle @event. prefix - strip it and look in trigger payload
-            if variable.startswith('@event.'):
-                field_name = variable.replace('@event.', '')
-                left_value = self._get_context_value(f'trigger.{field_name}')
-            else:
-                left_value = self._get_context_value(f'trigger.{variable}')
-
-            # Get the comparison value
-            if value_type == 'static':
-                right_value = cond.get('staticValue')
-                # Remove escaped quotes if present
-                if isinstance(right_value, str) and right_value.startswith('"') and right_value.endswith('"'):
-                    right_value = right_value[1:-1]
-            else:
-                # dynamic variable
-                right_value = self._resolve_value(cond.get('dynamicVariable'))
+        if not compiled.set_predicates:
+            return {
+                'success': True,
+                'result': False,
+                'condition': {},
+                'message': 'No conditions to evaluate'
+            }
 
-            result = self._evaluate_condition(left_value, operator, right_value)
+        # First matching set wins and selects the set-N edge
+        matched_set = compiled.evaluate(self.context)
+        result = matched_set is not None
 
         return {
             'success': True,
             'result': result,
+            'matched_set': matched_set,
             'condition': {},
-            'message': f'Condition evaluated to {result}'
+            'message': f'Condition evaluated to {result}' + (f' (set {matched_set + 1})' if result else '')
         }
 
     def _execute_custom_rule_node(self, node_data):
@@ -448,13 +922,14 @@ class SequenceExecutor:
                     if 'data' in value:
                         logger.info(f"Context[{key}]['data']: {value['data']}")
 
-            # Execute the DSL with current context
+            # Execute the DSL with current context - its connector calls share the node's time budget
             result = rule_engine.execute_rule(
                 rule_definition=dsl,
                 context_data=self.context,
                 workflow_execution=None,
                 workflow_rule=None,
-                rule_execution=None
+                rule_execution=None,
+                time_budget=self._node_deadline.remaining()
             )
 
             logger.info(f"Custom rule DSL execution result: {result}")
@@ -494,6 +969,12 @@ class SequenceExecutor:
         """
         Execute an event node - triggers the configured event and starts associated sequences
 
+        Subscribed sequences run as child executions linked to this one. They run
+        concurrently and are awaited, or are queued on the dispatcher when
+        eventConfig.childExecution is 'fire_and_forget'. Sequences already
+        running in this event chain are skipped, and chains stop at
+        SEQUENCE_MAX_CHILD_DEPTH.
+
         Args:
             node_data: Node data containing eventConfig with eventId and parameterMappings
 
@@ -545,43 +1026,112 @@ class SequenceExecutor:
 
             logger.info(f"Event payload: {event_payload}")
 
-            # Use the same logic as the test_webhook endpoint to trigger sequences
-            # Filter sequences in Python since SQLite doesn't support __contains on JSON fields
-            all_active_sequences = Sequence.objects.filter(status='active')
-            sequences = [s for s in all_active_sequences if event.id in (s.trigger_events or [])]
+            # Use the same subscription index and trigger filters as the test_webhook endpoint
+            sequences, filtered = filter_sequences(
+                event, SequenceEventSubscription.get_active_sequences(event), event_payload
+            )
+            filtered_sequence_ids = [seq.sequence_id for seq in filtered]
 
             logger.info(f"Event {event.id} triggered. Found {len(sequences)} sequences to execute")
             for seq in sequences:
-                logger.info(f"  - Sequence: {seq.name} (ID: {seq.id}, trigger_events: {seq.trigger_events})")
+                logger.info(f"  - Sequence: {seq.name} (ID: {seq.id})")
 
-            triggered_count = 0
-            triggered_sequence_ids = []
+            # Guard event chains against runaway depth and cycles (A -> B -> A)
+            max_depth = getattr(settings, 'SEQUENCE_MAX_CHILD_DEPTH', 5)
+            if sequences and self.depth + 1 > max_depth:
+                return {
+                    'success': False,
+                    'event_id': event.event_id,
+                    'event_name': event.name,
+                    'error': f'Maximum event chain depth of {max_depth} reached, not starting child sequences'
+                }
 
-            # Start each sequence that listens to this event
-            for sequence in sequences:
-                try:
-                    logger.info(f"Starting sequence: {sequence.name} (triggered by event {event.name})")
-
-                    # Create trigger source for server-triggered sequences
-                    # Using static values to indicate this is a server-side trigger
-                    server_trigger_source = {
-                        'ip': '10.0.0.1',
-                        'os': 'Ubuntu Linux 22.04',
-                        'device': 'Server',
-                        'browser': 'N/A (Server-side)'
+            skipped_sequence_ids = []
+            for seq in sequences:
+                if seq.pk in self.lineage:
+                    logger.warning(f"Skipping sequence {seq.name}: already running in this event chain (cycle)")
+                    skipped_sequence_ids.append(seq.sequence_id)
+            sequences = [seq for seq in sequences if seq.pk not in self.lineage]
+
+            # Admit the children against the sequence/event concurrency limits
+            admitted = []
+            limited_sequence_ids = []
+            for seq in sequences:
+                slot, decision = admit_execution(seq, event)
+                if decision in ('run', 'queue'):
+                    admitted.append((seq, slot))
+                elif decision == 'drop':
+                    logger.info(f"Dropping execution of sequence {seq.name}: concurrency limit reached")
+                    limited_sequence_ids.append(seq.sequence_id)
+                else:
+                    for _, admitted_slot in admitted:
+                        admitted_slot.release()
+                    return {
+                        'success': False,
+                        'event_id': event.event_id,
+                        'event_name': event.name,
+                        'error': f'Sequence {seq.name} is at its concurrency limit'
                     }
+            sequences = [seq for seq, _ in admitted]
+            slots = [slot for _, slot in admitted]
+
+            # Create trigger source for server-triggered sequences
+            # Using static values to indicate this is a server-side trigger
+            server_trigger_source = {
+                'ip': '10.0.0.1',
+                'os': 'Ubuntu Linux 22.04',
+                'device': 'Server',
+                'browser': 'N/A (Server-side)'
+            }
+            child_options = {
+                'event': event,
+                'trigger_data': event_payload,
+                'trigger_source': server_trigger_source,
+                'parent_execution': self.execution,
+                'depth': self.depth + 1,
+                'lineage': self.lineage,
+            }
 
-                    # Create a new executor for this sequence
-                    sequence_executor = SequenceExecutor(
-                        sequence=sequence,
-                        event=event,
-                        trigger_data=event_payload,
-                        trigger_source=server_trigger_source
-                    )
-
-                    # Execute the sequence (same as webhook does)
-                    result = sequence_executor.execute()
+            child_mode = event_config.get('childExecution') or getattr(settings, 'SEQUENCE_CHILD_EXECUTION_MODE', 'await')
+            if child_mode not in CHILD_EXECUTION_MODES:
+                logger.warning(f"Unknown child execution mode '{child_mode}', using 'await'")
+                child_mode = 'await'
 
+            triggered_count = 0
+            triggered_sequence_ids = []
+            child_execution_ids = []
+
+            if child_mode == 'fire_and_forget':
+                # Hand the children to the dispatcher (on their partition key's lane) and carry on
+                keys = [partition_key(sequence, event_payload) for sequence in sequences]
+                jobs = [
+                    execute_sequence_job(sequence, slot=slot, ordered=key is not None, **child_options)
+                    for sequence, slot, key in zip(sequences, slots, keys)
+                ]
+                try:
+                    sequence_dispatcher.submit(jobs, keys=keys)
+                except DispatcherQueueFull as e:
+                    for slot in slots:
+                        slot.release()
+                    return {
+                        'success': False,
+                        'event_id': event.event_id,
+                        'event_name': event.name,
+                        'error': f'Could not start child sequences: {str(e)}'
+                    }
+                triggered_count = len(sequences)
+                triggered_sequence_ids = [sequence.sequence_id for sequence in sequences]
+            else:
+                # Run the children concurrently and wait for all of them - they are
+                # cancelled along with this execution
+                children = [
+                    (SequenceExecutor(sequence=sequence, deadline=self._node_deadline,
+                                      cancellation=self._cancellation, slot=slot, **child_options), slot)
+                    for sequence, slot in zip(sequences, slots)
+                ]
+                for sequence, result in zip(sequences, self._run_child_executions(children)):
+                    if result.get('execution_id'):
+                        child_execution_ids.append(result['execution_id'])
                     if result.get('success'):
                         triggered_count += 1
                         triggered_sequence_ids.append(sequence.sequence_id)
@@ -589,17 +1139,20 @@ class SequenceExecutor:
                     else:
                         logger.warning(f"Sequence {sequence.name} execution failed: {result.get('error')}")
 
-                except Exception as e:
-                    logger.error(f"Error triggering sequence {sequence.name}: {str(e)}", exc_info=True)
-
+            started = 'Queued' if child_mode == 'fire_and_forget' else 'Started'
             return {
                 'success': True,
                 'event_id': event.event_id,
                 'event_name': event.name,
                 'payload': event_payload,
+                'child_execution': child_mode,
                 'sequences_triggered': triggered_count,
                 'sequence_ids': triggered_sequence_ids,
-                'message': f'Event "{event.name}" triggered successfully. Started {triggered_count} sequence(s).'
+                'child_execution_ids': child_execution_ids,
+                'skipped_sequence_ids': skipped_sequence_ids,
+                'limited_sequence_ids': limited_sequence_ids,
+                'filtered_sequence_ids': filtered_sequence_ids,
+                'message': f'Event "{event.name}" triggered successfully. {started} {triggered_count} sequence(s).'
             }
 
         except Event.DoesNotExist:
@@ -614,80 +1167,231 @@ class SequenceExecutor:
                 'error': f'Event execution error: {str(e)}'
             }
 
-    def _handle_condition_flow(self, node_id, condition_result, nodes, edges):
+    def _run_child_executions(self, children):
+        """
+        Run child executions concurrently on the shared branch pool
+
+        Children that cannot get a pool slot run inline, like parallel branches.
+
+        Args:
+            children: List of (SequenceExecutor, ExecutionSlot) tuples
+
+        Returns:
+            list: Execution results in the order of `children`
+        """
+        results = [None] * len(children)
+        in_flight = {}
+        for index, (child, slot) in enumerate(children):
+            if _parallel_branch_slots.acquire(blocking=False):
+                in_flight[_parallel_branch_pool.submit(self._run_child_in_thread, child, slot)] = index
+                continue
+            results[index] = self._run_child(child, slot)
+
+        for future, index in in_flight.items():
+            results[index] = future.result()
+        return results
+
+    def _run_child(self, child, slot):
+        """Execute one child sequence once admitted by its concurrency slot, never raising"""
+        try:
+            if not slot.acquired and not slot.wait(should_stop=self._cancellation.is_cancelled):
+                if self._cancellation.is_cancelled():
+                    return {'success': False, 'error': 'Execution cancelled while waiting for a concurrency slot'}
+                return {'success': False, 'error': 'No concurrency slot became free'}
+            logger.info(f"Starting sequence: {child.sequence.name} (triggered by event {child.event.name})")
+            return child.execute()
+        except Exception as e:
+            logger.error(f"Error triggering sequence {child.sequence.name}: {str(e)}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+        finally:
+            slot.release()
+
+    def _run_child_in_thread(self, child, slot):
+        """Pool entry point for a child execution - releases its pool slot and DB connection when done"""
+        try:
+            return self._run_child(child, slot)
+        finally:
+            _parallel_branch_slots.release()
+            connections.close_all()
+
+    def _execute_map_node(self, node_id, node_data):
+        """
+        Run the map node's sub-graph once per element of a list
+
+        node_data:
+            items: List to iterate - a {{path}} / {"type": "variable"} reference or a literal list
+            itemVariable / indexVariable: Context names of the current element and
+                its index inside the sub-graph (default "item" / "index")
+            concurrency: Items running at once (default SEQUENCE_MAP_CONCURRENCY)
+            failurePolicy: 'collect' (default) or 'fail_fast', as for parallel nodes
+            logMode: 'aggregate' (default) summarizes the items' node logs on the
+                map node's own log row, 'detailed' writes every row
+
+        Each item runs on its own context overlay, which is dropped afterwards.
+        Items use the shared branch pool and count against the node-visit
+        budget like any other node.
+
+        Returns:
+            dict: results holds each item's final value in item order
+        """
+        items = self._resolve_variables(node_data.get('items'))
+        if not isinstance(items, (list, tuple)):
+            return {'success': False, 'error': f'Map items must be a list, got {type(items).__name__}'}
+
+        body = self.plan.get_map_body(node_id)
+        if not body:
+            return {'success': False, 'error': 'Map node has no body (connect its "body" handle)'}
+
+        execution_config = self.sequence.execution_config or {}
+        concurrency = max(1, int(node_data.get('concurrency') or getattr(settings, 'SEQUENCE_MAP_CONCURRENCY', 4)))
+        failure_policy = self._get_parallel_failure_policy(node_data)
+        log_mode = (
+            node_data.get('logMode')
+            or execution_config.get('mapLogMode')
+            or getattr(settings, 'SEQUENCE_MAP_LOG_MODE', 'aggregate')
+        )
+        if log_mode not in MAP_LOG_MODES:
+            logger.warning(f"Unknown map log mode '{log_mode}', using 'aggregate'")
+            log_mode = 'aggregate'
+        aggregator = ExecutionLogAggregator() if log_mode == 'aggregate' else None
+
+        item_variable = node_data.get('itemVariable') or 'item'
+        index_variable = node_data.get('indexVariable') or 'index'
+        abort_event = threading.Event()
+
+        def item_branch(index, item):
+            branch = self._create_branch(abort_event)
+            branch._deadline = self._node_deadline
+            branch._log_metadata_base = dict(self._log_metadata_base, map_node=node_id, map_index=index)
+            if aggregator is not None:
+                branch.log_buffer = aggregator.for_item(index)
+            branch.context[item_variable] = item
+            branch.context[index_variable] = index
+            return branch
+
+        logger.info(f"Map node {node_id}: {len(items)} item(s), concurrency {concurrency}")
+        outcomes = [None] * len(items)
+        in_flight = {}
+        failed_outcome = None
+
+        def collect(done):
+            nonlocal failed_outcome
+            for future in done:
+                index = in_flight.pop(future)
+                outcomes[index] = future.result()
+                if not outcomes[index]['success'] and failure_policy == 'fail_fast' and failed_outcome is None:
+                    failed_outcome = outcomes[index]
+                    abort_event.set()
+
+        for index, item in enumerate(items):
+            # Keep at most `concurrency` items running
+            while len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if abort_event.is_set():
+                break
+
+            branch = item_branch(index, item)
+            if concurrency > 1 and _parallel_branch_slots.acquire(blocking=False):
+                in_flight[_parallel_branch_pool.submit(self._run_map_item_in_thread, branch, index, body)] = index
+                continue
+            outcomes[index] = self._run_map_item(branch, index, body)
+            if not outcomes[index]['success'] and failure_policy == 'fail_fast':
+                failed_outcome = outcomes[index]
+                abort_event.set()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+        if aggregator is not None:
+            self._node_log_metadata['items'] = aggregator.summary()
+
+        # Items stop at their next node once cancelled - do not report that as item failures
+        if self._cancellation.is_cancelled():
+            raise ExecutionCancelled(f"Execution cancelled during map node {node_id}", node_id=node_id)
+        if failed_outcome is not None:
+            raise Exception(f"Map item {failed_outcome['index']} failed: {failed_outcome['error']}")
+
+        errors = [
+            {'index': outcome['index'], 'error': outcome['error']}
+            for outcome in outcomes if outcome is not None and not outcome['success']
+        ]
+        return {
+            'success': not errors,
+            'count': len(items),
+            'succeeded': len(items) - len(errors),
+            'failed': len(errors),
+            'results': [outcome.get('result') if outcome else None for outcome in outcomes],
+            'errors': errors,
+            'message': f'Mapped {len(items)} item(s), {len(errors)} failed'
+        }
+
+    def _run_map_item(self, branch, index, body):
+        """Run the map body for one item and capture its outcome"""
+        try:
+            result = branch._execute_flow(None, self.plan, stack=[FlowFrame.for_nodes(None, body)])
+            return {'index': index, 'result': result, 'success': True}
+        except Exception as e:
+            logger.warning(f"Map item {index} failed: {str(e)}")
+            return {'index': index, 'error': str(e), 'success': False}
+
+    def _run_map_item_in_thread(self, branch, index, body):
+        """Pool entry point for a map item - releases its pool slot and DB connection when done"""
+        try:
+            return self._run_map_item(branch, index, body)
+        finally:
+            _parallel_branch_slots.release()
+            connections.close_all()
+
+    def _handle_condition_flow(self, node_id, condition_result, plan):
         """
         Handle flow branching based on condition result
 
         Args:
             node_id: ID of the condition node
             condition_result: Result from condition evaluation
-            nodes: All nodes in the flow
-            edges: All edges in the flow
+            plan: Compiled ExecutionPlan of the sequence
 
         Returns:
-            Result from the branch that was taken
+            ID of the node to continue with, or None if no branch is taken
         """
-        # Find edges from this condition
-        outgoing_edges = [e for e in edges if e.get('source') == node_id]
-        logger.info(f"Condition node {node_id} has {len(outgoing_edges)} outgoing edges")
-
-        # Determine which branch to take
-        branch_result = condition_result.get('result', False)
-        logger.info(f"Condition evaluated to: {branch_result}")
-
-        # Look for TRUE and FALSE/ELSE branches using sourceHandle
-        # ReactFlow condition nodes use sourceHandle to identify branches:
+        # Branch tables are precompiled per sourceHandle:
         # - "set-0", "set-1", etc. for TRUE branches (condition sets)
         # - "else" for FALSE/ELSE branch
-        true_edges = []
-        false_edge = None
-
-        for edge in outgoing_edges:
-            source_handle = edge.get('sourceHandle', '')
-            logger.info(f"Edge from {node_id} to {edge.get('target')} - sourceHandle: '{source_handle}'")
-
-            if source_handle == 'else':
-                false_edge = edge
-                logger.info(f"Found FALSE/ELSE edge to {edge.get('target')}")
-            elif source_handle and source_handle.startswith('set-'):
-                true_edges.append(edge)
-                logger.info(f"Found TRUE edge (set) to {edge.get('target')}")
+        branch_result = condition_result.get('result', False)
+        logger.info(f"Condition node {node_id} evaluated to: {branch_result}")
 
         # Execute the appropriate branch
         if branch_result:
-            # Condition is TRUE - take a true branch
-            if true_edges:
-                # Take the first true edge (set-0)
-                target = true_edges[0].get('target')
+            # Condition is TRUE - take the edge of the matching set, else the first true branch
+            matched_set = condition_result.get('matched_set')
+            target = None
+            if matched_set is not None:
+                target = plan.get_condition_set_target(node_id, matched_set)
+            if not target:
+                target = plan.get_true_branch_target(node_id)
+            if target:
                 logger.info(f"Taking TRUE branch to node {target}")
-                return self._execute_flow(target, nodes, edges)
+                return target
             # If no true edge but has outgoing edges, take the first one
-            elif outgoing_edges:
+            outgoing_edges = plan.get_outgoing_edges(node_id)
+            if outgoing_edges:
                 target = outgoing_edges[0].get('target')
                 logger.info(f"No TRUE edge found, taking first available edge to node {target}")
-                return self._execute_flow(target, nodes, edges)
+                return target
         else:
             # Condition is FALSE - take the else branch
-            if false_edge:
-                target = false_edge.get('target')
+            target = plan.get_else_branch_target(node_id)
+            if target:
                 logger.info(f"Taking FALSE/ELSE branch to node {target}")
-                return self._execute_flow(target, nodes, edges)
+                return target
             else:
-                logger.info(f"Condition is FALSE but no ELSE edge found. Available sourceHandles: {[e.get('sourceHandle', 'none') for e in outgoing_edges]}")
+                logger.info(f"Condition is FALSE but no ELSE edge found. Available sourceHandles: {list(plan.condition_branches.get(node_id, {}).keys())}")
 
         logger.info(f"No branch taken for condition node {node_id}")
         return None
 
-    def _find_next_nodes(self, node_id, edges):
-        """Find all nodes connected from the given node"""
-        next_nodes = []
-        for edge in edges:
-            if edge.get('source') == node_id:
-                target = edge.get('target')
-                if target:
-                    next_nodes.append(target)
-        return next_nodes
-
     def _resolve_variables(self, data):
         """
         Resolve variable references in data
@@ -753,7 +1457,7 @@ class SequenceExecutor:
         value = self.context
 
         for part in parts:
-            if isinstance(value, dict):
+            if isinstance(value, Mapping):
                 value = value.get(part)
             else:
                 return None
@@ -772,42 +1476,35 @@ class SequenceExecutor:
         Returns:
             bool: Result of the condition
         """
-        if operator == 'equals' or operator == '==':
-            return left == right
-        elif operator == 'not_equals' or operator == '!=':
-            return left != right
-        elif operator == 'greater_than' or operator == '>':
-            return left > right
-        elif operator == 'less_than' or operator == '<':
-            return left < right
-        elif operator == 'greater_than_or_equal' or operator == '>=':
-            return left >= right
-        elif operator == 'less_than_or_equal' or operator == '<=':
-            return left <= right
-        elif operator == 'contains':
-            return right in left if isinstance(left, (str, list)) else False
-        elif operator == 'not_contains':
-            return right not in left if isinstance(left, (str, list)) else True
-        else:
+        evaluate = CONDITION_OPERATORS.get(operator)
+        if evaluate is None:
             logger.warning(f"Unknown operator: {operator}")
             return False
+        return evaluate(left, right)
 
-    def _handle_parallel_flow(self, node_id, nodes, edges):
+    def _handle_parallel_flow(self, node_id, plan):
         """
         Handle parallel execution of branches
 
+        Each branch runs on the shared branch pool with its own context overlay
+        and stops when it reaches a merge node. Once every branch has finished,
+        the overlays are folded back into this context in branch order and the
+        flow continues once from each merge node. The merge node's output joins
+        every branch leading to it, failed ones included, and is only
+        successful if all of them arrived successfully.
+
         Args:
             node_id: ID of the parallel node
-            nodes: All nodes in the flow
-            edges: All edges in the flow
+            plan: Compiled ExecutionPlan of the sequence
 
         Returns:
-            List of results from all parallel branches
+            A FlowFrame continuing from the merge node(s), or the list of branch
+            results if no branch reached a merge node
         """
         logger.info(f"Parallel node {node_id}: Starting parallel execution")
 
         # Find all outgoing edges from this parallel node
-        next_nodes = self._find_next_nodes(node_id, edges)
+        next_nodes = plan.get_next_nodes(node_id)
 
         if not next_nodes:
             logger.info(f"Parallel node {node_id} has no outgoing branches")
@@ -815,57 +1512,183 @@ class SequenceExecutor:
 
         logger.info(f"Parallel node {node_id}: Executing {len(next_nodes)} branches in parallel")
 
-        # Execute all branches
-        # Note: In production, this should use actual parallel execution (threads/async)
-        # For now, we execute them sequentially but treat them as if they were parallel
-        results = []
-        for next_node_id in next_nodes:
-            try:
-                logger.info(f"Parallel node {node_id}: Executing branch to {next_node_id}")
-                result = self._execute_flow(next_node_id, nodes, edges)
-                results.append({
-                    'node_id': next_node_id,
-                    'result': result,
-                    'success': True
-                })
-            except Exception as e:
-                logger.error(f"Parallel node {node_id}: Branch to {next_node_id} failed: {str(e)}")
-                results.append({
-                    'node_id': next_node_id,
-                    'error': str(e),
-                    'success': False
-                })
-
+        failure_policy = self._get_parallel_failure_policy(plan.nodes[node_id].get('data', {}))
+        abort_event = threading.Event()
+        branches = [self._create_branch(abort_event) for _ in next_nodes]
+        outcomes = [None] * len(next_nodes)
+        in_flight = {}
+        failed_outcome = None
+
+        for index, next_node_id in enumerate(next_nodes):
+            if abort_event.is_set():
+                break
+
+            # Take a per-execution and a global slot, or run the branch inline
+            if self._branch_slots.acquire(blocking=False):
+                if _parallel_branch_slots.acquire(blocking=False):
+                    future = _parallel_branch_pool.submit(
+                        self._run_branch_in_thread, node_id, branches[index], next_node_id, plan
+                    )
+                    in_flight[future] = index
+                    continue
+                self._branch_slots.release()
+
+            outcomes[index] = self._run_branch(node_id, branches[index], next_node_id, plan)
+            if not outcomes[index]['success'] and failure_policy == 'fail_fast':
+                failed_outcome = outcomes[index]
+                abort_event.set()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                outcomes[index] = future.result()
+                if not outcomes[index]['success'] and failure_policy == 'fail_fast' and failed_outcome is None:
+                    failed_outcome = outcomes[index]
+                    abort_event.set()
+
+        # Fold branch overlays back into this context in branch order (deterministic)
+        for branch in branches:
+            self.context.merge(branch.context)
+
+        # Branches stop at their next node once cancelled - do not report that as a branch failure
+        if self._cancellation.is_cancelled():
+            raise ExecutionCancelled(f"Execution cancelled during parallel node {node_id}", node_id=node_id)
+
+        if failed_outcome is not None:
+            raise Exception(f"Parallel branch to {failed_outcome['node_id']} failed: {failed_outcome['error']}")
+
+        results = [outcome for outcome in outcomes if outcome is not None]
         logger.info(f"Parallel node {node_id}: All branches completed")
-        return results
 
-    def _handle_merge_flow(self, node_id, nodes, edges):
+        merge_inputs = self._join_branches(node_id, next_nodes, outcomes, branches, plan)
+        if not merge_inputs:
+            return results
+
+        for merge_id, branch_outputs in merge_inputs.items():
+            arrived = sum(1 for output in branch_outputs if output['arrived'])
+            if arrived < len(branch_outputs):
+                logger.warning(f"Merge node {merge_id}: {len(branch_outputs) - arrived} of {len(branch_outputs)} incoming branches never arrived")
+            self.context[merge_id] = {
+                'success': all(output['success'] and output['arrived'] for output in branch_outputs),
+                'arrived': arrived,
+                'expected': len(branch_outputs),
+                'branches': branch_outputs,
+            }
+        return FlowFrame(node_id, [('merge', merge_id) for merge_id in merge_inputs])
+
+    def _join_branches(self, node_id, next_nodes, outcomes, branches, plan):
+        """
+        Outputs of the branches of a parallel node per merge node, in branch order
+
+        Every branch that leads to a merge (see ExecutionPlan.branch_merges) is
+        listed there, with its result if it arrived or its error if it failed;
+        a branch that ended elsewhere (e.g. took a condition path away from the
+        merge) is listed as not arrived. Only merges some branch arrived at or
+        failed on the way to are joined.
+        """
+        merge_inputs = {}
+        for next_node_id, outcome, branch in zip(next_nodes, outcomes, branches):
+            if outcome is None:
+                continue
+            arrivals = {}
+            for merge_id, last_result in branch._merge_arrivals:
+                arrivals.setdefault(merge_id, last_result)
+            expected = list(plan.branch_merges.get((node_id, next_node_id), []))
+            expected += [merge_id for merge_id in arrivals if merge_id not in expected]
+
+            for merge_id in expected:
+                output = {'node_id': next_node_id, 'success': outcome['success'], 'arrived': merge_id in arrivals}
+                if merge_id in arrivals:
+                    output['result'] = arrivals[merge_id]
+                if not outcome['success']:
+                    output['error'] = outcome['error']
+                merge_inputs.setdefault(merge_id, []).append(output)
+
+        return {
+            merge_id: outputs for merge_id, outputs in merge_inputs.items()
+            if any(output['arrived'] or not output['success'] for output in outputs)
+        }
+
+    def _get_parallel_failure_policy(self, node_data):
+        """Resolve the branch failure policy from the node, the sequence, then settings"""
+        execution_config = self.sequence.execution_config or {}
+        policy = (
+            node_data.get('failurePolicy')
+            or execution_config.get('parallelFailurePolicy')
+            or getattr(settings, 'SEQUENCE_PARALLEL_FAILURE_POLICY', 'collect')
+        )
+        if policy not in PARALLEL_FAILURE_POLICIES:
+            logger.warning(f"Unknown parallel failure policy '{policy}', using 'collect'")
+            policy = 'collect'
+        return policy
+
+    def _create_branch(self, abort_event):
+        """Create a copy of this executor that writes to its own context overlay"""
+        branch = copy.copy(self)
+        branch.context = self.context.branch()
+        branch._in_branch = True
+        branch._merge_arrivals = []
+        branch._last_result = None
+        branch._abort_event = abort_event
+        return branch
+
+    def _run_branch(self, node_id, branch, next_node_id, plan):
+        """Execute one parallel branch and capture its outcome"""
+        try:
+            logger.info(f"Parallel node {node_id}: Executing branch to {next_node_id}")
+            result = branch._execute_flow(next_node_id, plan)
+            return {
+                'node_id': next_node_id,
+                'result': result,
+                'success': True
+            }
+        except Exception as e:
+            logger.error(f"Parallel node {node_id}: Branch to {next_node_id} failed: {str(e)}")
+            return {
+                'node_id': next_node_id,
+                'error': str(e),
+                'success': False
+            }
+
+    def _run_branch_in_thread(self, node_id, branch, next_node_id, plan):
+        """Pool entry point for a branch - releases its slots and DB connection when done"""
+        try:
+            return self._run_branch(node_id, branch, next_node_id, plan)
+        finally:
+            _parallel_branch_slots.release()
+            self._branch_slots.release()
+            connections.close_all()
+
+    def _handle_merge_flow(self, node_id, plan):
         """
         Handle merge point for parallel branches
-        The merge node itself doesn't execute anything - it just passes through
-        In a true parallel implementation, this would wait for all incoming branches
+
+        Inside a parallel branch, reaching a merge node ends the branch - the
+        parallel node joins all branches and continues past the merge once.
+        Outside a branch (e.g. converging condition paths) it just passes through.
 
         Args:
             node_id: ID of the merge node
-            nodes: All nodes in the flow
-            edges: All edges in the flow
+            plan: Compiled ExecutionPlan of the sequence
 
         Returns:
-            Result from continuing the flow after merge
+            A FlowFrame continuing after the merge, or None
         """
-        logger.info(f"Merge node {node_id}: Merging parallel branches")
+        if self._in_branch:
+            logger.info(f"Merge node {node_id}: Branch arrived, waiting for join")
+            self._merge_arrivals.append((node_id, self._last_result))
+            return None
 
-        # In the current sequential execution model, all branches have already completed
-        # when we reach the merge node, so we just continue with the next node
+        logger.info(f"Merge node {node_id}: Merging parallel branches")
+        return self._continue_after_merge(node_id, plan)
 
-        next_nodes = self._find_next_nodes(node_id, edges)
+    def _continue_after_merge(self, node_id, plan):
+        """Frame of the nodes following a merge node, or None if the flow ends there"""
+        next_nodes = plan.get_next_nodes(node_id)
         if next_nodes:
             logger.info(f"Merge node {node_id}: Continuing flow to {len(next_nodes)} node(s)")
-            results = []
-            for next_node_id in next_nodes:
-                result = self._execute_flow(next_node_id, nodes, edges)
-                results.append(result)
-            return results[0] if len(results) == 1 else results
+            return FlowFrame.for_nodes(node_id, next_nodes)
 
         logger.info(f"Merge node {node_id}: No outgoing nodes, flow ends here")
         return None
@@ -880,7 +1703,7 @@ class ActionExecutor:
         from .services import ConnectorService
         self.connector_service = ConnectorService()
 
-    def execute_action(self, action, input_data, credential_set_id=None):
+    def execute_action(self, action, input_data, credential_set_id=None, credential_set=None, timeout=None):
         """
         Execute a connector action
 
@@ -888,6 +1711,8 @@ class ActionExecutor:
             action: ConnectorAction model instance
             input_data: Input data for the action (dict with path, query, headers, body)
             credential_set_id: Optional ID of the credential set to use
+            credential_set: Optional already-resolved CredentialSet (skips the lookup)
+            timeout: Optional request timeout in seconds (defaults to the connector service's)
 
         Returns:
             dict: Action execution result
@@ -915,7 +1740,9 @@ class ActionExecutor:
                 workflow_execution=None,  # No workflow context for sequence execution
                 workflow_rule=None,
                 rule_execution=None,
-                credential_set_id=credential_set_id
+                credential_set_id=credential_set_id,
+                credential_set=credential_set,
+                timeout=timeout
             )
 
             return result
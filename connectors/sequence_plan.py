@@ -0,0 +1,315 @@
+"""
+Sequence Execution Plan
+Compiles a sequence flow graph into lookup tables that are reused across executions
+"""
+import re
+import threading
+from collections import OrderedDict, deque
+from django.conf import settings
+from .sequence_compiler import compile_action_input, compile_condition_node, CompileError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+TRIGGER_NODE_TYPES = ('event_trigger', 'trigger')
+
+# Edges leaving a map node through this handle lead into the per-item sub-graph
+MAP_BODY_HANDLE = 'body'
+
+# Variable references inside node configuration: {{path}} templates and
+# @root.path references (@event/@trigger -> trigger, @sequence/@workflow -> context root)
+_TEMPLATE_REFERENCE = re.compile(r'\{\{\s*([^}]+?)\s*\}\}')
+_AT_REFERENCE = re.compile(r'(?<![\w.@])@([A-Za-z_][\w-]*(?:\.[\w-]+)*)')
+_ROOT_ALIASES = {'event': ('trigger',), 'trigger': ('trigger',), 'sequence': (), 'workflow': ()}
+_LOCAL_ROOTS = ('doc',)  # Loop-local references in custom rule DSL
+
+
+def _reference_path(reference, at_prefixed):
+    """Turn a variable reference into a context path tuple (or None)"""
+    parts = tuple(part for part in reference.strip().split('.') if part)
+    if not parts:
+        return None
+    if at_prefixed:
+        if parts[0] in _LOCAL_ROOTS:
+            return None
+        if parts[0] in _ROOT_ALIASES:
+            parts = _ROOT_ALIASES[parts[0]] + parts[1:]
+    return parts or None
+
+
+def _collect_variable_paths(value, paths):
+    """Collect the context paths referenced anywhere in a node's configuration"""
+    if isinstance(value, dict):
+        if value.get('type') == 'variable' and isinstance(value.get('value'), str):
+            reference = value['value']
+            path = _reference_path(reference.lstrip('@'), reference.startswith('@'))
+            if path:
+                paths.add(path)
+        for item in value.values():
+            _collect_variable_paths(item, paths)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_variable_paths(item, paths)
+    elif isinstance(value, str):
+        for match in _TEMPLATE_REFERENCE.finditer(value):
+            path = _reference_path(match.group(1), False)
+            if path:
+                paths.add(path)
+        for match in _AT_REFERENCE.finditer(value):
+            path = _reference_path(match.group(1), True)
+            if path:
+                paths.add(path)
+
+
+class ExecutionPlan:
+    """
+    Read-only, compiled view of a sequence's flow graph
+
+    Built once from Sequence.flow_nodes / Sequence.flow_edges so that walking
+    the graph during an execution is a dict lookup instead of a scan over
+    every edge. Plans are shared between executions (and threads), so nothing
+    in here may be mutated after compilation.
+    """
+
+    def __init__(self, nodes_list, edges):
+        """
+        Compile the flow graph
+
+        Args:
+            nodes_list: ReactFlow nodes (Sequence.flow_nodes)
+            edges: ReactFlow edges (Sequence.flow_edges)
+        """
+        # Node lookup by id
+        self.nodes = {node['id']: node for node in nodes_list}
+
+        # First trigger node in node order is where execution starts
+        self.start_node = None
+        for node_id, node in self.nodes.items():
+            if node.get('type', '') in TRIGGER_NODE_TYPES:
+                self.start_node = node_id
+                break
+
+        # Adjacency lists, preserving the edge order of the flow definition
+        self.outgoing_edges = {}
+        self.next_nodes = {}
+        for edge in edges:
+            source = edge.get('source')
+            self.outgoing_edges.setdefault(source, []).append(edge)
+            target = edge.get('target')
+            if target:
+                self.next_nodes.setdefault(source, []).append(target)
+
+        # Map nodes: the sub-graph run per item starts at the "body" edges and ends at
+        # nodes without outgoing edges; edges from the body back into the map node
+        # only close the loop visually. The flow continues along the other edges.
+        self.map_bodies = {}
+        loop_back_edges = set()
+        for node_id, node in self.nodes.items():
+            if node.get('type') != 'map':
+                continue
+            body_edges = [
+                edge for edge in self.outgoing_edges.get(node_id, [])
+                if edge.get('sourceHandle') == MAP_BODY_HANDLE and edge.get('target')
+            ]
+            self.map_bodies[node_id] = [edge['target'] for edge in body_edges]
+            self.next_nodes[node_id] = [
+                edge.get('target') for edge in self.outgoing_edges.get(node_id, [])
+                if edge.get('target') and edge not in body_edges
+            ]
+            for body_node_id in self._reachable(self.map_bodies[node_id], stop=node_id):
+                if node_id in self.next_nodes.get(body_node_id, []):
+                    loop_back_edges.add((body_node_id, node_id))
+                    self.next_nodes[body_node_id] = [
+                        target for target in self.next_nodes[body_node_id] if target != node_id
+                    ]
+
+        # Condition branch tables keyed by sourceHandle ("set-0", "set-1", ..., "else")
+        self.condition_branches = {}
+        for node_id, node in self.nodes.items():
+            if node.get('type') != 'condition':
+                continue
+            branches = OrderedDict()
+            for edge in self.outgoing_edges.get(node_id, []):
+                if (node_id, edge.get('target')) in loop_back_edges:
+                    continue
+                branches.setdefault(edge.get('sourceHandle') or '', []).append(edge.get('target'))
+            self.condition_branches[node_id] = branches
+
+        # Condition sets compiled into predicates; nodes that fail to compile are
+        # left out and report the error when executed
+        self.condition_nodes = {}
+        for node_id, node in self.nodes.items():
+            if node.get('type') != 'condition':
+                continue
+            try:
+                compiled_condition = compile_condition_node(node.get('data', {}))
+            except CompileError as e:
+                logger.warning(f"Could not compile condition node {node_id}: {str(e)}")
+                continue
+            if compiled_condition is not None:
+                self.condition_nodes[node_id] = compiled_condition
+
+        # Connector actions and credential sets referenced by action nodes, so an
+        # execution can load them all up front (see ActionResolver)
+        # Action node inputs are compiled into resolvers (see sequence_compiler)
+        self.action_ids = set()
+        self.credential_set_ids = set()
+        self.action_inputs = {}
+        for node_id, node in self.nodes.items():
+            if node.get('type') != 'action':
+                continue
+            node_data = node.get('data', {})
+            compiled_input = compile_action_input(node_id, node_data)
+            if compiled_input is not None:
+                self.action_inputs[node_id] = compiled_input
+            action_config = node_data.get('actionConfig', {})
+            action_id = action_config.get('actionId') or node_data.get('actionId')
+            if action_id:
+                self.action_ids.add(action_id)
+            if action_config.get('credentialSetId'):
+                self.credential_set_ids.add(action_config['credentialSetId'])
+
+        # Context paths referenced by any node - what an execution needs to persist
+        # of its variables (see ExecutionContext.project)
+        referenced_paths = set()
+        for node in self.nodes.values():
+            node_data = node.get('data', {})
+            _collect_variable_paths(node_data, referenced_paths)
+            if node.get('type') == 'condition':
+                # Condition variables without a prefix refer to the trigger payload
+                for condition_set in node_data.get('conditionSets', []):
+                    for condition in condition_set.get('conditions', []):
+                        variable = condition.get('variable')
+                        if isinstance(variable, str) and variable and not variable.startswith('@'):
+                            referenced_paths.add(('trigger',) + tuple(variable.split('.')))
+        self.referenced_paths = frozenset(referenced_paths)
+        # Custom rule DSL can read any context variable, so no projection covers it
+        self.reads_full_context = any(node.get('type') == 'custom_rule' for node in self.nodes.values())
+
+        # Merge nodes each branch of a parallel node can reach first, keyed by
+        # (parallel node, branch start) - the branches a merge has to join
+        self.branch_merges = {}
+        for node_id, node in self.nodes.items():
+            if node.get('type') != 'parallel':
+                continue
+            for start in self.next_nodes.get(node_id, []):
+                self.branch_merges[(node_id, start)] = self._first_merges(start)
+
+    def _reachable(self, start_ids, stop):
+        """Nodes reachable from start_ids without passing through `stop`"""
+        seen = set()
+        pending = [node_id for node_id in start_ids if node_id != stop]
+        while pending:
+            node_id = pending.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            pending.extend(target for target in self.next_nodes.get(node_id, []) if target != stop)
+        return seen
+
+    def _first_merges(self, start_id):
+        """Merge nodes reachable from start_id without passing through another merge, in discovery order"""
+        merges = []
+        seen = set()
+        pending = deque([start_id])
+        while pending:
+            node_id = pending.popleft()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            if self.nodes.get(node_id, {}).get('type') == 'merge':
+                merges.append(node_id)
+                continue
+            pending.extend(self.next_nodes.get(node_id, []))
+        return merges
+
+    @classmethod
+    def from_sequence(cls, sequence):
+        """Compile a plan from a Sequence model instance"""
+        # Sequences resolved from the subscription index defer their flow JSON -
+        # load both fields in a single query
+        deferred = sequence.get_deferred_fields() & {'flow_nodes', 'flow_edges'}
+        if deferred:
+            sequence.refresh_from_db(fields=list(deferred))
+        return cls(sequence.flow_nodes or [], sequence.flow_edges or [])
+
+    def get_next_nodes(self, node_id):
+        """Targets of all edges leaving the given node, in edge order"""
+        return self.next_nodes.get(node_id, [])
+
+    def get_map_body(self, node_id):
+        """First nodes of a map node's per-item sub-graph"""
+        return self.map_bodies.get(node_id, [])
+
+    def get_outgoing_edges(self, node_id):
+        """All edges leaving the given node, in edge order"""
+        return self.outgoing_edges.get(node_id, [])
+
+    def get_true_branch_target(self, node_id):
+        """Target of the first condition set edge ("set-N") of a condition node, if any"""
+        for handle, targets in self.condition_branches.get(node_id, {}).items():
+            if handle.startswith('set-'):
+                return targets[0]
+        return None
+
+    def get_condition_set_target(self, node_id, set_index):
+        """Target of the edge of a given condition set ("set-N") of a condition node, if any"""
+        targets = self.condition_branches.get(node_id, {}).get(f'set-{set_index}')
+        return targets[0] if targets else None
+
+    def get_else_branch_target(self, node_id):
+        """Target of the else edge of a condition node, if any"""
+        targets = self.condition_branches.get(node_id, {}).get('else')
+        return targets[-1] if targets else None
+
+
+class ExecutionPlanCache:
+    """
+    Bounded, per-process LRU of compiled execution plans
+
+    Entries are keyed by sequence id and tagged with the sequence's updated_at,
+    so saving a sequence makes its cached plan stale without any explicit
+    invalidation.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sequence):
+        """Return the compiled plan for a sequence, compiling it on a miss"""
+        if sequence.pk is None or sequence.updated_at is None or self.max_size <= 0:
+            return ExecutionPlan.from_sequence(sequence)
+
+        with self._lock:
+            entry = self._plans.get(sequence.pk)
+            if entry and entry[0] == sequence.updated_at:
+                self._plans.move_to_end(sequence.pk)
+                return entry[1]
+
+        # Compile outside the lock - concurrent misses just compile twice
+        plan = ExecutionPlan.from_sequence(sequence)
+        logger.info(f"Compiled execution plan for sequence {sequence.pk} ({len(plan.nodes)} nodes)")
+
+        with self._lock:
+            self._plans[sequence.pk] = (sequence.updated_at, plan)
+            self._plans.move_to_end(sequence.pk)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+        return plan
+
+    def clear(self):
+        """Drop every cached plan"""
+        with self._lock:
+            self._plans.clear()
+
+
+plan_cache = ExecutionPlanCache(getattr(settings, 'SEQUENCE_PLAN_CACHE_SIZE', 128))
+
+
+def get_execution_plan(sequence):
+    """Get the (cached) compiled execution plan for a sequence"""
+    return plan_cache.get(sequence)
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Credential, CredentialSet, Connector, ConnectorAction, ConnectionTest, CustomAuthConfig, Event, Sequence,
-    ActivityLog, SequenceExecution, ExecutionLog
+    ActivityLog, SequenceExecution, ExecutionLog, ExecutionConcurrencyCounter
 )
 
 
@@ -235,12 +235,29 @@ class EventSerializer(serializers.ModelSerializer):
 
 class SequenceSerializer(serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True, allow_null=True)
+    in_flight = serializers.SerializerMethodField()
+    queued = serializers.SerializerMethodField()
 
     class Meta:
         model = Sequence
         fields = '__all__'
         read_only_fields = ('sequence_id', 'created_by', 'created_at', 'updated_at')
 
+    def get_in_flight(self, obj):
+        """Executions of this sequence currently running (across all workers)"""
+        return self._get_concurrency_count(obj, 'in_flight')
+
+    def get_queued(self, obj):
+        """Executions of this sequence waiting for a concurrency slot"""
+        return self._get_concurrency_count(obj, 'queued')
+
+    def _get_concurrency_count(self, obj, field):
+        # SequenceViewSet annotates the counts - fall back to a lookup otherwise
+        if hasattr(obj, field):
+            return getattr(obj, field) or 0
+        counter = ExecutionConcurrencyCounter.objects.filter(scope='sequence', object_id=obj.pk).first()
+        return getattr(counter, field) if counter else 0
+
 
 class ActivityLogSerializer(serializers.ModelSerializer):
     user_email = serializers.SerializerMethodField()
@@ -314,7 +331,7 @@ class SequenceExecutionListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SequenceExecution
-        fields = '__all__'
+        exclude = ('checkpoint',)
         read_only_fields = ('started_at', 'completed_at', 'duration_ms')
 
     def get_log_count(self, obj):
@@ -389,12 +389,16 @@ class ConnectorService:
         return result
 
     def execute_action(self, connector, action, custom_params=None, custom_headers=None, custom_body=None, custom_body_params=None,
-                      custom_path_params=None, workflow_execution=None, workflow_rule=None, rule_execution=None, credential_set_id=None):
+                      custom_path_params=None, workflow_execution=None, workflow_rule=None, rule_execution=None, credential_set_id=None,
+                      credential_set=None, timeout=None):
         """Execute a connector action and return the response with comprehensive logging
 
         Args:
             credential_set_id: Optional ID of the credential set to use. If not provided, uses the default credential set.
+            credential_set: Optional already-resolved CredentialSet (e.g. from ActionResolver). Skips the lookup.
+            timeout: Optional request timeout in seconds (e.g. the caller's remaining time budget). Defaults to self.timeout.
         """
+        request_timeout = timeout if timeout is not None else self.timeout
         start_time = time.time()
         request_timestamp = timezone.now()
 
@@ -436,9 +440,8 @@ class ConnectorService:
                     'response_time_ms': int((time.time() - start_time) * 1000)
                 }
 
-            # Get credential set (use provided ID or default)
-            credential_set = None
-            if connector.credential:
+            # Get credential set (use provided ID or default) unless already resolved
+            if credential_set is None and connector.credential:
                 if credential_set_id:
                     from .models import CredentialSet
                     try:
@@ -505,7 +508,7 @@ class ConnectorService:
                 headers=headers,
                 json=json_data if json_data else None,
                 auth=auth,
-                timeout=self.timeout
+                timeout=request_timeout
             )
             
             # Calculate response time
@@ -596,14 +599,14 @@ class ConnectorService:
                 params if 'params' in locals() else {}, 
                 json_data if 'json_data' in locals() else {},
                 'timeout', None, {}, {}, 
-                f'Request timeout after {self.timeout} seconds',
+                f'Request timeout after {request_timeout} seconds',
                 request_timestamp, timezone.now(), 
                 int((time.time() - start_time) * 1000),
                 True, []
             )
             return {
                 'success': False,
-                'error': f'Request timeout after {self.timeout} seconds',
+                'error': f'Request timeout after {request_timeout} seconds',
                 'response_time_ms': int((time.time() - start_time) * 1000),
                 'error_type': 'timeout',
                 'error_details': str(e),
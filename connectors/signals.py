@@ -246,3 +246,13 @@ def log_sequence_delete(sender, instance, **kwargs):
         user=instance.created_by,
         user_email='abc@company.com'
     )
+
+
+# Sequence subscription index
+@receiver(post_save, sender=Sequence)
+def sync_sequence_event_subscriptions(sender, instance, **kwargs):
+    """Keep the event -> sequence subscription index in sync with trigger_events"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and 'trigger_events' not in update_fields:
+        return
+    instance.sync_event_subscriptions()
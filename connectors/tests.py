@@ -1,3 +1,1316 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import concurrency
+from .action_memo import ActionMemo
+from .concurrency import admit_execution
+from .dispatcher import SequenceDispatcher, DispatcherQueueFull
+from .execution_recovery import claim_execution, execution_lineage, heartbeat_ticker, resume_execution
+from .batch_execution import BatchPayloadError, BatchRunner, event_items, parse_payloads, sequence_items
+from .models import (
+    Connector, ConnectorAction, Event, Sequence, SequenceExecution, ExecutionLog, ExecutionConcurrencyCounter,
+    SequenceEventSubscription
+)
+from .sequence_compiler import compile_condition
+from .sequence_executor import SequenceExecutor
+from .sequence_plan import plan_cache
+from .trigger_filters import record_filtered
+
+
+class FakeResponse:
+    """Stand-in for requests.Response"""
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.reason = 'OK'
+        self.headers = {}
+
+
+def make_action(name='Action'):
+    connector = Connector.objects.create(name='Connector', base_url='http://example.com')
+    return ConnectorAction.objects.create(connector=connector, name=name, http_method='GET', endpoint_path='/x')
+
+
+def action_node(node_id, action, query=None):
+    return {'id': node_id, 'type': 'action', 'data': {
+        'label': node_id,
+        'actionConfig': {'actionId': action.id, 'parameterMappings': {'query': query or {}}},
+    }}
+
+
+def linear_sequence(action, count, name='Linear', **execution_config):
+    nodes = [{'id': 't', 'type': 'trigger', 'data': {}}]
+    edges = []
+    previous = 't'
+    for i in range(count):
+        nodes.append(action_node(f'n{i}', action, {'n': str(i)}))
+        edges.append({'source': previous, 'target': f'n{i}'})
+        previous = f'n{i}'
+    return Sequence.objects.create(name=name, status='active', flow_nodes=nodes, flow_edges=edges,
+                                   execution_config=execution_config)
+
+
+def condition(variable, operator, value, logic_gate=None, value_type='static'):
+    entry = {'variable': variable, 'operator': operator, 'valueType': value_type, 'logicGate': logic_gate}
+    entry['staticValue' if value_type == 'static' else 'dynamicVariable'] = value
+    return entry
+
+
+def logged_nodes(result):
+    return list(ExecutionLog.objects.filter(
+        sequence_execution__execution_id=result['execution_id']
+    ).order_by('id').values_list('node_id', flat=True))
+
+
+class FlowExecutionTests(TransactionTestCase):
+    """Compiled flow graphs run on the work stack: routing, parallel branches and map nodes"""
+
+    def setUp(self):
+        self.action = make_action()
+
+    def test_linear_flow_runs_nodes_in_order(self):
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}]
+        edges = []
+        previous = 't'
+        for i in range(4):
+            nodes.append(action_node(f'n{i}', self.action, {'x': {'type': 'variable', 'value': '@event.x'}}))
+            edges.append({'source': previous, 'target': f'n{i}'})
+            previous = f'n{i}'
+        sequence = Sequence.objects.create(name='Linear', flow_nodes=nodes, flow_edges=edges)
+
+        with mock.patch('requests.request', return_value=FakeResponse({'ok': 1})) as request:
+            result = SequenceExecutor(sequence, trigger_data={'x': 7}).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(logged_nodes(result), ['n0', 'n1', 'n2', 'n3'])
+        self.assertEqual(request.call_count, 4)
+        self.assertEqual(request.call_args.kwargs['params'], {'x': 7})
+
+    def test_plan_is_cached_until_the_sequence_changes(self):
+        sequence = Sequence.objects.create(name='Cached', flow_nodes=[{'id': 't', 'type': 'trigger', 'data': {}}])
+        plan = plan_cache.get(sequence)
+        self.assertIs(plan_cache.get(Sequence.objects.get(pk=sequence.pk)), plan)
+
+        sequence.flow_nodes = sequence.flow_nodes + [{'id': 'a', 'type': 'api_call', 'data': {}}]
+        sequence.flow_edges = [{'source': 't', 'target': 'a'}]
+        sequence.save()
+        self.assertIsNot(plan_cache.get(sequence), plan)
+        self.assertIn('a', plan_cache.get(sequence).nodes)
+
+    def test_condition_sets_route_to_the_first_matching_set(self):
+        sets = [
+            {'conditions': [condition('@event.country', 'equals', 'US'),
+                            condition('@event.amount', 'greater_than', '100', 'AND')]},
+            {'conditions': [condition('@event.country', 'equals', 'DE'),
+                            condition('@event.vip', 'equals', True, 'OR'),
+                            condition('@event.tags', 'contains', 'x', 'AND')]},
+            {'conditions': [condition('@event.amount', 'less_than', '@event.limit', value_type='dynamic')]},
+        ]
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}, {'id': 'c', 'type': 'condition', 'data': {'conditionSets': sets}}]
+        nodes += [{'id': node_id, 'type': 'api_call', 'data': {}} for node_id in ('s0', 's1', 's2', 'else')]
+        edges = [{'source': 't', 'target': 'c'}, {'source': 'c', 'target': 'else', 'sourceHandle': 'else'}]
+        edges += [{'source': 'c', 'target': f's{i}', 'sourceHandle': f'set-{i}'} for i in range(3)]
+        sequence = Sequence.objects.create(name='Routing', flow_nodes=nodes, flow_edges=edges)
+
+        cases = [
+            ({'country': 'US', 'amount': 150}, 's0'),
+            ({'country': 'US', 'amount': 50}, 'else'),
+            ({'country': 'DE'}, 's1'),
+            ({'vip': True, 'tags': ['x']}, 's1'),
+            ({'vip': True, 'tags': []}, 'else'),
+            ({'amount': 1, 'limit': 5}, 's2'),
+        ]
+        for trigger_data, expected in cases:
+            with self.subTest(trigger_data=trigger_data):
+                result = SequenceExecutor(sequence, trigger_data=trigger_data).execute()
+                self.assertEqual(result['status'], 'completed')
+                self.assertEqual(logged_nodes(result), ['c', expected])
+
+    def test_invalid_condition_fails_the_node_not_the_run(self):
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}, {'id': 'c', 'type': 'condition', 'data': {
+            'conditionSets': [{'conditions': [condition('@event.x', 'bogus', '1')]}]
+        }}]
+        sequence = Sequence.objects.create(name='Invalid', flow_nodes=nodes, flow_edges=[{'source': 't', 'target': 'c'}])
+
+        result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        log = ExecutionLog.objects.get(sequence_execution__execution_id=result['execution_id'])
+        self.assertIn('Unknown operator', log.output_data['error'])
+
+    def test_custom_rule_calls_stay_within_the_node_budget(self):
+        rule = 'call action "Action" from connector "Connector" with {\n} map response {\n  "ok" to ok\n}'
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}},
+                 {'id': 'r', 'type': 'custom_rule', 'data': {'customRuleConfig': {'code': rule}, 'timeoutSeconds': 5}}]
+        sequence = Sequence.objects.create(name='Rule', flow_nodes=nodes, flow_edges=[{'source': 't', 'target': 'r'}])
+
+        with mock.patch('requests.request', return_value=FakeResponse({'ok': 1})) as request:
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(request.call_count, 1)
+        self.assertLessEqual(request.call_args.kwargs['timeout'], 5)
+
+    def parallel_sequence(self, **execution_config):
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}, {'id': 'p', 'type': 'parallel', 'data': {}}]
+        edges = [{'source': 't', 'target': 'p'}]
+        for i in range(3):
+            nodes.append(action_node(f'b{i}', self.action, {'i': str(i)}))
+            edges += [{'source': 'p', 'target': f'b{i}'}, {'source': f'b{i}', 'target': 'm'}]
+        nodes += [{'id': 'm', 'type': 'merge', 'data': {}}, {'id': 'after', 'type': 'api_call', 'data': {}}]
+        edges.append({'source': 'm', 'target': 'after'})
+        return Sequence.objects.create(name='Parallel', flow_nodes=nodes, flow_edges=edges,
+                                       execution_config={'variablesState': 'full', **execution_config})
+
+    def test_parallel_branches_run_concurrently_and_join_at_the_merge(self):
+        sequence = self.parallel_sequence()
+
+        def slow(method, url, params=None, **kwargs):
+            time.sleep(0.3)
+            return FakeResponse({'i': params['i']})
+
+        with mock.patch('requests.request', side_effect=slow):
+            started = time.monotonic()
+            result = SequenceExecutor(sequence).execute()
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertLess(elapsed, 0.8)
+        execution = SequenceExecution.objects.get(execution_id=result['execution_id'])
+        self.assertEqual([branch['node_id'] for branch in execution.variables_state['m']['branches']], ['b0', 'b1', 'b2'])
+        self.assertEqual([execution.variables_state[f'b{i}']['body']['i'] for i in range(3)], ['0', '1', '2'])
+        # Branches log as they finish; the node after the merge runs once, after all of them
+        nodes = logged_nodes(result)
+        self.assertEqual(sorted(nodes[:3]), ['b0', 'b1', 'b2'])
+        self.assertEqual(nodes[3:], ['after'])
+
+    def test_merge_joins_failed_branches_under_the_collect_policy(self):
+        sequence = self.parallel_sequence(parallelFailurePolicy='collect')
+        original = SequenceExecutor._execute_action_node
+
+        def failing(executor, node_id, node_data):
+            if node_data['label'] == 'b1':
+                raise RuntimeError('kaboom')
+            return original(executor, node_id, node_data)
+
+        with mock.patch.object(SequenceExecutor, '_execute_action_node', failing), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        merged = SequenceExecution.objects.get(execution_id=result['execution_id']).variables_state['m']
+        self.assertEqual((merged['success'], merged['arrived'], merged['expected']), (False, 2, 3))
+        self.assertEqual([(branch['node_id'], branch['success'], branch['arrived']) for branch in merged['branches']],
+                         [('b0', True, True), ('b1', False, False), ('b2', True, True)])
+        self.assertIn('kaboom', merged['branches'][1]['error'])
+        self.assertEqual(logged_nodes(result)[-1], 'after')
+
+    def test_fail_fast_parallel_branch_fails_the_run(self):
+        sequence = self.parallel_sequence(parallelFailurePolicy='fail_fast')
+        original = SequenceExecutor._execute_action_node
+
+        def failing(executor, node_id, node_data):
+            if node_data['label'] == 'b1':
+                raise RuntimeError('kaboom')
+            return original(executor, node_id, node_data)
+
+        with mock.patch.object(SequenceExecutor, '_execute_action_node', failing), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('kaboom', result['error'])
+
+    def test_cycles_stop_at_the_node_visit_budget(self):
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}, {'id': 'a', 'type': 'api_call', 'data': {}},
+                 {'id': 'b', 'type': 'api_call', 'data': {}}]
+        edges = [{'source': 't', 'target': 'a'}, {'source': 'a', 'target': 'b'}, {'source': 'b', 'target': 'a'}]
+        sequence = Sequence.objects.create(name='Cycle', flow_nodes=nodes, flow_edges=edges,
+                                           execution_config={'maxNodeVisits': 20})
+
+        result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('visit budget of 20', result['error'])
+
+    def map_sequence(self, **map_data):
+        nodes = [
+            {'id': 't', 'type': 'trigger', 'data': {}},
+            {'id': 'm', 'type': 'map', 'data': {
+                'items': {'type': 'variable', 'value': '@event.invitees'}, 'concurrency': 3, **map_data
+            }},
+            action_node('send', self.action, {'e': {'type': 'variable', 'value': '@item.email'},
+                                              'i': {'type': 'variable', 'value': '@index'}}),
+            {'id': 'after', 'type': 'api_call', 'data': {}},
+        ]
+        edges = [{'source': 't', 'target': 'm'}, {'source': 'm', 'target': 'send', 'sourceHandle': 'body'},
+                 {'source': 'send', 'target': 'm'}, {'source': 'm', 'target': 'after'}]
+        return Sequence.objects.create(name='Map', flow_nodes=nodes, flow_edges=edges,
+                                       execution_config={'variablesState': 'full'})
+
+    def test_map_body_runs_per_item_and_keeps_input_order(self):
+        sequence = self.map_sequence()
+        invitees = [{'email': f'u{i}@x'} for i in range(10)]
+
+        def echo(method, url, params=None, **kwargs):
+            time.sleep(0.01)
+            return FakeResponse({'email': params['e'], 'i': params['i']})
+
+        with mock.patch('requests.request', side_effect=echo):
+            result = SequenceExecutor(sequence, trigger_data={'invitees': invitees}).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        mapped = SequenceExecution.objects.get(execution_id=result['execution_id']).variables_state['m']
+        self.assertEqual((mapped['count'], mapped['succeeded']), (10, 10))
+        self.assertEqual([item['body']['email'] for item in mapped['results']], [f'u{i}@x' for i in range(10)])
+        self.assertEqual(logged_nodes(result), ['m', 'after'])
+
+    def test_map_collects_item_failures(self):
+        sequence = self.map_sequence()
+        invitees = [{'email': 'ok@x'}, {'email': 'bad@x'}, {'email': 'ok2@x'}]
+        original = SequenceExecutor._execute_action_node
+
+        def failing(executor, node_id, node_data):
+            if executor.context.get('item', {}).get('email') == 'bad@x':
+                raise RuntimeError('kaboom')
+            return original(executor, node_id, node_data)
+
+        with mock.patch.object(SequenceExecutor, '_execute_action_node', failing), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(sequence, trigger_data={'invitees': invitees}).execute()
+
+        mapped = SequenceExecution.objects.get(execution_id=result['execution_id']).variables_state['m']
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(mapped['failed'], 1)
+        self.assertEqual(mapped['errors'], [{'index': 1, 'error': 'kaboom'}])
+
+    def test_map_fail_fast_fails_the_run(self):
+        sequence = self.map_sequence(failurePolicy='fail_fast')
+        original = SequenceExecutor._execute_action_node
+
+        def failing(executor, node_id, node_data):
+            if executor.context.get('item', {}).get('email') == 'bad@x':
+                raise RuntimeError('kaboom')
+            return original(executor, node_id, node_data)
+
+        with mock.patch.object(SequenceExecutor, '_execute_action_node', failing), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(sequence, trigger_data={'invitees': [{'email': 'bad@x'}]}).execute()
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('Map item 0 failed', result['error'])
+
+
+class ConditionCompilerTests(SimpleTestCase):
+    """Compiled conditions of condition nodes and trigger filters"""
+
+    def evaluate(self, entry, trigger_data):
+        predicate, _ = compile_condition(entry)
+        return predicate({'trigger': trigger_data})
+
+    def test_numeric_strings_in_the_payload_compare_as_numbers(self):
+        self.assertTrue(self.evaluate(condition('amount', 'greater_than', '10'), {'amount': '15'}))
+        self.assertFalse(self.evaluate(condition('amount', 'greater_than', '10'), {'amount': '9'}))
+        self.assertTrue(self.evaluate(condition('amount', '<=', '10'), {'amount': ' 10.0 '}))
+        self.assertTrue(self.evaluate(condition('amount', 'greater_than', '10'), {'amount': 15}))
+
+    def test_dynamic_operands_compare_as_numbers(self):
+        entry = condition('amount', 'less_than', '@event.limit', value_type='dynamic')
+        self.assertTrue(self.evaluate(entry, {'amount': '9', 'limit': '10'}))
+        self.assertTrue(self.evaluate(entry, {'amount': 9, 'limit': '10'}))
+
+    def test_other_strings_compare_as_strings(self):
+        self.assertTrue(self.evaluate(condition('code', 'greater_than', 'abc'), {'code': 'abd'}))
+        self.assertFalse(self.evaluate(condition('code', 'greater_than', '10'), {'code': 'abc'}))
+        self.assertFalse(self.evaluate(condition('code', 'greater_than', '10'), {}))
+
+
+class ActionMemoTests(TransactionTestCase):
+    """Identical idempotent action calls within one execution share a result"""
+
+    def setUp(self):
+        self.action = make_action()
+
+    def sequence(self, action, branches=2, parallel=False, **execution_config):
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}}]
+        edges = []
+        previous = 't'
+        if parallel:
+            nodes.append({'id': 'p', 'type': 'parallel', 'data': {}})
+            edges.append({'source': 't', 'target': 'p'})
+        for i in range(branches):
+            nodes.append(action_node(f'n{i}', action, {'q': 'same'}))
+            edges.append({'source': 'p' if parallel else previous, 'target': f'n{i}'})
+            previous = f'n{i}'
+        return Sequence.objects.create(name='Memo', flow_nodes=nodes, flow_edges=edges,
+                                       execution_config={'memoizeActions': True, **execution_config})
+
+    def cache_hits(self, result):
+        return [log.metadata.get('cache_hit') for log in ExecutionLog.objects.filter(
+            sequence_execution__execution_id=result['execution_id']
+        ).order_by('node_id')]
+
+    def test_key_covers_action_credentials_and_resolved_input(self):
+        memo = ActionMemo(enabled=True)
+        credentials = mock.Mock(pk=7)
+
+        key = memo.key_for(self.action, credentials, {'query': {'a': 1, 'b': 2}})
+        self.assertEqual(key, memo.key_for(self.action, credentials, {'query': {'b': 2, 'a': 1}}))
+        self.assertNotEqual(key, memo.key_for(self.action, None, {'query': {'a': 1, 'b': 2}}))
+        self.assertNotEqual(key, memo.key_for(self.action, credentials, {'query': {'a': 1, 'b': 3}}))
+        self.assertNotEqual(key, memo.key_for(make_action('Other'), credentials, {'query': {'a': 1, 'b': 2}}))
+        self.assertIsNone(memo.key_for(self.action, credentials, {'query': {'a': object()}}))
+        self.assertIsNone(ActionMemo(enabled=False).key_for(self.action, credentials, {}))
+
+    def test_only_get_actions_are_idempotent_unless_flagged(self):
+        memo = ActionMemo(enabled=True)
+        self.action.http_method = 'POST'
+        self.assertIsNone(memo.key_for(self.action, None, {}))
+        self.action.is_idempotent = True
+        self.assertIsNotNone(memo.key_for(self.action, None, {}))
+        self.action.http_method = 'GET'
+        self.action.is_idempotent = False
+        self.assertIsNone(memo.key_for(self.action, None, {}))
+
+    def test_only_successful_results_are_kept(self):
+        memo = ActionMemo(enabled=True)
+        execute = mock.Mock(side_effect=[{'success': False}, {'success': True, 'n': 1}, {'success': True, 'n': 2}])
+
+        self.assertEqual(memo.call('key', execute), ({'success': False}, False))
+        self.assertEqual(memo.call('key', execute), ({'success': True, 'n': 1}, False))
+        self.assertEqual(memo.call('key', execute), ({'success': True, 'n': 1}, True))
+        self.assertEqual(execute.call_count, 2)
+        self.assertEqual(memo.stats(), {'hits': 1, 'misses': 2, 'entries': 1})
+
+    def test_repeated_get_call_is_answered_from_the_memo(self):
+        sequence = self.sequence(self.action)
+
+        with mock.patch('requests.request', return_value=FakeResponse({'ok': 1})) as request:
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(self.cache_hits(result), [False, True])
+
+    def test_non_idempotent_calls_always_go_to_the_network(self):
+        self.action.http_method = 'POST'
+        self.action.save()
+        sequence = self.sequence(self.action)
+
+        with mock.patch('requests.request', return_value=FakeResponse({'ok': 1})) as request:
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.cache_hits(result), [None, None])
+
+        self.action.is_idempotent = True
+        self.action.save()
+        with mock.patch('requests.request', return_value=FakeResponse({'ok': 1})) as request:
+            result = SequenceExecutor(sequence).execute()
+        self.assertEqual(request.call_count, 1)
+
+    def test_failed_call_is_retried_by_the_next_node(self):
+        sequence = self.sequence(self.action)
+        responses = [FakeResponse({'error': 'busy'}, status_code=503), FakeResponse({'ok': 1})]
+
+        with mock.patch('requests.request', side_effect=responses) as request:
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.cache_hits(result), [False, False])
+
+    def test_parallel_branches_make_the_call_once(self):
+        sequence = self.sequence(self.action, branches=3, parallel=True)
+
+        def slow(method, url, params=None, **kwargs):
+            time.sleep(0.2)
+            return FakeResponse({'ok': 1})
+
+        with mock.patch('requests.request', side_effect=slow) as request:
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(sorted(self.cache_hits(result)), [False, True, True])
+
+
+class EventNodeTests(TransactionTestCase):
+    """Event nodes start the sequences listening to their event as child executions"""
+
+    def setUp(self):
+        self.action = make_action()
+        self.event = Event.objects.create(name='Event', status='active')
+
+    def event_sequence(self, name, fires, listens=None, mode=None):
+        event_config = {'eventId': fires.id, 'parameterMappings': {'x': {'type': 'static', 'value': '1'}}}
+        if mode:
+            event_config['childExecution'] = mode
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}},
+                 {'id': 'e', 'type': 'event', 'data': {'label': 'e', 'eventConfig': event_config}}]
+        sequence = Sequence.objects.create(name=name, status='active', flow_nodes=nodes,
+                                           flow_edges=[{'source': 't', 'target': 'e'}],
+                                           execution_config={'variablesState': 'full'})
+        if listens is not None:
+            sequence.trigger_events = [listens.id]
+            sequence.save()
+        return sequence
+
+    def listener(self, name='Child'):
+        sequence = linear_sequence(self.action, 1, name=name)
+        sequence.trigger_events = [self.event.id]
+        sequence.save()
+        return sequence
+
+    def event_output(self, execution):
+        return execution.variables_state['e']
+
+    def test_await_runs_the_children_and_links_them_to_the_parent(self):
+        child = self.listener()
+        parent = self.event_sequence('Parent', self.event, mode='await')
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(parent).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        execution = SequenceExecution.objects.get(execution_id=result['execution_id'])
+        output = self.event_output(execution)
+        self.assertEqual((output['child_execution'], output['sequences_triggered']), ('await', 1))
+        child_execution = SequenceExecution.objects.get(sequence=child)
+        self.assertEqual(output['child_execution_ids'], [child_execution.execution_id])
+        self.assertEqual(child_execution.status, 'completed')
+        self.assertEqual((child_execution.parent_execution, child_execution.depth), (execution, 1))
+        self.assertEqual(child_execution.trigger_payload, {'x': '1'})
+
+    def test_fire_and_forget_queues_the_children_on_the_dispatcher(self):
+        child = self.listener()
+        parent = self.event_sequence('Parent', self.event, mode='fire_and_forget')
+        dispatcher = SequenceDispatcher(max_workers=1, max_queue_size=10)
+        release = threading.Event()
+
+        def blocked(method, url, **kwargs):
+            release.wait(5)
+            return FakeResponse({})
+
+        try:
+            with mock.patch('connectors.sequence_executor.sequence_dispatcher', dispatcher), \
+                    mock.patch('requests.request', side_effect=blocked):
+                result = SequenceExecutor(parent).execute()
+                # The parent is done while its child still waits on the connector
+                self.assertEqual(result['status'], 'completed')
+                self.assertFalse(SequenceExecution.objects.filter(sequence=child, status='completed').exists())
+                release.set()
+                dispatcher.shutdown(timeout=10)
+        finally:
+            release.set()
+
+        execution = SequenceExecution.objects.get(execution_id=result['execution_id'])
+        output = self.event_output(execution)
+        self.assertEqual((output['child_execution'], output['sequences_triggered']), ('fire_and_forget', 1))
+        self.assertEqual(output['child_execution_ids'], [])
+        child_execution = SequenceExecution.objects.get(sequence=child)
+        self.assertEqual(child_execution.status, 'completed')
+        self.assertEqual((child_execution.parent_execution, child_execution.depth), (execution, 1))
+
+    @override_settings(SEQUENCE_MAX_CHILD_DEPTH=1)
+    def test_chain_stops_at_the_maximum_depth(self):
+        second = Event.objects.create(name='Second', status='active')
+        grandchild = self.listener('Grandchild')
+        grandchild.trigger_events = [second.id]
+        grandchild.save()
+        child = self.event_sequence('Child', second, listens=self.event)
+        parent = self.event_sequence('Parent', self.event)
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            SequenceExecutor(parent).execute()
+
+        self.assertTrue(SequenceExecution.objects.filter(sequence=child, depth=1).exists())
+        self.assertFalse(SequenceExecution.objects.filter(sequence=grandchild).exists())
+        log = ExecutionLog.objects.get(sequence_execution__sequence=child, node_id='e')
+        self.assertEqual(log.status, 'failed')
+        self.assertIn('Maximum event chain depth of 1', log.output_data['error'])
+
+    def test_sequences_triggering_each_other_stop_at_the_cycle(self):
+        other = Event.objects.create(name='Other', status='active')
+        first = self.event_sequence('First', other, listens=self.event)
+        second = self.event_sequence('Second', self.event, listens=other)
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            result = SequenceExecutor(first).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(SequenceExecution.objects.count(), 2)
+        child_execution = SequenceExecution.objects.get(sequence=second)
+        self.assertEqual(child_execution.parent_execution.execution_id, result['execution_id'])
+        output = self.event_output(child_execution)
+        self.assertEqual(output['sequences_triggered'], 0)
+        self.assertEqual(output['skipped_sequence_ids'], [first.sequence_id])
+
+
+class WorkerDied(BaseException):
+    """Stops an execution the way a killed worker would - no except Exception sees it"""
+
+
+class CheckpointResumeTests(TransactionTestCase):
+    """Checkpoints of running executions and resuming them after the worker died"""
+
+    def setUp(self):
+        concurrency._known_counters.clear()  # Counter rows do not survive the test flush
+        self.action = make_action()
+        self.calls = []
+
+    def crash_after(self, count):
+        def request(method, url, params=None, **kwargs):
+            self.calls.append(params['n'])
+            if len(self.calls) > count:
+                raise WorkerDied()
+            return FakeResponse({'n': params['n']})
+        return request
+
+    def run_until_crash(self, sequence, count):
+        with mock.patch('requests.request', side_effect=self.crash_after(count)):
+            with self.assertRaises(WorkerDied):
+                SequenceExecutor(sequence).execute()
+        execution = SequenceExecution.objects.get()
+        SequenceExecution.objects.filter(pk=execution.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        execution.refresh_from_db()
+        self.calls.clear()
+        return execution
+
+    def test_resume_continues_after_the_last_checkpoint(self):
+        sequence = linear_sequence(self.action, 6, checkpointEvery=2)
+        execution = self.run_until_crash(sequence, 3)
+
+        self.assertEqual(execution.status, 'running')
+        self.assertEqual(execution.checkpoint['completed_nodes'], ['n0', 'n1'])
+
+        output = io.StringIO()
+        with mock.patch('requests.request', side_effect=lambda method, url, params=None, **kwargs: (
+                self.calls.append(params['n']) or FakeResponse({'n': params['n']}))):
+            call_command('detect_stale_executions', resume=True, stdout=output)
+
+        self.assertIn('resumed: completed', output.getvalue())
+        execution.refresh_from_db()
+        self.assertEqual((execution.status, execution.resume_count, execution.checkpoint), ('completed', 1, {}))
+        # n2 ran before the crash but after the checkpoint, so it runs again
+        self.assertEqual(self.calls, ['2', '3', '4', '5'])
+
+    def test_only_one_claim_wins(self):
+        sequence = linear_sequence(self.action, 4, checkpointEvery=1)
+        execution = self.run_until_crash(sequence, 2)
+        other = SequenceExecution.objects.get(pk=execution.pk)
+
+        self.assertTrue(claim_execution(execution))
+        self.assertFalse(claim_execution(other))
+
+    def test_resume_refuses_a_checkpoint_of_an_edited_sequence(self):
+        sequence = linear_sequence(self.action, 4, checkpointEvery=1)
+        execution = self.run_until_crash(sequence, 2)
+        sequence.name = 'Edited'
+        sequence.save()
+        execution.sequence = sequence
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            result = resume_execution(execution)
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('changed after the checkpoint', result['error'])
+
+    def test_lineage_is_rebuilt_from_parent_executions(self):
+        first = linear_sequence(self.action, 1, name='First')
+        second = linear_sequence(self.action, 1, name='Second')
+        root = SequenceExecution.objects.create(execution_id='root', sequence=first)
+        child = SequenceExecution.objects.create(execution_id='child', sequence=second, parent_execution=root, depth=1)
+        grandchild = SequenceExecution.objects.create(execution_id='grandchild', sequence=first,
+                                                      parent_execution=child, depth=2)
+
+        self.assertEqual(execution_lineage(root), set())
+        self.assertEqual(execution_lineage(grandchild), {first.pk, second.pk})
+
+    @override_settings(SEQUENCE_CONCURRENCY_QUEUE_TIMEOUT=0, SEQUENCE_CONCURRENCY_POLL_INTERVAL=0.01)
+    def test_resume_waits_for_a_concurrency_slot(self):
+        sequence = linear_sequence(self.action, 2, checkpointEvery=1, maxConcurrentExecutions=1)
+        execution = self.run_until_crash(sequence, 1)
+        slot, decision = admit_execution(sequence)
+        self.assertEqual(decision, 'run')
+        try:
+            with mock.patch('requests.request', return_value=FakeResponse({})) as request:
+                result = resume_execution(execution)
+        finally:
+            slot.release()
+
+        self.assertFalse(result['success'])
+        self.assertEqual(request.call_count, 0)
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'running')
+
+    def test_resume_endpoint_gives_the_claim_back_when_the_queue_is_full(self):
+        sequence = linear_sequence(self.action, 2, checkpointEvery=1)
+        execution = self.run_until_crash(sequence, 1)
+        client = APIClient()
+        full = mock.Mock(submit=mock.Mock(side_effect=DispatcherQueueFull('full')))
+
+        with mock.patch('connectors.dispatcher.sequence_dispatcher', full):
+            response = client.post(f'/api/sequence-executions/{execution.pk}/resume/')
+
+        self.assertEqual(response.status_code, 429)
+        unchanged = SequenceExecution.objects.get(pk=execution.pk)
+        self.assertEqual((unchanged.heartbeat_at, unchanged.resume_count), (execution.heartbeat_at, 0))
+
+        dispatcher = SequenceDispatcher(max_workers=1, max_queue_size=1)
+        with mock.patch('connectors.dispatcher.sequence_dispatcher', dispatcher), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            response = client.post(f'/api/sequence-executions/{execution.pk}/resume/')
+            dispatcher.shutdown(timeout=10)
+
+        self.assertEqual(response.status_code, 202)
+        execution.refresh_from_db()
+        self.assertEqual((execution.status, execution.resume_count), ('completed', 1))
+
+    @override_settings(SEQUENCE_HEARTBEAT_INTERVAL=0.2)
+    def test_heartbeat_advances_while_a_node_runs(self):
+        sequence = linear_sequence(self.action, 1)
+        heartbeats = []
+
+        def slow(method, url, **kwargs):
+            heartbeats.append(SequenceExecution.objects.values_list('heartbeat_at', flat=True).get())
+            time.sleep(0.7)
+            heartbeats.append(SequenceExecution.objects.values_list('heartbeat_at', flat=True).get())
+            return FakeResponse({})
+
+        with mock.patch('requests.request', side_effect=slow):
+            result = SequenceExecutor(sequence).execute()
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertGreater(heartbeats[1], heartbeats[0])
+
+
+class CancellationTests(TransactionTestCase):
+    """POST /api/sequence-executions/{id}/cancel/"""
+
+    def setUp(self):
+        self.action = make_action()
+        self.client = APIClient()
+
+    def run_in_background(self, sequence):
+        outcome = {}
+
+        def slow(method, url, **kwargs):
+            time.sleep(0.2)
+            return FakeResponse({})
+
+        def run():
+            with mock.patch('requests.request', side_effect=slow):
+                outcome['result'] = SequenceExecutor(sequence).execute()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while not SequenceExecution.objects.filter(status='running').exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return thread, outcome
+
+    def test_cancel_stops_a_running_execution_before_its_next_node(self):
+        sequence = linear_sequence(self.action, 10)
+        thread, outcome = self.run_in_background(sequence)
+        execution = SequenceExecution.objects.get(status='running')
+
+        response = self.client.post(f'/api/sequence-executions/{execution.pk}/cancel/')
+        thread.join()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'cancelling')
+        self.assertEqual(outcome['result']['status'], 'cancelled')
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'cancelled')
+        self.assertLess(execution.logs.filter(status='completed').count(), 10)
+        self.assertEqual(execution.logs.order_by('id').last().status, 'cancelled')
+
+        again = self.client.post(f'/api/sequence-executions/{execution.pk}/cancel/')
+        self.assertEqual(again.status_code, 400)
+
+    def test_cancel_of_a_stale_execution_closes_it(self):
+        sequence = linear_sequence(self.action, 1)
+        execution = SequenceExecution.objects.create(execution_id='stale', sequence=sequence, status='running',
+                                                     heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        response = self.client.post(f'/api/sequence-executions/{execution.pk}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'cancelled')
+
+
+class FakeSlot:
+    """ExecutionSlot stand-in that frees up after a number of tries"""
+
+    def __init__(self, free_after, expired=False):
+        self.free_after = free_after
+        self.expired = expired
+        self.tries = 0
+        self.acquired = False
+        self.released = False
+        self.poll_interval = 0.01
+        self.sequence = mock.Mock()
+
+    def try_acquire(self):
+        self.tries += 1
+        self.acquired = self.acquired or self.tries > self.free_after
+        return self.acquired
+
+    def queue_expired(self):
+        return self.expired
+
+    def release(self):
+        self.released = True
+
+
+class SequenceDispatcherTests(SimpleTestCase):
+    """All-or-nothing batches on the shared queue, ordered lanes and parked jobs"""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.dispatchers = []
+
+    def tearDown(self):
+        self.release.set()
+        for dispatcher in self.dispatchers:
+            dispatcher.shutdown(timeout=5)
+
+    def dispatcher(self, **kwargs):
+        dispatcher = SequenceDispatcher(**kwargs)
+        self.dispatchers.append(dispatcher)
+        return dispatcher
+
+    def block_workers(self, dispatcher, count):
+        """Occupy every worker with a job that waits for self.release"""
+        started = threading.Semaphore(0)
+
+        def blocker():
+            started.release()
+            self.release.wait(5)
+        dispatcher.submit([blocker] * count)
+        for _ in range(count):
+            started.acquire(timeout=5)
+
+    def test_batch_that_does_not_fit_is_not_queued_at_all(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=3)
+        self.block_workers(dispatcher, 1)
+        ran = []
+        dispatcher.submit([lambda: ran.append('a'), lambda: ran.append('b')])
+
+        with self.assertRaises(DispatcherQueueFull):
+            dispatcher.submit([lambda: ran.append('c'), lambda: ran.append('d')])
+        self.assertEqual(dispatcher.stats()['queued'], 2)
+
+        self.release.set()
+        dispatcher.shutdown(timeout=5)
+        self.assertEqual(ran, ['a', 'b'])
+
+    def test_sync_policy_runs_a_full_batch_inline(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=1, queue_full_policy='sync')
+        self.block_workers(dispatcher, 1)
+        dispatcher.submit([lambda: None])
+        ran = []
+
+        self.assertEqual(dispatcher.submit([lambda: ran.append(threading.current_thread())]), 'sync')
+        self.assertEqual(ran, [threading.current_thread()])
+
+    def test_jobs_of_a_key_run_in_submission_order(self):
+        dispatcher = self.dispatcher(max_workers=2, max_queue_size=50, lanes=3)
+        order = []
+        lock = threading.Lock()
+
+        def job(key, number):
+            def run():
+                time.sleep(0.005)
+                with lock:
+                    order.append((key, number))
+            return run
+
+        for number in range(30):
+            key = 'ABC'[number % 3]
+            dispatcher.submit([job(key, number)], keys=[key])
+        dispatcher.shutdown(timeout=10)
+
+        self.assertEqual(len(order), 30)
+        for key in 'ABC':
+            numbers = [number for job_key, number in order if job_key == key]
+            self.assertEqual(numbers, sorted(numbers))
+
+    def test_full_lane_rejects_even_with_the_sync_policy(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=5, queue_full_policy='sync', lanes=2, lane_queue_size=1)
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            self.release.wait(5)
+        dispatcher.submit([blocker], keys=['k'])
+        started.wait(5)
+        dispatcher.submit([lambda: None], keys=['k'])
+
+        with self.assertRaises(DispatcherQueueFull):
+            dispatcher.submit([lambda: None], keys=['k'])
+
+    def parking_job(self, dispatcher, slot, ran):
+        def job():
+            if not slot.try_acquire():
+                self.assertTrue(dispatcher.park(job, slot))
+                return
+            ran.append(threading.current_thread().name)
+        return job
+
+    def test_jobs_waiting_for_a_slot_do_not_hold_a_worker(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=5)
+        ran = []
+        slot = FakeSlot(free_after=5)
+        dispatcher.submit([self.parking_job(dispatcher, slot, ran)])
+        other = threading.Event()
+        dispatcher.submit([other.set])
+
+        # The only worker is free for other jobs while the first one is parked
+        self.assertTrue(other.wait(5))
+        dispatcher.shutdown(timeout=5)
+        self.assertEqual(ran, ['sequence-dispatcher-0'])
+        self.assertTrue(slot.acquired)
+        self.assertEqual(dispatcher.stats()['parked'], 0)
+
+    def test_parked_job_is_dropped_when_its_wait_expires(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=5)
+        ran = []
+        slot = FakeSlot(free_after=1000, expired=True)
+        dispatcher.submit([self.parking_job(dispatcher, slot, ran)])
+
+        deadline = time.monotonic() + 5
+        while not slot.released and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(slot.released)
+        self.assertEqual(ran, [])
+
+    @override_settings(SEQUENCE_CONCURRENCY_MAX_POLL_INTERVAL=30)
+    def test_wake_parked_retries_right_away(self):
+        dispatcher = self.dispatcher(max_workers=1, max_queue_size=5)
+        ran = []
+        slot = FakeSlot(free_after=3)
+        slot.poll_interval = 30
+        dispatcher.submit([self.parking_job(dispatcher, slot, ran)])
+        while dispatcher.stats()['parked'] == 0:
+            time.sleep(0.01)
+
+        for _ in range(3):
+            dispatcher.wake_parked()
+            time.sleep(0.05)
+
+        dispatcher.shutdown(timeout=5)
+        self.assertEqual(len(ran), 1)
+
+
+class WebhookDispatchTests(TransactionTestCase):
+    """Webhook deliveries queue their sequences on the dispatcher"""
+
+    def setUp(self):
+        self.action = make_action()
+        self.event = Event.objects.create(name='Event', status='active')
+        self.client = APIClient()
+
+    def subscribe(self, count):
+        for number in range(count):
+            sequence = linear_sequence(self.action, 1, name=f'Sequence {number}')
+            sequence.trigger_events = [self.event.id]
+            sequence.save()
+
+    def test_delivery_is_acknowledged_and_runs_on_the_dispatcher(self):
+        self.subscribe(2)
+        dispatcher = SequenceDispatcher(max_workers=2, max_queue_size=10)
+
+        with mock.patch('connectors.dispatcher.sequence_dispatcher', dispatcher), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            response = self.client.post(f'/api/events/{self.event.id}/test_webhook/', {'x': 1}, format='json')
+            dispatcher.shutdown(timeout=10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SequenceExecution.objects.filter(status='completed').count(), 2)
+
+    def test_delivery_that_does_not_fit_is_rejected_whole(self):
+        self.subscribe(2)
+        dispatcher = SequenceDispatcher(max_workers=1, max_queue_size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        dispatcher.submit([blocker])
+        started.wait(5)
+
+        try:
+            with mock.patch('connectors.dispatcher.sequence_dispatcher', dispatcher):
+                response = self.client.post(f'/api/events/{self.event.id}/test_webhook/', {'x': 1}, format='json')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(dispatcher.stats()['queued'], 0)
+        finally:
+            release.set()
+            dispatcher.shutdown(timeout=5)
+        self.assertFalse(SequenceExecution.objects.exists())
+
+
+class TriggerFilterTests(TransactionTestCase):
+    """Subscription trigger filters drop non-matching payloads before an execution exists"""
+
+    def setUp(self):
+        self.action = make_action()
+        self.event = Event.objects.create(name='Event', status='active')
+        self.sequence = linear_sequence(self.action, 1)
+        self.sequence.trigger_events = [self.event.id]
+        self.sequence.save()
+        self.client = APIClient()
+
+    def set_filter(self, *conditions):
+        SequenceEventSubscription.objects.filter(event=self.event, sequence=self.sequence).update(
+            trigger_filter={'conditions': list(conditions)}
+        )
+
+    def subscription(self):
+        return SequenceEventSubscription.objects.get(event=self.event, sequence=self.sequence)
+
+    def deliver(self, payload):
+        dispatcher = mock.Mock()
+        with mock.patch('connectors.dispatcher.sequence_dispatcher', dispatcher):
+            response = self.client.post(f'/api/events/{self.event.id}/test_webhook/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        return dispatcher
+
+    def test_rejected_delivery_is_counted_without_writing_an_execution(self):
+        self.set_filter(condition('amount', 'greater_than', '100'))
+
+        dispatcher = self.deliver({'amount': 50})
+
+        self.assertFalse(dispatcher.submit.call_args[0][0])
+        self.assertFalse(SequenceExecution.objects.exists())
+        self.assertFalse(ExecutionLog.objects.exists())
+        self.assertFalse(ExecutionConcurrencyCounter.objects.exists())
+        subscription = self.subscription()
+        self.assertEqual(subscription.filtered_count, 1)
+        self.assertIsNotNone(subscription.last_filtered_at)
+
+        self.deliver({'amount': 10})
+        self.assertEqual(self.subscription().filtered_count, 2)
+
+    def test_numeric_string_payloads_match_numeric_filters(self):
+        self.set_filter(condition('amount', 'greater_than', '100'))
+
+        self.assertEqual(len(self.deliver({'amount': '150'}).submit.call_args[0][0]), 1)
+        self.assertFalse(self.deliver({'amount': '99'}).submit.call_args[0][0])
+        self.assertEqual(self.subscription().filtered_count, 1)
+
+    def test_batch_trigger_records_its_skips_once(self):
+        self.set_filter(condition('amount', 'greater_than', '100'))
+        payloads = [{'amount': 500}, {'amount': 1}, {'amount': '2'}]
+
+        with mock.patch('connectors.batch_execution.record_filtered', wraps=record_filtered) as record:
+            items = list(event_items(self.event, payloads))
+
+        self.assertEqual([(index, payload) for index, _, _, payload in items], [(0, {'amount': 500})])
+        self.assertEqual(record.call_count, 1)
+        self.assertEqual(self.subscription().filtered_count, 2)
+
+    def test_filter_that_stops_compiling_lets_payloads_through(self):
+        self.set_filter(condition('amount', 'no_such_operator', '100'))
+
+        items = list(event_items(self.event, [{'amount': 1}]))
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.subscription().filtered_count, 0)
+
+    def test_put_validates_and_stores_the_filter(self):
+        url = f'/api/sequences/{self.sequence.id}/trigger_filters/'
+        trigger_filter = {'conditions': [condition('amount', 'greater_than', '100')]}
+
+        response = self.client.put(url, {'event': self.event.id, 'filter': trigger_filter}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['subscriptions'][0]['filter'], trigger_filter)
+        self.assertEqual(self.subscription().trigger_filter, trigger_filter)
+
+        invalid = {'conditions': [condition('amount', 'no_such_operator', '100')]}
+        response = self.client.put(url, {'event': self.event.id, 'filter': invalid}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(url, {'event': self.event.id, 'filter': ['amount']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.subscription().trigger_filter, trigger_filter)
+
+        other = Event.objects.create(name='Other', status='active')
+        response = self.client.put(url, {'event': other.id, 'filter': trigger_filter}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class BatchPayloadTests(SimpleTestCase):
+    """Batch bodies are a JSON array of objects or NDJSON"""
+
+    def test_json_array_and_ndjson_bodies(self):
+        self.assertEqual(parse_payloads(' [{"a": 1}, {"a": 2}] '), [{'a': 1}, {'a': 2}])
+        self.assertEqual(parse_payloads('{"a": 1}\n\n{"a": 2}\n'), [{'a': 1}, {'a': 2}])
+
+    def test_parse_errors_name_the_problem(self):
+        cases = [
+            ('[{"a": 1},', 'Body is not valid JSON'),
+            ('[{"a": 1}, 2]', 'Every payload must be a JSON object'),
+            ('{"a": 1}\n{"a": ', 'Line 2 is not valid JSON'),
+            ('{"a": 1}\n[1]', 'Line 2 is not a JSON object'),
+        ]
+        for body, message in cases:
+            with self.subTest(body=body):
+                with self.assertRaisesRegex(BatchPayloadError, message):
+                    parse_payloads(body)
+
+
+class BatchRunnerTests(TransactionTestCase):
+    """Batch items run in chunks with bulk writes and stream back in input order"""
+
+    def setUp(self):
+        self.action = make_action()
+        nodes = [{'id': 't', 'type': 'trigger', 'data': {}},
+                 action_node('n0', self.action, {'i': {'type': 'variable', 'value': '@event.i'}})]
+        self.sequence = Sequence.objects.create(name='Batch', status='active', flow_nodes=nodes,
+                                                flow_edges=[{'source': 't', 'target': 'n0'}])
+        self.client = APIClient()
+
+    def payloads(self, count):
+        return [{'i': i} for i in range(count)]
+
+    def test_each_chunk_is_written_with_bulk_statements(self):
+        runner = BatchRunner(max_workers=2, chunk_size=2)
+
+        with mock.patch.object(SequenceExecution.objects, 'bulk_create',
+                               wraps=SequenceExecution.objects.bulk_create) as create_executions, \
+                mock.patch.object(SequenceExecution.objects, 'bulk_update',
+                                  wraps=SequenceExecution.objects.bulk_update) as update_executions, \
+                mock.patch.object(ExecutionLog.objects, 'bulk_create',
+                                  wraps=ExecutionLog.objects.bulk_create) as create_logs, \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            results = list(runner.run(sequence_items(self.sequence, self.payloads(6))))
+
+        self.assertEqual([len(call.args[0]) for call in create_executions.call_args_list], [2, 2, 2])
+        self.assertEqual([len(call.args[0]) for call in update_executions.call_args_list], [2, 2, 2])
+        self.assertEqual([len(call.args[0]) for call in create_logs.call_args_list], [2, 2, 2])
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(SequenceExecution.objects.filter(status='completed').count(), 6)
+        self.assertEqual(ExecutionLog.objects.count(), 6)
+
+    def test_results_stream_in_input_order(self):
+        runner = BatchRunner(max_workers=4, chunk_size=4)
+
+        def slower_first(method, url, params=None, **kwargs):
+            time.sleep(0.05 * (4 - int(params['i'])))
+            return FakeResponse({'i': params['i']})
+
+        with mock.patch('requests.request', side_effect=slower_first):
+            results = list(runner.run(sequence_items(self.sequence, self.payloads(4))))
+
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3])
+        for result in results:
+            payload = SequenceExecution.objects.get(execution_id=result['execution_id']).trigger_payload
+            self.assertEqual(payload, {'i': result['index']})
+
+    def test_consumer_stopping_early_still_finishes_the_chunk(self):
+        runner = BatchRunner(max_workers=2, chunk_size=3)
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            results = runner.run(sequence_items(self.sequence, self.payloads(7)))
+            first = next(results)
+            results.close()
+
+        self.assertEqual(first['index'], 0)
+        self.assertEqual(SequenceExecution.objects.count(), 3)
+        self.assertEqual(SequenceExecution.objects.filter(status='completed').count(), 3)
+        self.assertEqual(ExecutionLog.objects.count(), 3)
+        self.assertFalse(heartbeat_ticker._held)
+
+    def read_stream(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_execute_batch_endpoint_streams_results_and_a_summary(self):
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            response = self.client.post(f'/api/sequences/{self.sequence.id}/execute_batch/',
+                                        self.payloads(3), format='json')
+            lines = self.read_stream(response)
+
+        self.assertEqual([line['index'] for line in lines[:-1]], [0, 1, 2])
+        self.assertEqual(lines[-1], {'summary': {'total': 3, 'succeeded': 3, 'failed': 0}})
+
+        response = self.client.post(f'/api/sequences/{self.sequence.id}/execute_batch/',
+                                    {'payloads': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_trigger_batch_endpoint_accepts_ndjson(self):
+        event = Event.objects.create(name='Event', status='active')
+        self.sequence.trigger_events = [event.id]
+        self.sequence.save()
+        body = '\n'.join(json.dumps(payload) for payload in self.payloads(2))
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            response = self.client.post(f'/api/events/{event.id}/trigger_batch/', body,
+                                        content_type='application/x-ndjson')
+            lines = self.read_stream(response)
+
+        self.assertEqual([(line['index'], line['sequence_id']) for line in lines[:-1]],
+                         [(0, self.sequence.sequence_id), (1, self.sequence.sequence_id)])
+        self.assertEqual(lines[-1]['summary']['succeeded'], 2)
+        self.assertEqual(SequenceExecution.objects.filter(triggered_by_event=event).count(), 2)
+
+        response = self.client.post(f'/api/events/{event.id}/trigger_batch/', '{"i": 1}\nnope',
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Line 2', response.data['error'])
+
+
+class ConcurrencyLimitTests(TransactionTestCase):
+    """Per-sequence and per-event limits kept in ExecutionConcurrencyCounter rows"""
+
+    def setUp(self):
+        concurrency._known_counters.clear()  # Counter rows do not survive the test flush
+        self.action = make_action()
+
+    def counters(self):
+        return list(ExecutionConcurrencyCounter.objects.order_by('scope').values_list('scope', 'in_flight', 'queued'))
+
+    def test_limit_holds_under_contention(self):
+        sequence = linear_sequence(self.action, 1, maxConcurrentExecutions=2, concurrencyOverflowPolicy='drop')
+        admit_execution(sequence)[0].release()  # Create the counter row up front
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        admitted = [0]
+
+        def worker():
+            try:
+                for _ in range(10):
+                    slot, decision = admit_execution(sequence)
+                    if decision == 'run':
+                        with lock:
+                            running[0] += 1
+                            admitted[0] += 1
+                            peak[0] = max(peak[0], running[0])
+                        time.sleep(0.005)
+                        with lock:
+                            running[0] -= 1
+                    slot.release()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(peak[0], 2)
+        self.assertGreater(admitted[0], 0)
+        self.assertEqual(self.counters(), [('sequence', 0, 0)])
+
+    def test_overflow_policies(self):
+        for policy in ('drop', 'reject', 'queue'):
+            with self.subTest(policy=policy):
+                sequence = linear_sequence(self.action, 1, name=policy, maxConcurrentExecutions=1,
+                                           concurrencyOverflowPolicy=policy)
+                first, first_decision = admit_execution(sequence)
+                second, second_decision = admit_execution(sequence)
+                self.assertEqual((first_decision, second_decision), ('run', policy))
+
+                first.release()
+                if policy == 'queue':
+                    self.assertTrue(second.try_acquire())
+                second.release()
+
+    def test_event_limit_spans_its_sequences(self):
+        event = Event.objects.create(name='Event', status='active', max_concurrent_executions=1)
+        first = linear_sequence(self.action, 1, name='First')
+        second = linear_sequence(self.action, 1, name='Second')
+
+        slot, decision = admit_execution(first, event)
+        other, other_decision = admit_execution(second, event)
+        self.assertEqual((decision, other_decision), ('run', 'queue'))
+
+        slot.release()
+        self.assertTrue(other.try_acquire())
+        other.release()
+        self.assertTrue(all(in_flight == 0 and queued == 0 for _, in_flight, queued in self.counters()))
+
+    def run_and_kill_worker(self, sequence):
+        """Admit and start an execution whose worker dies without releasing its slot"""
+        slot, decision = admit_execution(sequence)
+        self.assertEqual(decision, 'run')
+        with mock.patch('requests.request', side_effect=WorkerDied()):
+            with self.assertRaises(WorkerDied):
+                SequenceExecutor(sequence, slot=slot).execute()
+        execution = SequenceExecution.objects.get(status='running')
+        SequenceExecution.objects.filter(pk=execution.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        return slot, execution
+
+    def test_stale_detector_gives_back_the_slot_of_a_killed_worker(self):
+        sequence = linear_sequence(self.action, 1, maxConcurrentExecutions=1, concurrencyOverflowPolicy='drop')
+        self.run_and_kill_worker(sequence)
+        self.assertEqual(self.counters(), [('sequence', 1, 0)])
+        self.assertEqual(admit_execution(sequence)[1], 'drop')
+
+        call_command('detect_stale_executions', mark_failed=True, stdout=io.StringIO())
+
+        self.assertEqual(self.counters(), [('sequence', 0, 0)])
+        slot, decision = admit_execution(sequence)
+        self.assertEqual(decision, 'run')
+        slot.release()
+
+    def test_resumed_execution_takes_a_new_slot(self):
+        sequence = linear_sequence(self.action, 1, maxConcurrentExecutions=1)
+        _, execution = self.run_and_kill_worker(sequence)
+
+        with mock.patch('requests.request', return_value=FakeResponse({})):
+            call_command('detect_stale_executions', resume=True, stdout=io.StringIO())
+
+        execution.refresh_from_db()
+        self.assertEqual((execution.status, execution.holds_concurrency_slot), ('completed', False))
+        self.assertEqual(self.counters(), [('sequence', 0, 0)])
+
+    def test_slot_given_back_by_the_detector_is_not_released_twice(self):
+        sequence = linear_sequence(self.action, 1, maxConcurrentExecutions=2)
+        slot, execution = self.run_and_kill_worker(sequence)
+        other, _ = admit_execution(sequence)
+
+        call_command('detect_stale_executions', mark_failed=True, stdout=io.StringIO())
+        # The worker was only slow, not dead, and releases its slot after all
+        slot.release()
+
+        self.assertEqual(self.counters(), [('sequence', 1, 0)])
+        other.release()
+
+    def test_execute_endpoint_queues_over_the_limit_without_blocking(self):
+        sequence = linear_sequence(self.action, 1, maxConcurrentExecutions=1, concurrencyOverflowPolicy='queue')
+        held, _ = admit_execution(sequence)
+        dispatcher = SequenceDispatcher(max_workers=1, max_queue_size=10)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('user', 'user@example.com', 'password'))
+
+        with mock.patch('connectors.dispatcher.sequence_dispatcher', dispatcher), \
+                mock.patch('requests.request', return_value=FakeResponse({})):
+            started = time.monotonic()
+            response = client.post(f'/api/sequences/{sequence.pk}/execute/', {'trigger_data': {}}, format='json')
+            self.assertLess(time.monotonic() - started, 1)
+            held.release()
+            dispatcher.shutdown(timeout=10)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual(SequenceExecution.objects.get().status, 'completed')
+        self.assertEqual(self.counters(), [('sequence', 0, 0)])
@@ -0,0 +1,101 @@
+"""
+Trigger Filters
+Payload predicates on event subscriptions, checked before an execution is created
+"""
+import json
+from collections import Counter
+from functools import lru_cache
+from django.db.models import F
+from django.utils import timezone
+from .models import SequenceEventSubscription
+from .sequence_compiler import compile_condition_set, CompileError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def validate_trigger_filter(trigger_filter):
+    """
+    Check that a trigger filter compiles
+
+    A filter is a condition set as used by condition nodes:
+    {"conditions": [{"variable": "@event.amount", "operator": "greater_than",
+    "valueType": "static", "staticValue": "100", "logicGate": "AND"}, ...]}
+
+    Raises:
+        CompileError: If the filter is malformed
+    """
+    if not trigger_filter:
+        return
+    if not isinstance(trigger_filter, dict) or not isinstance(trigger_filter.get('conditions', []), list):
+        raise CompileError('Trigger filter must be a condition set: {"conditions": [...]}')
+    _compile(json.dumps(trigger_filter, sort_keys=True))
+
+
+@lru_cache(maxsize=512)
+def _compile(filter_json):
+    """Compiled predicate of a filter, cached by its canonical JSON"""
+    return compile_condition_set(json.loads(filter_json))
+
+
+def matches_trigger_filter(trigger_filter, payload):
+    """
+    Whether an event payload passes a subscription's trigger filter
+
+    Filters that fail to compile let every payload through, so a broken
+    filter never silently stops a sequence.
+    """
+    if not trigger_filter:
+        return True
+    try:
+        predicate = _compile(json.dumps(trigger_filter, sort_keys=True))
+    except (CompileError, TypeError, ValueError) as e:
+        logger.warning(f"Ignoring invalid trigger filter: {str(e)}")
+        return True
+    if predicate is None:
+        return True
+    return predicate({'trigger': payload if isinstance(payload, dict) else {}})
+
+
+def filter_sequences(event, sequences, payload, record=True):
+    """
+    Split the sequences listening to an event by their subscription's trigger filter
+
+    Args:
+        event: Event that was delivered
+        sequences: Sequences from SequenceEventSubscription.get_active_sequences()
+        payload: Event payload
+        record: Count the skipped deliveries on their subscriptions right away
+
+    Returns:
+        tuple: (sequences to run, sequences whose filter rejected the payload)
+    """
+    matched, filtered = [], []
+    for sequence in sequences:
+        if matches_trigger_filter(getattr(sequence, 'trigger_filter', None), payload):
+            matched.append(sequence)
+        else:
+            filtered.append(sequence)
+    if filtered:
+        logger.info(f"Event {event.id}: payload filtered out for {len(filtered)} sequence(s)")
+        if record:
+            record_filtered(event, Counter(sequence.pk for sequence in filtered))
+    return matched, filtered
+
+
+def record_filtered(event, counts):
+    """
+    Add skipped deliveries to the subscriptions' aggregate counters
+
+    Args:
+        counts: Mapping of sequence pk -> deliveries skipped
+    """
+    now = timezone.now()
+    by_count = {}
+    for sequence_pk, count in counts.items():
+        by_count.setdefault(count, []).append(sequence_pk)
+    # One UPDATE per distinct count - usually a single statement
+    for count, sequence_pks in by_count.items():
+        SequenceEventSubscription.objects.filter(event=event, sequence_id__in=sequence_pks).update(
+            filtered_count=F('filtered_count') + count, last_filtered_at=now
+        )
@@ -19,6 +19,8 @@ urlpatterns = [
     path('api/async-progress/<str:execution_id>/', views.get_async_action_progress, name='async_action_progress'),
     path('api/workflow/<int:workflow_execution_id>/async-progress/', views.get_workflow_async_progress, name='workflow_async_progress'),
     path('api/progress-step/<int:step_id>/details/', views.get_progress_step_details, name='progress_step_details'),
+    # Dispatcher metrics
+    path('api/dispatcher/stats/', views.get_dispatcher_stats, name='dispatcher_stats'),
     # Webhook endpoints
     path('api/webhooks/async/<str:execution_id>/', views.dynamic_webhook_handler, name='dynamic_webhook'),
     path('api/webhooks/async/static/', views.static_webhook_handler, name='static_webhook'),
@@ -2,12 +2,13 @@ from django.http import JsonResponse, HttpResponseRedirect
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from .models import (
     AsyncActionExecution, AsyncActionProgress, Connector, Credential, CredentialSet, ConnectorAction, Event, Sequence,
-    ActivityLog, SequenceExecution, ExecutionLog
+    SequenceEventSubscription, ActivityLog, SequenceExecution, ExecutionLog, ExecutionConcurrencyCounter
 )
 from .serializers import (
     ConnectorSerializer, CredentialSerializer, CredentialSetSerializer, ConnectorActionSerializer, EventSerializer, SequenceSerializer,
@@ -394,6 +395,61 @@ def generate_sample_from_schema(schema, prop_name=None):
         return None
 
 
+def read_batch_payloads(request):
+    """
+    Trigger payloads of a batch request: NDJSON (application/x-ndjson), a JSON
+    array, or a JSON object with a "payloads" array
+
+    Returns:
+        tuple: (payloads, error Response or None)
+    """
+    from .batch_execution import parse_payloads, BatchPayloadError
+
+    try:
+        if 'ndjson' in (request.content_type or ''):
+            payloads = parse_payloads(request.body.decode('utf-8'))
+        else:
+            data = request.data
+            payloads = data.get('payloads') if isinstance(data, dict) else data
+            if not isinstance(payloads, list) or not all(isinstance(payload, dict) for payload in payloads):
+                raise BatchPayloadError('Expected a JSON array of payload objects')
+    except (BatchPayloadError, UnicodeDecodeError) as e:
+        return None, Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_items = getattr(settings, 'SEQUENCE_BATCH_MAX_ITEMS', 1000)
+    if len(payloads) > max_items:
+        return None, Response({
+            'success': False,
+            'error': f'Batch has {len(payloads)} payloads, the maximum is {max_items}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return payloads, None
+
+
+def stream_batch_results(request, items, trigger_source=None):
+    """
+    Run batch items and stream one NDJSON line per result, then a summary line
+
+    ?workers= lowers the parallelism below SEQUENCE_BATCH_MAX_WORKERS.
+    """
+    from django.http import StreamingHttpResponse
+    from .batch_execution import BatchRunner, summarize
+
+    max_workers = getattr(settings, 'SEQUENCE_BATCH_MAX_WORKERS', 4)
+    try:
+        workers = min(max_workers, int(request.query_params.get('workers', max_workers)))
+    except ValueError:
+        workers = max_workers
+    runner = BatchRunner(max_workers=workers, trigger_source=trigger_source)
+
+    def lines():
+        results, summary = summarize(runner.run(items))
+        for result in results:
+            yield json.dumps(result, default=str) + '\n'
+        yield json.dumps({'summary': summary}) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
@@ -517,7 +573,8 @@ class EventViewSet(viewsets.ModelViewSet):
     def test_webhook(self, request, pk=None):
         """
         Receive test payload for this event and store it in memory
-        Also triggers any sequences that are listening to this event
+        Also queues any sequences that are listening to this event and
+        acknowledges without waiting for them (429 if the dispatcher is full)
         """
         event = self.get_object()
         payload = request.data
@@ -534,39 +591,62 @@ class EventViewSet(viewsets.ModelViewSet):
         # Extract trigger source information
         trigger_source = self._extract_trigger_source(request)
 
-        # Trigger sequences that are listening to this event
+        # Queue the sequences listening to this event - they run on the dispatcher
+        # worker pool so the acknowledgement does not wait on connector calls
         try:
-            from .sequence_executor import SequenceExecutor
-            import logging
-            logger = logging.getLogger(__name__)
+            from .dispatcher import sequence_dispatcher, execute_sequence_job, partition_key, DispatcherQueueFull
+            from .concurrency import admit_execution
+            from .trigger_filters import filter_sequences
 
-            # Filter sequences in Python since SQLite doesn't support __contains on JSON fields
-            all_active_sequences = Sequence.objects.filter(status='active')
-            sequences = [s for s in all_active_sequences if event.id in (s.trigger_events or [])]
+            # Resolve subscribers through the event -> sequence index; payloads their
+            # trigger filter rejects are only counted, no execution is created
+            sequences, _ = filter_sequences(event, SequenceEventSubscription.get_active_sequences(event), payload)
 
             logger.info(f"Event {event.id} triggered. Found {len(sequences)} sequences to execute")
             for seq in sequences:
-                logger.info(f"  - Sequence: {seq.name} (ID: {seq.id}, trigger_events: {seq.trigger_events})")
+                logger.info(f"  - Sequence: {seq.name} (ID: {seq.id})")
 
+            # Admit each execution against the sequence/event concurrency limits
+            admitted = []
+            rejected = None
             for sequence in sequences:
-                try:
-                    executor = SequenceExecutor(
-                        sequence=sequence,
-                        event=event,
-                        trigger_data=payload,
-                        trigger_source=trigger_source
-                    )
-                    # Execute asynchronously in the background
-                    # For testing, we'll execute synchronously
-                    executor.execute()
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Failed to execute sequence {sequence.name}: {str(e)}", exc_info=True)
+                slot, decision = admit_execution(sequence, event)
+                if decision in ('run', 'queue'):
+                    admitted.append((sequence, slot))
+                elif decision == 'drop':
+                    logger.info(f"Dropping execution of sequence {sequence.name}: concurrency limit reached")
+                else:
+                    rejected = sequence
+                    break
+
+            if rejected is not None:
+                for _, slot in admitted:
+                    slot.release()
+                logger.warning(f"Rejecting event {event.id} delivery: sequence {rejected.name} is at its concurrency limit")
+                return Response(
+                    {'status': 'rejected', 'message': 'Too many concurrent executions, please retry later'},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
+
+            # Sequences with a partition key run on the lane of their key, in delivery order
+            keys = [partition_key(sequence, payload) for sequence, _ in admitted]
+            jobs = [
+                execute_sequence_job(sequence, event=event, trigger_data=payload, trigger_source=trigger_source,
+                                     slot=slot, ordered=key is not None)
+                for (sequence, slot), key in zip(admitted, keys)
+            ]
+            try:
+                sequence_dispatcher.submit(jobs, keys=keys)
+            except DispatcherQueueFull as e:
+                for _, slot in admitted:
+                    slot.release()
+                logger.warning(f"Rejecting event {event.id} delivery: {str(e)}")
+                return Response(
+                    {'status': 'rejected', 'message': 'Too many pending executions, please retry later'},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
         except Exception as e:
             # Don't let sequence execution errors prevent webhook acknowledgement
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error in sequence execution setup: {str(e)}", exc_info=True)
 
         # Return acknowledgement based on event settings
@@ -587,6 +667,22 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=200
             )
 
+    @action(detail=True, methods=['post'])
+    def trigger_batch(self, request, pk=None):
+        """
+        Run every sequence listening to this event against many payloads
+        (JSON array or NDJSON body) and stream the results back as NDJSON
+        """
+        from .batch_execution import event_items
+
+        event = self.get_object()
+        payloads, error = read_batch_payloads(request)
+        if error is not None:
+            return error
+
+        logger.info(f"Event {event.id} batch-triggered with {len(payloads)} payloads")
+        return stream_batch_results(request, event_items(event, payloads), self._extract_trigger_source(request))
+
     @action(detail=True, methods=['get'])
     def test_payload(self, request, pk=None):
         """
@@ -670,6 +766,17 @@ class SequenceViewSet(viewsets.ModelViewSet):
     queryset = Sequence.objects.all()
     serializer_class = SequenceSerializer
 
+    def get_queryset(self):
+        """Annotate the in-flight/queued execution counts of each sequence"""
+        from django.db.models import IntegerField, OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+
+        counters = ExecutionConcurrencyCounter.objects.filter(scope='sequence', object_id=OuterRef('pk'))
+        return super().get_queryset().annotate(
+            in_flight=Coalesce(Subquery(counters.values('in_flight')[:1]), Value(0), output_field=IntegerField()),
+            queued=Coalesce(Subquery(counters.values('queued')[:1]), Value(0), output_field=IntegerField()),
+        )
+
     @action(detail=True, methods=['post'])
     def toggle_status(self, request, pk=None):
         """
@@ -698,13 +805,114 @@ class SequenceViewSet(viewsets.ModelViewSet):
         # Get trigger data from request
         trigger_data = request.data.get('trigger_data', {})
 
+        # Admit against the sequence's concurrency limit
+        from .concurrency import admit_execution
+        slot, decision = admit_execution(sequence)
+        if decision in ('drop', 'reject'):
+            return Response({
+                'success': False,
+                'error': 'Sequence is at its concurrency limit'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Over the limit with the 'queue' policy - the run waits for its slot on the
+        # dispatcher instead of holding this request
+        if decision == 'queue':
+            from .dispatcher import sequence_dispatcher, execute_sequence_job, DispatcherQueueFull
+            try:
+                sequence_dispatcher.submit([execute_sequence_job(sequence, trigger_data=trigger_data, slot=slot)])
+            except DispatcherQueueFull:
+                slot.release()
+                return Response({
+                    'success': False,
+                    'error': 'Too many pending executions, please retry later'
+                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return Response({
+                'success': True,
+                'status': 'queued',
+                'message': 'Sequence is at its concurrency limit, the execution was queued'
+            }, status=status.HTTP_202_ACCEPTED)
+
         # Execute the sequence
         from .sequence_executor import SequenceExecutor
-        executor = SequenceExecutor(sequence=sequence, trigger_data=trigger_data)
-        result = executor.execute()
+        try:
+            executor = SequenceExecutor(sequence=sequence, trigger_data=trigger_data, slot=slot)
+            result = executor.execute()
+        finally:
+            slot.release()
 
         return Response(result)
 
+    @action(detail=True, methods=['post'])
+    def execute_batch(self, request, pk=None):
+        """
+        Execute a sequence against many trigger payloads (JSON array or NDJSON
+        body) and stream the results back as NDJSON
+        """
+        from .batch_execution import sequence_items
+
+        sequence = self.get_object()
+        if sequence.status != 'active':
+            return Response({
+                'success': False,
+                'error': 'Sequence must be active to execute'
+            }, status=400)
+
+        payloads, error = read_batch_payloads(request)
+        if error is not None:
+            return error
+
+        return stream_batch_results(request, sequence_items(sequence, payloads))
+
+    @action(detail=True, methods=['get', 'put'])
+    def trigger_filters(self, request, pk=None):
+        """
+        Trigger filters of the sequence's event subscriptions
+
+        GET lists each subscribed event with its filter and how many deliveries
+        it skipped. PUT {"event": <event id>, "filter": {"conditions": [...]}}
+        sets the filter of one subscription (an empty filter removes it).
+        Payloads that do not match are counted instead of creating executions.
+        """
+        from .sequence_compiler import CompileError
+        from .trigger_filters import validate_trigger_filter
+
+        sequence = self.get_object()
+
+        if request.method == 'PUT':
+            event_id = request.data.get('event')
+            trigger_filter = request.data.get('filter') or {}
+            try:
+                subscription = sequence.event_subscriptions.get(event_id=event_id)
+            except (SequenceEventSubscription.DoesNotExist, ValueError, TypeError):
+                return Response({
+                    'success': False,
+                    'error': f'Sequence is not triggered by event {event_id}'
+                }, status=status.HTTP_404_NOT_FOUND)
+            try:
+                validate_trigger_filter(trigger_filter)
+            except CompileError as e:
+                return Response({
+                    'success': False,
+                    'error': f'Invalid trigger filter: {str(e)}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            subscription.trigger_filter = trigger_filter
+            subscription.save(update_fields=['trigger_filter'])
+
+        subscriptions = sequence.event_subscriptions.select_related('event').order_by('event__name')
+        return Response({
+            'sequence_id': sequence.id,
+            'subscriptions': [
+                {
+                    'event': subscription.event_id,
+                    'event_name': subscription.event.name,
+                    'filter': subscription.trigger_filter,
+                    'filtered_count': subscription.filtered_count,
+                    'last_filtered_at': subscription.last_filtered_at,
+                }
+                for subscription in subscriptions
+            ]
+        })
+
     @action(detail=True, methods=['get'])
     def test_info(self, request, pk=None):
         """
@@ -759,7 +967,7 @@ class SequenceViewSet(viewsets.ModelViewSet):
         # Get execution logs for this execution
         execution_logs = ExecutionLog.objects.filter(
             sequence_execution=latest_execution
-        ).order_by('started_at')
+        ).order_by('started_at', 'id')
 
         # Format execution logs
         logs_data = []
@@ -1283,6 +1491,21 @@ def get_progress_step_details(request, step_id):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_dispatcher_stats(request):
+    """
+    Queue depth and worker counters of this process's sequence dispatcher,
+    including the depth of every ordered lane
+    """
+    from .dispatcher import sequence_dispatcher
+
+    return JsonResponse({
+        'success': True,
+        'dispatcher': sequence_dispatcher.stats()
+    })
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def dynamic_webhook_handler(request, execution_id):
@@ -1423,7 +1646,7 @@ class SequenceExecutionViewSet(viewsets.ReadOnlyModelViewSet):
     API endpoint for viewing sequence executions
     """
     queryset = SequenceExecution.objects.all()
-    filterset_fields = ['sequence', 'status', 'triggered_by_event']
+    filterset_fields = ['sequence', 'status', 'triggered_by_event', 'parent_execution']
     search_fields = ['execution_id', 'sequence__name']
     ordering_fields = ['started_at', 'duration_ms']
     ordering = ['-started_at']
@@ -1433,6 +1656,84 @@ class SequenceExecutionViewSet(viewsets.ReadOnlyModelViewSet):
             return SequenceExecutionListSerializer
         return SequenceExecutionSerializer
 
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """
+        Resume a stalled (no heartbeat), failed or timed out execution from its last checkpoint
+        The execution continues on the dispatcher; poll the execution for its outcome
+        """
+        from .dispatcher import sequence_dispatcher, DispatcherQueueFull
+        from .execution_recovery import (
+            RESUMABLE_STATUSES, claim_execution, is_stale, resume_execution, unclaim_execution
+        )
+
+        execution = self.get_object()
+        if execution.status not in RESUMABLE_STATUSES:
+            return Response({
+                'success': False,
+                'error': f'Only running, failed or timed out executions can be resumed (status is {execution.status})'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if execution.status == 'running' and not is_stale(execution):
+            return Response({
+                'success': False,
+                'error': 'Execution is still running (heartbeat is recent)'
+            }, status=status.HTTP_409_CONFLICT)
+        last_heartbeat = execution.heartbeat_at
+        if not claim_execution(execution):
+            return Response({
+                'success': False,
+                'error': 'Execution is already being resumed'
+            }, status=status.HTTP_409_CONFLICT)
+
+        try:
+            sequence_dispatcher.submit([lambda: resume_execution(execution)])
+        except DispatcherQueueFull:
+            # Give the claim back so a retry is not refused and does not count as a resume
+            unclaim_execution(execution, last_heartbeat)
+            return Response(
+                {'success': False, 'error': 'Too many pending executions, please retry later'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+        return Response({
+            'success': True,
+            'execution_id': execution.execution_id,
+            'status': 'resuming',
+            'resume_count': execution.resume_count,
+            'completed_nodes': len(execution.checkpoint.get('completed_nodes', []))
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Cancel a running execution
+        The worker stops before its next node (parallel branches and awaited child
+        executions included) and the execution ends as cancelled; a call already
+        in flight finishes first, bounded by its timeout
+        """
+        from .cancellation import request_cancel
+
+        execution = self.get_object()
+        if execution.status != 'running':
+            return Response({
+                'success': False,
+                'error': f'Only running executions can be cancelled (status is {execution.status})'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        outcome = request_cancel(execution)
+        if outcome is None:
+            return Response({
+                'success': False,
+                'error': 'Execution already finished or is already being cancelled'
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'success': True,
+            'execution_id': execution.execution_id,
+            'status': outcome,
+            'cancel_requested_at': execution.cancel_requested_at
+        }, status=status.HTTP_200_OK if outcome == 'cancelled' else status.HTTP_202_ACCEPTED)
+
 
 class ExecutionLogViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -1443,7 +1744,7 @@ class ExecutionLogViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['sequence_execution', 'log_level', 'node_type', 'status']
     search_fields = ['node_name', 'message']
     ordering_fields = ['started_at']
-    ordering = ['started_at']
+    ordering = ['started_at', 'id']
 
 
 # OAuth2 Callback Handler
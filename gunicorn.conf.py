@@ -0,0 +1,14 @@
+"""
+Gunicorn configuration
+Picked up automatically from the working directory by the Procfile/railway start commands
+"""
+import os
+
+# Give in-flight sequence executions time to drain before a worker is killed
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+
+def worker_exit(server, worker):
+    """Drain the sequence dispatcher queue before the worker process exits"""
+    from connectors.dispatcher import shutdown_dispatcher
+    shutdown_dispatcher()
@@ -102,6 +102,9 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Tests run worker threads (dispatcher, parallel branches, map items); an
+            # in-memory test database makes them fail on locks instead of waiting
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
@@ -178,3 +181,92 @@ REST_FRAMEWORK = {
 
 # Webhook configuration
 WEBHOOK_BASE_URL = os.environ.get('WEBHOOK_BASE_URL', "http://localhost:8000")
+
+# Sequence execution configuration
+# Number of compiled sequence flow graphs kept per process
+SEQUENCE_PLAN_CACHE_SIZE = int(os.environ.get('SEQUENCE_PLAN_CACHE_SIZE', '128'))
+# Maximum node visits per execution before it is stopped as a runaway flow
+# (overridable per sequence via execution_config.maxNodeVisits; 0 = unlimited)
+SEQUENCE_MAX_NODE_VISITS = int(os.environ.get('SEQUENCE_MAX_NODE_VISITS', '10000'))
+# What an execution persists as variables_state: 'referenced' keeps only the variables
+# the flow reads plus declared Sequence.variables, 'full' keeps the whole context
+# (overridable per sequence via execution_config.variablesState)
+SEQUENCE_VARIABLES_STATE = os.environ.get('SEQUENCE_VARIABLES_STATE', 'referenced')
+# Parallel node branches: global thread cap per process, default cap per execution
+# (overridable per sequence via execution_config.maxParallelBranches) and what to do
+# when a branch fails - 'collect' keeps going, 'fail_fast' aborts the other branches
+SEQUENCE_PARALLEL_MAX_WORKERS = int(os.environ.get('SEQUENCE_PARALLEL_MAX_WORKERS', '16'))
+SEQUENCE_PARALLEL_MAX_BRANCHES = int(os.environ.get('SEQUENCE_PARALLEL_MAX_BRANCHES', '4'))
+SEQUENCE_PARALLEL_FAILURE_POLICY = os.environ.get('SEQUENCE_PARALLEL_FAILURE_POLICY', 'collect')
+# Execution logs: 'buffered' writes them with bulk_create at flush points, 'stream'
+# writes one row per node as it completes (overridable per sequence via
+# execution_config.logMode / execution_config.logFlushEvery; 0 = flush at end of run)
+SEQUENCE_LOG_MODE = os.environ.get('SEQUENCE_LOG_MODE', 'buffered')
+SEQUENCE_LOG_FLUSH_EVERY = int(os.environ.get('SEQUENCE_LOG_FLUSH_EVERY', '0'))
+SEQUENCE_LOG_FLUSH_ON_ERROR = os.environ.get('SEQUENCE_LOG_FLUSH_ON_ERROR', 'True') == 'True'
+# Event-triggered executions run on an in-process dispatcher: worker threads
+# (0 = run synchronously in the request), queue size, what to do when the queue
+# is full ('reject' answers 429, 'sync' runs in the request) and how long to
+# drain the queue on worker shutdown (keep below GUNICORN_GRACEFUL_TIMEOUT)
+SEQUENCE_DISPATCH_WORKERS = int(os.environ.get('SEQUENCE_DISPATCH_WORKERS', '4'))
+SEQUENCE_DISPATCH_QUEUE_SIZE = int(os.environ.get('SEQUENCE_DISPATCH_QUEUE_SIZE', '100'))
+SEQUENCE_DISPATCH_QUEUE_FULL_POLICY = os.environ.get('SEQUENCE_DISPATCH_QUEUE_FULL_POLICY', 'reject')
+SEQUENCE_DISPATCH_DRAIN_TIMEOUT = int(os.environ.get('SEQUENCE_DISPATCH_DRAIN_TIMEOUT', '25'))
+# Ordered lanes for sequences with execution_config.partitionKey: executions with
+# the same key run one at a time in trigger order (one worker thread per lane)
+SEQUENCE_DISPATCH_LANES = int(os.environ.get('SEQUENCE_DISPATCH_LANES', '8'))
+SEQUENCE_DISPATCH_LANE_QUEUE_SIZE = int(os.environ.get('SEQUENCE_DISPATCH_LANE_QUEUE_SIZE', '100'))
+# Sequences started by event nodes: how deep event chains may go and whether the
+# event node waits for them ('await') or queues them on the dispatcher
+# ('fire_and_forget'; overridable per node via eventConfig.childExecution)
+SEQUENCE_MAX_CHILD_DEPTH = int(os.environ.get('SEQUENCE_MAX_CHILD_DEPTH', '5'))
+SEQUENCE_CHILD_EXECUTION_MODE = os.environ.get('SEQUENCE_CHILD_EXECUTION_MODE', 'await')
+# Concurrent executions per sequence / per event (0 = no limit; overridable via
+# execution_config.maxConcurrentExecutions and Event.max_concurrent_executions),
+# what to do with executions over the limit ('queue', 'drop', 'reject' = 429;
+# execution_config.concurrencyOverflowPolicy), how long queued ones may wait and
+# how often they retry for a slot (backing off up to the max poll interval)
+SEQUENCE_MAX_CONCURRENT_EXECUTIONS = int(os.environ.get('SEQUENCE_MAX_CONCURRENT_EXECUTIONS', '0'))
+SEQUENCE_EVENT_MAX_CONCURRENT_EXECUTIONS = int(os.environ.get('SEQUENCE_EVENT_MAX_CONCURRENT_EXECUTIONS', '0'))
+SEQUENCE_CONCURRENCY_OVERFLOW_POLICY = os.environ.get('SEQUENCE_CONCURRENCY_OVERFLOW_POLICY', 'queue')
+SEQUENCE_CONCURRENCY_QUEUE_TIMEOUT = int(os.environ.get('SEQUENCE_CONCURRENCY_QUEUE_TIMEOUT', '60'))
+SEQUENCE_CONCURRENCY_POLL_INTERVAL = float(os.environ.get('SEQUENCE_CONCURRENCY_POLL_INTERVAL', '0.2'))
+SEQUENCE_CONCURRENCY_MAX_POLL_INTERVAL = float(os.environ.get('SEQUENCE_CONCURRENCY_MAX_POLL_INTERVAL', '5'))
+# Reuse results of identical idempotent action calls within one execution
+# (GET actions or ConnectorAction.is_idempotent; execution_config.memoizeActions)
+SEQUENCE_MEMOIZE_ACTIONS = os.environ.get('SEQUENCE_MEMOIZE_ACTIONS', 'False') == 'True'
+# Batch triggers (execute_batch / trigger_batch endpoints, execute_sequence_batch
+# command): executions running at once, executions written per chunk, and the
+# maximum number of payloads per request
+SEQUENCE_BATCH_MAX_WORKERS = int(os.environ.get('SEQUENCE_BATCH_MAX_WORKERS', '4'))
+SEQUENCE_BATCH_CHUNK_SIZE = int(os.environ.get('SEQUENCE_BATCH_CHUNK_SIZE', '50'))
+SEQUENCE_BATCH_MAX_ITEMS = int(os.environ.get('SEQUENCE_BATCH_MAX_ITEMS', '1000'))
+# Checkpoints: every N executed nodes (0 = only at nodes flagged "checkpoint";
+# execution_config.checkpointEvery), heartbeat interval of running executions and
+# how long without a heartbeat before detect_stale_executions treats them as stale
+SEQUENCE_CHECKPOINT_EVERY = int(os.environ.get('SEQUENCE_CHECKPOINT_EVERY', '0'))
+SEQUENCE_HEARTBEAT_INTERVAL = int(os.environ.get('SEQUENCE_HEARTBEAT_INTERVAL', '30'))
+SEQUENCE_STALE_AFTER = int(os.environ.get('SEQUENCE_STALE_AFTER', '300'))
+# Overall time budget of one execution in seconds (0 = none; execution_config.timeoutSeconds,
+# node_data.timeoutSeconds for single nodes). Connector calls get min(remaining budget, 30s)
+SEQUENCE_TIMEOUT = float(os.environ.get('SEQUENCE_TIMEOUT', '0'))
+# Seconds between checks of the cancel flag set by other processes (cancels from
+# the same process are seen at the next node right away)
+SEQUENCE_CANCEL_CHECK_INTERVAL = float(os.environ.get('SEQUENCE_CANCEL_CHECK_INTERVAL', '1'))
+# Map nodes: items running at once (node_data.concurrency) and whether the items'
+# node logs are summarized on the map node ('aggregate') or all written ('detailed')
+SEQUENCE_MAP_CONCURRENCY = int(os.environ.get('SEQUENCE_MAP_CONCURRENCY', '4'))
+SEQUENCE_MAP_LOG_MODE = os.environ.get('SEQUENCE_MAP_LOG_MODE', 'aggregate')
+
+# Rule engine configuration (workflow rules and custom_rule nodes)
+# Compiled rules kept per process, and how rules run: 'ast' walks the parsed rule
+# (rules the parser rejects fall back to the regex interpreter), 'regex' always
+# uses the regex interpreter
+RULE_CACHE_SIZE = int(os.environ.get('RULE_CACHE_SIZE', '256'))
+RULE_ENGINE_PARSER = os.environ.get('RULE_ENGINE_PARSER', 'ast')
+# Thread cap per process for independent action calls of a rule running at once
+# (1 = always one after another)
+RULE_ACTION_MAX_WORKERS = int(os.environ.get('RULE_ACTION_MAX_WORKERS', '8'))
+# Cached (workflow, trigger step) rule sets per process; checked against the
+# workflow's rules_version on every lookup (0 = always load from the database)
+RULE_SET_CACHE_SIZE = int(os.environ.get('RULE_SET_CACHE_SIZE', '128'))
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class WorkflowsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'workflows'
\ No newline at end of file
+    name = 'workflows'
+
+    def ready(self):
+        import workflows.signals
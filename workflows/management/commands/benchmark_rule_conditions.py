@@ -0,0 +1,71 @@
+"""
+Benchmark rule condition evaluation
+
+Compares SimpleRuleEngine._evaluate_condition_text (attributes substituted
+into the text, which is then split on its operator) with the predicates
+compiled by rule_dsl.compile_condition, in evaluations per second. Compound
+conditions (&&, ||, !) only exist in compiled form.
+"""
+import time
+from django.core.management.base import BaseCommand
+from workflows.rule_dsl import compile_condition
+from workflows.rule_engine_service import SimpleRuleEngine
+
+CONDITIONS = [
+    '{{customer_id}} == "PREMIUM_CUSTOMER"',
+    '{{stamp_amount}} > 1000',
+    '{{stamp_amount}} <= 99.5',
+    '{{customer_id}} is_null',
+    '{{profile.tier.level}} >= 3',
+    '{{customer_id}} == "PREMIUM_CUSTOMER" && {{stamp_amount}} > 1000',
+    '!({{customer_id}} is_null) && ({{stamp_group}} == "GROUP_A" || {{profile.tier.level}} > 5)',
+]
+
+
+def build_context():
+    return {
+        'customer_id': 'PREMIUM_CUSTOMER',
+        'stamp_group': 'GROUP_A',
+        'stamp_amount': 1500.0,
+        'profile': {'tier': {'level': 4}},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark string-split vs compiled rule condition evaluation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20000,
+                            help='Evaluations per condition and evaluator')
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        engine = SimpleRuleEngine()
+        engine.context = context = build_context()
+
+        self.stdout.write(f"{'condition':<64} {'text eval/s':>12} {'compiled eval/s':>16} {'speedup':>8}")
+        for condition in CONDITIONS:
+            predicate = compile_condition(condition)
+            compound = any(marker in condition for marker in ('&&', '||', '!('))
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                predicate(context, None)
+            compiled_rate = repeat / (time.perf_counter() - started)
+
+            label = condition if len(condition) <= 64 else condition[:61] + '...'
+            if compound:
+                self.stdout.write(f"{label:<64} {'-':>12} {compiled_rate:>16,.0f} {'-':>8}")
+                continue
+
+            if engine._evaluate_condition_text(condition) != predicate(context, None):
+                self.stderr.write(f"Compiled condition disagrees with text evaluation: {condition}")
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                engine._evaluate_condition_text(condition)
+            text_rate = repeat / (time.perf_counter() - started)
+
+            self.stdout.write(
+                f"{label:<64} {text_rate:>12,.0f} {compiled_rate:>16,.0f} {compiled_rate / text_rate:>7.1f}x"
+            )
@@ -0,0 +1,191 @@
+"""
+Benchmark the compiled rule engine against the regex interpreter
+
+Runs every rule of the corpus - the saved workflow rules, the custom_rule
+nodes of saved sequences and the sample rules offered in the rule editor -
+through SimpleRuleEngine on both paths. Action calls are replaced with a
+stub that maps nothing, so no connector is called and only parsing and
+evaluation are timed. Output of the engines' debug prints is discarded
+while timing. --scale repeats each rule N times to show how both paths
+grow with rule length.
+"""
+import contextlib
+import copy
+import logging
+import os
+import time
+from django.core.management.base import BaseCommand
+from connectors.models import Sequence
+from workflows.models import WorkflowRule
+from workflows.rule_dsl import parse_rule, rule_cache, RuleSyntaxError
+from workflows.rule_engine_service import SimpleRuleEngine
+
+SAMPLE_RULES = {
+    'sample_validation': '''// Validation rule example
+if ({{customer_id}} is_null) {
+    error "Customer ID is required"
+}
+
+if ({{stamp_amount}} < 100) {
+    error "Stamp amount must be at least 100"
+}''',
+    'sample_assignment': '''// Assignment rule example
+if ({{stamp_amount}} > 1000) {
+    assign {{priority}} = "HIGH"
+}''',
+    'sample_document_check': '''// Document validation example
+for (@doc in {{documents}}) {
+    assign @doc.document_status = "CHECKED"
+}''',
+    'sample_simple': '''// Simple rule example
+if ({{customer_id}} == "PREMIUM_CUSTOMER") {
+    assign {{discount}} = 10
+}''',
+    'sample_get_document': '''call action "Get Document" from connector "Leegality Sandbox" with {
+      "documentId": {{irn}}
+  } map response {
+      "data.document.name" to @doc.document_name
+  }''',
+    'sample_structured_params': '''call action "create_user" from connector "api_service" with {
+  "query_params": {
+    "api_version": "v2",
+    "format": "json"
+  },
+  "headers": {
+    "X-Custom-Header": "value"
+  },
+  "body_params": {
+    "user.name": "{{context.user_name}}",
+    "user.email": "{{context.user_email}}",
+    "settings.notifications": true
+  }
+} map response {
+  "user_id" to user_id,
+  "status" to creation_status
+}''',
+}
+
+
+def build_context():
+    return {
+        'irn': 'IRN001',
+        'customer_id': 'PREMIUM_CUSTOMER',
+        'stamp_group': 'GROUP_A',
+        'stamp_amount': 1500.0,
+        'context': {'user_name': 'John Doe', 'user_email': 'john@example.com'},
+        'documents': [
+            {
+                'document_status': 'PENDING',
+                'document_name': f'Document {index}',
+                'document_id': f'DOC{index}',
+                'invitee_name': 'John Doe',
+                'invitee_email': 'john@example.com',
+            }
+            for index in range(5)
+        ],
+    }
+
+
+def load_corpus():
+    """(name, rule definition) of every rule to benchmark"""
+    corpus = [
+        (f'rule_{rule.pk}', rule.rule_definition)
+        for rule in WorkflowRule.objects.order_by('pk')
+        if rule.rule_definition and rule.rule_definition.strip()
+    ]
+    for sequence in Sequence.objects.order_by('pk'):
+        for node in sequence.flow_nodes or []:
+            if node.get('type') != 'custom_rule':
+                continue
+            data = node.get('data') or {}
+            code = (data.get('customRuleConfig') or {}).get('code', '') or data.get('dsl', '')
+            if code and code.strip():
+                corpus.append((f"seq_{sequence.pk}_{node.get('id')}", code))
+    corpus.extend(SAMPLE_RULES.items())
+    return corpus
+
+
+def stub_action_call(action_name, connector_name, params_str, mappings_str, result):
+    result.setdefault('action_logs', []).append({
+        'action_name': action_name,
+        'connector_name': connector_name,
+        'status': 'success',
+        'api_called': False,
+    })
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the compiled rule engine against the regex interpreter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500,
+                            help='Executions per rule and path')
+        parser.add_argument('--scale', type=int, default=1,
+                            help='Repeat each rule this many times')
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        scale = max(1, options['scale'])
+        engine = SimpleRuleEngine()
+        engine._execute_action_call = stub_action_call
+
+        self.stdout.write(
+            f"{'rule':<28} {'chars':>7} {'regex us':>10} {'parse us':>10} {'ast us':>10} {'speedup':>8}  result"
+        )
+        totals = [0.0, 0.0]
+        logging.disable(logging.INFO)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                rows = [self._benchmark(engine, name, '\n'.join([rule] * scale), repeat, totals)
+                        for name, rule in load_corpus()]
+        finally:
+            logging.disable(logging.NOTSET)
+
+        for row in rows:
+            self.stdout.write(row)
+        if totals[1]:
+            self.stdout.write(f"Total: regex {totals[0] * 1000:.1f} ms, ast {totals[1] * 1000:.1f} ms "
+                              f"({totals[0] / totals[1]:.1f}x)")
+
+    def _benchmark(self, engine, name, rule, repeat, totals):
+        try:
+            compiled = parse_rule(rule)
+        except RuleSyntaxError as e:
+            return f"{name:<28} {len(rule):>7} {'':>10} {'':>10} {'':>10} {'':>8}  regex fallback: {str(e)}"
+
+        # Same rule on both paths from the same starting context
+        engine.context = build_context()
+        expected = engine._parse_and_execute_regex(rule)
+        engine.context = build_context()
+        actual = engine._execute_compiled(compiled)
+        same = (expected['assignments'], expected['errors']) == (actual['assignments'], actual['errors'])
+
+        engine.context = build_context()
+        base_context = copy.deepcopy(engine.context)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            engine._parse_and_execute_regex(rule)
+        regex_time = (time.perf_counter() - started) / repeat
+
+        engine.context = base_context
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rule_cache.clear()
+            rule_cache.get(rule)
+        parse_time = (time.perf_counter() - started) / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            engine._execute_compiled(rule_cache.get(rule))
+        ast_time = (time.perf_counter() - started) / repeat
+        rule_cache.clear()
+
+        totals[0] += regex_time
+        totals[1] += ast_time
+        return (
+            f"{name:<28} {len(rule):>7} {regex_time * 1000000:>10.1f} {parse_time * 1000000:>10.1f} "
+            f"{ast_time * 1000000:>10.1f} {regex_time / ast_time:>7.1f}x  "
+            f"{'same' if same else 'differs'}"
+        )
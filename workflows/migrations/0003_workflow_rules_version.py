@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0002_add_api_call_logging'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflow',
+            name='rules_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
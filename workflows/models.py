@@ -7,6 +7,9 @@ class Workflow(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Bumped whenever one of the workflow's rules is saved or deleted, so every
+    # process can tell its cached rule sets are stale (see RuleSetCache)
+    rules_version = models.PositiveIntegerField(default=0, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -14,6 +17,15 @@ class Workflow(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Override save so a stale instance never writes back an old rules_version"""
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'rules_version']
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['name']
 
@@ -0,0 +1,778 @@
+"""
+Rule DSL
+Lexer and recursive-descent parser that compile rule definitions into a
+statement tree once, plus the per-process cache of compiled rules
+"""
+import hashlib
+import operator
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from numbers import Number
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RuleSyntaxError(Exception):
+    """Raised when a rule definition cannot be parsed"""
+
+    def __init__(self, message, line=None):
+        if line is not None:
+            message = f"{message} (line {line})"
+        super().__init__(message)
+        self.line = line
+
+
+# Order matters: {{refs}} before braces, comparison operators before '='
+_TOKEN_SPEC = [
+    ('COMMENT', r'//[^\n]*'),
+    ('NEWLINE', r'\n'),
+    ('SKIP', r'[ \t\r]+'),
+    ('REF', r'\{\{[^}]*\}\}'),
+    ('STRING', r'"[^"]*"|\'[^\']*\''),
+    ('OP', r'==|!=|<=|>=|<|>'),
+    ('AND', r'&&'),
+    ('OR', r'\|\|'),
+    ('NOT', r'!'),
+    ('LBRACE', r'\{'),
+    ('RBRACE', r'\}'),
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('SEMI', r';'),
+    ('ASSIGN', r'='),
+    ('PLUS', r'\+'),
+    ('WORD', r'[@$]?[\w.\[\]\-]+'),
+    ('QUOTE', r'["\']'),
+    ('PUNCT', r'.'),
+]
+_TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _TOKEN_SPEC))
+
+STATEMENT_KEYWORDS = ('if', 'for', 'assign', 'error', 'call')
+
+
+class Token:
+    __slots__ = ('kind', 'value', 'start', 'end', 'line')
+
+    def __init__(self, kind, value, start, end, line):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+        self.line = line
+
+    def is_word(self, *words):
+        return self.kind == 'WORD' and self.value.lower() in words
+
+
+def tokenize(text):
+    """Split rule text into tokens, dropping whitespace and // comments"""
+    tokens = []
+    line = 1
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'NEWLINE':
+            tokens.append(Token(kind, '\n', match.start(), match.end(), line))
+            line += 1
+        elif kind == 'QUOTE':
+            raise RuleSyntaxError('Unterminated string', line)
+        elif kind not in ('SKIP', 'COMMENT'):
+            tokens.append(Token(kind, match.group(), match.start(), match.end(), line))
+    return tokens
+
+
+class Condition:
+    """
+    Condition of an if statement, compiled into predicate(context, scope)
+
+    `varies` (like on Assign and Error) tells whether the text reads the item
+    of an enclosing FOR loop, i.e. whether it has to be resolved per item.
+    """
+    __slots__ = ('text', 'predicate', 'varies')
+
+    def __init__(self, text, predicate, varies=False):
+        self.text = text
+        self.predicate = predicate
+        self.varies = varies
+
+
+def parse_literal(text):
+    """Value of a literal as SimpleRuleEngine._resolve_value reads it"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'':
+        return text[1:-1]
+    try:
+        if '.' in text:
+            return float(text)
+        return int(text)
+    except ValueError:
+        pass
+    lowered = text.lower()
+    if lowered == 'true':
+        return True
+    if lowered == 'false':
+        return False
+    if lowered == 'null':
+        return None
+    return text
+
+
+def lookup_attribute(context, path):
+    """Value of a {{dotted.path}} as SimpleRuleEngine._get_nested_value reads it"""
+    value = context
+    for key in path:
+        if isinstance(value, Mapping):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit():
+            index = int(key)
+            value = value[index] if index < len(value) else None
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def _as_number(value):
+    """Number for numbers and numeric strings, None otherwise (bools are not numbers)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, Number):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value) if '.' in value or 'e' in value.lower() else int(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _compare(compare, ordering):
+    """
+    Comparison on typed values: a number against a numeric string compares
+    as numbers, and so do two numeric strings under <, >, <= and >=
+    """
+    def comparison(left, right):
+        if isinstance(left, str) != isinstance(right, str) or (ordering and isinstance(left, str)):
+            left_number, right_number = _as_number(left), _as_number(right)
+            if left_number is not None and right_number is not None:
+                left, right = left_number, right_number
+        try:
+            return compare(left, right)
+        except TypeError:
+            return False
+    return comparison
+
+
+_CONDITION_COMPARISONS = {
+    '==': _compare(operator.eq, False),
+    '!=': _compare(operator.ne, False),
+    '<': _compare(operator.lt, True),
+    '>': _compare(operator.gt, True),
+    '<=': _compare(operator.le, True),
+    '>=': _compare(operator.ge, True),
+}
+_ATTRIBUTE_RE = re.compile(r'\{\{([^}]+)\}\}')
+
+
+class ConditionParser:
+    """
+    Compiles condition tokens into a predicate closure
+
+        condition  := or
+        or         := and ('||' and)*
+        and        := unary ('&&' unary)*
+        unary      := '!' unary | '(' condition ')' | comparison
+        comparison := operand [OP operand | 'is_null']
+
+    Operands resolve straight from the context: {{path}} to the value at
+    path, loop item fields (@doc.field) through the loop scope, literals to
+    typed constants. A bare operand is true when its value is truthy.
+    """
+
+    def __init__(self, tokens, text):
+        self.tokens = [token for token in tokens if token.kind != 'NEWLINE']
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise RuleSyntaxError('Empty condition')
+        predicate = self._or()
+        if self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            raise RuleSyntaxError(f"Unexpected '{token.value}' in condition '{self.text}'", token.line)
+        return predicate
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _or(self):
+        operands = [self._and()]
+        while self._peek() is not None and self._peek().kind == 'OR':
+            self.pos += 1
+            operands.append(self._and())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda context, scope: any(operand(context, scope) for operand in operands)
+
+    def _and(self):
+        operands = [self._unary()]
+        while self._peek() is not None and self._peek().kind == 'AND':
+            self.pos += 1
+            operands.append(self._unary())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda context, scope: all(operand(context, scope) for operand in operands)
+
+    def _unary(self):
+        token = self._peek()
+        if token is None:
+            raise RuleSyntaxError(f"Incomplete condition '{self.text}'")
+        if token.kind == 'NOT':
+            self.pos += 1
+            operand = self._unary()
+            return lambda context, scope: not operand(context, scope)
+        if token.kind == 'LPAREN':
+            self.pos += 1
+            predicate = self._or()
+            closing = self._peek()
+            if closing is None or closing.kind != 'RPAREN':
+                raise RuleSyntaxError(f"Missing ')' in condition '{self.text}'", token.line)
+            self.pos += 1
+            return predicate
+        return self._comparison()
+
+    def _comparison(self):
+        left = self._operand()
+        token = self._peek()
+        if token is not None and token.kind == 'OP':
+            self.pos += 1
+            right = self._operand()
+            compare = _CONDITION_COMPARISONS[token.value]
+            return lambda context, scope: compare(left(context, scope), right(context, scope))
+        if token is not None and token.is_word('is_null'):
+            self.pos += 1
+
+            def is_null(context, scope):
+                value = left(context, scope)
+                return value is None or value == ''
+            return is_null
+        return lambda context, scope: bool(left(context, scope))
+
+    def _operand(self):
+        start = self.pos
+        while self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            if token.kind in ('OP', 'AND', 'OR', 'NOT', 'LPAREN', 'RPAREN') or token.is_word('is_null'):
+                break
+            self.pos += 1
+        tokens = self.tokens[start:self.pos]
+        if not tokens:
+            token = self._peek()
+            found = f"'{token.value}'" if token is not None else 'end of condition'
+            raise RuleSyntaxError(f"Expected a value in condition '{self.text}', got {found}")
+        if len(tokens) == 1:
+            return self._single_operand(tokens[0])
+
+        # Mixed text like {{first}}-{{last}}: substitute attributes, then read the literal
+        text = self.text[tokens[0].start - self._offset:tokens[-1].end - self._offset]
+
+        def resolve_text(context, scope):
+            def replace(match):
+                value = lookup_attribute(context, match.group(1).split('.'))
+                return str(value) if value is not None else 'null'
+            return parse_literal(_ATTRIBUTE_RE.sub(replace, text))
+        return resolve_text
+
+    def _single_operand(self, token):
+        if token.kind == 'REF':
+            path = tuple(token.value[2:-2].split('.'))
+            return lambda context, scope: lookup_attribute(context, path)
+        value = parse_literal(token.value)
+        if token.kind == 'WORD' and isinstance(value, str) and '.' in value:
+            # Possibly a loop item field (@doc.field) - looked up while a loop runs
+            reference = value
+
+            def resolve_reference(context, scope):
+                loop = scope.find(reference) if scope is not None else None
+                if loop is None:
+                    return reference
+                if isinstance(loop.item, Mapping):
+                    return loop.item.get(reference[len(loop.variable) + 1:], '')
+                return ''
+            return resolve_reference
+        return lambda context, scope: value
+
+    @property
+    def _offset(self):
+        return self.tokens[0].start if self.tokens else 0
+
+
+@lru_cache(maxsize=1024)
+def compile_condition(text):
+    """
+    Predicate(context, scope) of a condition text, cached by text
+
+    Raises:
+        RuleSyntaxError: If the condition does not parse
+    """
+    text = text.strip()
+    return ConditionParser(tokenize(text), text).parse()
+
+
+class If:
+    __slots__ = ('condition', 'body', 'orelse')
+
+    def __init__(self, condition, body, orelse):
+        self.condition = condition
+        self.body = body
+        self.orelse = orelse
+
+
+class For:
+    """
+    FOR loop; `columnar` bodies (only if/assign/error statements) can run one
+    statement at a time across all items instead of item by item
+    """
+    __slots__ = ('variable', 'collection', 'body', 'columnar')
+
+    def __init__(self, variable, collection, body):
+        self.variable = variable
+        self.collection = collection
+        self.body = body
+        self.columnar = all(isinstance(node, (If, Assign, Error)) for node in walk(body))
+
+
+class Assign:
+    __slots__ = ('target', 'value', 'varies')
+
+    def __init__(self, target, value, varies=False):
+        self.target = target
+        self.value = value
+        self.varies = varies
+
+
+class Error:
+    """`error "message"`, optionally followed by `+ operand` parts"""
+    __slots__ = ('message', 'parts', 'varies')
+
+    def __init__(self, message, parts, varies=False):
+        self.message = message
+        self.parts = parts
+        self.varies = varies
+
+
+_PARAM_REF_RE = re.compile(r'\{\{\s*([^}.\s]+)')
+_PARAM_VARIABLE_RE = re.compile(r'"@(?:event\.)?([^".\s]+)')
+
+
+class CallAction:
+    """
+    Action call; params and mappings stay raw text for the engine's parsers
+
+    `reads` are the context names the params reference, `writes` the context
+    names the response mappings set (after a successful call every assignment
+    is copied into the context, $temp targets without the $, @doc.* targets
+    into documents).
+    """
+    __slots__ = ('action_name', 'connector_name', 'params', 'mappings', 'reads', 'writes')
+
+    def __init__(self, action_name, connector_name, params, mappings):
+        self.action_name = action_name
+        self.connector_name = connector_name
+        self.params = params
+        self.mappings = mappings
+        self.reads = frozenset(_PARAM_REF_RE.findall(params)) | frozenset(_PARAM_VARIABLE_RE.findall(params))
+        writes = set()
+        for pair in mappings.split(','):
+            if ' to ' in pair:
+                target = pair.split(' to ', 1)[1].strip()
+                if target.startswith('@doc.'):
+                    writes.add('documents')
+                else:
+                    writes.add(target.lstrip('$').split('.')[0])
+        self.writes = frozenset(writes)
+
+    def conflicts_with(self, other):
+        """Whether running both at once could change what either reads or leaves behind"""
+        return bool(self.reads & other.writes or self.writes & other.reads or self.writes & other.writes)
+
+
+class CallBatch:
+    """Consecutive action calls that are independent of each other, run concurrently"""
+    __slots__ = ('calls',)
+
+    def __init__(self, calls):
+        self.calls = calls
+
+
+def batch_calls(statements):
+    """Group runs of consecutive, mutually independent calls into CallBatch statements"""
+    batched = []
+    run = []
+    for statement in statements + [None]:
+        if isinstance(statement, CallAction) and not any(statement.conflicts_with(call) for call in run):
+            run.append(statement)
+            continue
+        if run:
+            batched.append(run[0] if len(run) == 1 else CallBatch(run))
+        run = [statement] if isinstance(statement, CallAction) else []
+        if statement is not None and not run:
+            batched.append(statement)
+    return batched
+
+
+class CompiledRule:
+    """Statement tree of one rule definition"""
+
+    def __init__(self, digest, statements, text):
+        self.digest = digest
+        self.statements = statements
+        # Comment-free single-line form, used in log messages
+        self.text = text
+        self.has_action_call = any(isinstance(node, CallAction) for node in walk(statements))
+
+
+def walk(statements):
+    """Yield every statement of a tree, depth first in source order"""
+    for statement in statements:
+        yield statement
+        if isinstance(statement, If):
+            yield from walk(statement.body)
+            yield from walk(statement.orelse)
+        elif isinstance(statement, For):
+            yield from walk(statement.body)
+        elif isinstance(statement, CallBatch):
+            yield from statement.calls
+
+
+class Parser:
+    """
+    Recursive-descent parser for the rule DSL
+
+        rule      := statement*
+        statement := if | for | assign | error | call | ';'
+        if        := 'if' '(' condition ')' block ['else' (if | block)]
+        for       := 'for' '(' WORD 'in' expression ')' block
+        assign    := 'assign' target '=' value        (value ends at ';', newline or '}')
+        error     := 'error' STRING ('+' operand)*
+        call      := 'call' 'action' STRING 'from' 'connector' STRING
+                     'with' '{' ... '}' 'map' 'response' '{' ... '}'
+
+    Runs of independent calls in a block are grouped into CallBatch statements.
+
+    Conditions, values and action blocks are kept as source text slices so
+    they resolve exactly like the regex interpreter resolves them.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+        # Variables of the FOR loops around the statement being parsed
+        self._loop_variables = []
+
+    def parse(self):
+        statements = self._statements(top_level=True)
+        if not statements:
+            raise RuleSyntaxError('Rule has no statements')
+        return statements
+
+    # Token helpers
+
+    def _peek_index(self, skip_newlines=True):
+        pos = self.pos
+        while skip_newlines and pos < len(self.tokens) and self.tokens[pos].kind == 'NEWLINE':
+            pos += 1
+        return pos
+
+    def _peek(self, skip_newlines=True):
+        pos = self._peek_index(skip_newlines)
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def _next(self, skip_newlines=True):
+        pos = self._peek_index(skip_newlines)
+        if pos >= len(self.tokens):
+            last_line = self.tokens[-1].line if self.tokens else 1
+            raise RuleSyntaxError('Unexpected end of rule', last_line)
+        self.pos = pos + 1
+        return self.tokens[pos]
+
+    def _expect(self, kind, description):
+        token = self._next()
+        if token.kind != kind:
+            raise RuleSyntaxError(f"Expected {description}, got '{token.value}'", token.line)
+        return token
+
+    def _expect_word(self, word):
+        token = self._next()
+        if not token.is_word(word):
+            raise RuleSyntaxError(f"Expected '{word}', got '{token.value}'", token.line)
+        return token
+
+    def _varies(self, text):
+        """Whether text reads a loop item (@doc.* always does, see _resolve_value_in_context)"""
+        if not self._loop_variables:
+            return False
+        return '@doc.' in text or any(f'{variable}.' in text for variable in self._loop_variables)
+
+    def _slice(self, tokens):
+        return self.text[tokens[0].start:tokens[-1].end].strip() if tokens else ''
+
+    def _until_closing_paren(self):
+        """Tokens up to the parenthesis matching an already consumed '('"""
+        depth = 0
+        tokens = []
+        while True:
+            token = self._next()
+            if token.kind == 'LPAREN':
+                depth += 1
+            elif token.kind == 'RPAREN':
+                if depth == 0:
+                    return tokens
+                depth -= 1
+            if token.kind != 'NEWLINE':
+                tokens.append(token)
+
+    def _raw_block(self):
+        """Source text between a '{' and its matching '}'"""
+        opening = self._expect('LBRACE', "'{'")
+        depth = 0
+        while True:
+            token = self._next()
+            if token.kind == 'LBRACE':
+                depth += 1
+            elif token.kind == 'RBRACE':
+                if depth == 0:
+                    return self.text[opening.end:token.start].strip()
+                depth -= 1
+
+    # Statements
+
+    def _statements(self, top_level=False):
+        statements = []
+        while True:
+            token = self._peek()
+            if token is None:
+                if not top_level:
+                    raise RuleSyntaxError("Missing '}'", self.tokens[-1].line)
+                return batch_calls(statements)
+            if token.kind == 'RBRACE':
+                if top_level:
+                    raise RuleSyntaxError("Unexpected '}'", token.line)
+                return batch_calls(statements)
+            if token.kind == 'SEMI':
+                self._next()
+                continue
+            if token.is_word('if'):
+                statements.append(self._if())
+            elif token.is_word('for'):
+                statements.append(self._for())
+            elif token.is_word('assign'):
+                statements.append(self._assign())
+            elif token.is_word('error'):
+                statements.append(self._error())
+            elif token.is_word('call'):
+                statements.append(self._call())
+            else:
+                raise RuleSyntaxError(f"Unexpected '{token.value}'", token.line)
+
+    def _block(self):
+        self._expect('LBRACE', "'{'")
+        statements = self._statements()
+        self._expect('RBRACE', "'}'")
+        return statements
+
+    def _if(self):
+        self._next()
+        self._expect('LPAREN', "'(' after if")
+        condition = self._condition(self._until_closing_paren())
+        body = self._block()
+        orelse = []
+        token = self._peek()
+        if token is not None and token.is_word('else'):
+            self._next()
+            following = self._peek()
+            if following is not None and following.is_word('if'):
+                orelse = [self._if()]
+            else:
+                orelse = self._block()
+        return If(condition, body, orelse)
+
+    def _condition(self, tokens):
+        if not tokens:
+            raise RuleSyntaxError('Empty condition')
+        text = self._slice(tokens)
+        return Condition(text, ConditionParser(tokens, text).parse(), self._varies(text))
+
+    def _for(self):
+        self._next()
+        opening = self._expect('LPAREN', "'(' after for")
+        tokens = self._until_closing_paren()
+        if len(tokens) < 3 or tokens[0].kind != 'WORD' or not tokens[1].is_word('in'):
+            raise RuleSyntaxError("Expected 'for (<variable> in <collection>)'", opening.line)
+        variable = tokens[0].value
+        self._loop_variables.append(variable)
+        try:
+            body = self._block()
+        finally:
+            self._loop_variables.pop()
+        return For(variable, self._slice(tokens[2:]), body)
+
+    def _assign(self):
+        keyword = self._next()
+        target = []
+        while True:
+            token = self._next(skip_newlines=False)
+            if token.kind == 'ASSIGN':
+                break
+            if token.kind in ('NEWLINE', 'SEMI', 'LBRACE', 'RBRACE'):
+                raise RuleSyntaxError("Expected '=' in assignment", keyword.line)
+            target.append(token)
+        if not target:
+            raise RuleSyntaxError('Assignment has no target', keyword.line)
+
+        value = []
+        depth = 0
+        while True:
+            token = self._peek(skip_newlines=False)
+            if token is None or token.kind in ('NEWLINE', 'SEMI'):
+                break
+            if token.kind in ('LBRACE', 'LPAREN'):
+                depth += 1
+            elif token.kind in ('RBRACE', 'RPAREN'):
+                if depth == 0:
+                    break
+                depth -= 1
+            elif value and depth == 0 and token.is_word(*STATEMENT_KEYWORDS):
+                # Next statement on the same line
+                break
+            value.append(self._next(skip_newlines=False))
+        if not value:
+            raise RuleSyntaxError('Assignment has no value', keyword.line)
+        value = self._slice(value)
+        return Assign(self._slice(target), value, self._varies(value))
+
+    def _error(self):
+        self._next()
+        message = self._expect('STRING', 'error message string')
+        parts = []
+        while True:
+            token = self._peek(skip_newlines=False)
+            if token is None or token.kind != 'PLUS':
+                break
+            self._next(skip_newlines=False)
+            operand = self._next()
+            if operand.kind not in ('STRING', 'REF', 'WORD'):
+                raise RuleSyntaxError(f"Unexpected '{operand.value}' in error message", operand.line)
+            parts.append(operand.value)
+        return Error(message.value[1:-1], parts, self._varies(' '.join(parts)))
+
+    def _call(self):
+        self._next()
+        self._expect_word('action')
+        action_name = self._expect('STRING', 'action name')
+        self._expect_word('from')
+        self._expect_word('connector')
+        connector_name = self._expect('STRING', 'connector name')
+        self._expect_word('with')
+        params = self._raw_block()
+        self._expect_word('map')
+        self._expect_word('response')
+        mappings = self._raw_block()
+        return CallAction(action_name.value[1:-1].strip(), connector_name.value[1:-1].strip(), params, mappings)
+
+
+def rule_digest(rule_definition):
+    return hashlib.sha256(rule_definition.encode('utf-8')).hexdigest()
+
+
+def parse_rule(rule_definition, digest=None):
+    """
+    Compile a rule definition without going through the cache
+
+    Raises:
+        RuleSyntaxError: If the rule does not parse
+    """
+    statements = Parser(rule_definition).parse()
+    lines = [line.strip() for line in rule_definition.split('\n') if line.strip() and not line.strip().startswith('//')]
+    return CompiledRule(digest or rule_digest(rule_definition), statements, ' '.join(lines))
+
+
+class _UnparsableRule:
+    """Cache entry of a rule that does not parse - its error message, never a raised exception"""
+    __slots__ = ('message', 'line')
+
+    def __init__(self, error):
+        self.message = str(error)
+        self.line = error.line
+
+    def error(self):
+        """A fresh RuleSyntaxError, so raising it never carries another caller's traceback"""
+        error = RuleSyntaxError(self.message)
+        error.line = self.line
+        return error
+
+
+class CompiledRuleCache:
+    """
+    Bounded, per-process LRU of compiled rules
+
+    Entries are keyed by the SHA-256 of the rule definition, so edited rules
+    simply compile under a new key. Rules that fail to parse are cached too,
+    so callers fall back to the regex interpreter without re-parsing them.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._rules = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rule_definition):
+        """
+        Return the compiled rule, compiling it on a miss
+
+        Raises:
+            RuleSyntaxError: If the rule does not parse
+        """
+        digest = rule_digest(rule_definition)
+        if self.max_size <= 0:
+            return parse_rule(rule_definition, digest)
+
+        with self._lock:
+            entry = self._rules.get(digest)
+            if entry is not None:
+                self._rules.move_to_end(digest)
+        if entry is None:
+            # Compile outside the lock - concurrent misses just compile twice
+            try:
+                entry = parse_rule(rule_definition, digest)
+            except RuleSyntaxError as e:
+                logger.info(f"Rule {digest[:12]} does not parse: {str(e)}")
+                entry = _UnparsableRule(e)
+            with self._lock:
+                self._rules[digest] = entry
+                self._rules.move_to_end(digest)
+                while len(self._rules) > self.max_size:
+                    self._rules.popitem(last=False)
+
+        if isinstance(entry, _UnparsableRule):
+            raise entry.error()
+        return entry
+
+    def clear(self):
+        """Drop every cached rule"""
+        with self._lock:
+            self._rules.clear()
+
+
+rule_cache = CompiledRuleCache(getattr(settings, 'RULE_CACHE_SIZE', 256))
+
+
+def compile_rule(rule_definition):
+    """Get the (cached) compiled form of a rule definition"""
+    return rule_cache.get(rule_definition)
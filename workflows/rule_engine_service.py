@@ -1,7 +1,123 @@
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
 from typing import Dict, Any, List
 from datetime import datetime
+from django.conf import settings
+from django.db import connections
+from .rule_dsl import compile_rule, compile_condition, RuleSyntaxError, If, For, Assign, Error, CallAction, CallBatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for independent action calls of a rule (see CallBatch). A slot is
+# taken per submitted call so a busy pool never queues work - the call runs on
+# the rule's own thread instead.
+_action_max_workers = max(1, getattr(settings, 'RULE_ACTION_MAX_WORKERS', 8))
+_action_call_pool = ThreadPoolExecutor(max_workers=_action_max_workers, thread_name_prefix='rule-action')
+_action_call_slots = threading.BoundedSemaphore(_action_max_workers)
+
+_UNSET = object()
+
+
+class RuleAssignments(MutableMapping):
+    """
+    Assignments of one rule run
+
+    Fields assigned to FOR loop items are kept column-wise, one array per
+    (collection, field), and only turned into `documents[i].field` keys by
+    materialize() - which every read through the mapping interface does
+    first. WorkflowRuleService writes the arrays back to the workflow's
+    documents without building those keys (see direct_items()).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._data = dict(*args, **kwargs)
+        self.columns = {}
+
+    def set_column(self, collection_name, field_name, indices, values):
+        """Assign values to a field of the items at indices (ascending)"""
+        if not indices:
+            return
+        column = self.columns.setdefault(collection_name, {}).setdefault(field_name, [])
+        if len(column) <= indices[-1]:
+            column.extend([_UNSET] * (indices[-1] + 1 - len(column)))
+        for index, value in zip(indices, values):
+            column[index] = value
+
+    def materialize(self):
+        """Turn pending columns into `collection[i].field` keys"""
+        if not self.columns:
+            return self
+        columns, self.columns = self.columns, {}
+        for collection_name, fields in columns.items():
+            for index in range(max(len(column) for column in fields.values())):
+                for field_name, column in fields.items():
+                    if index < len(column) and column[index] is not _UNSET:
+                        self._data[f'{collection_name}[{index}].{field_name}'] = column[index]
+        return self
+
+    def direct_items(self):
+        """Assignments made outside of columns, without materializing the columns"""
+        return self._data.items()
+
+    def to_dict(self):
+        """Plain dict of all assignments (e.g. to store as JSON)"""
+        return dict(self.materialize()._data)
+
+    def __getitem__(self, key):
+        return self.materialize()._data[key]
+
+    def __setitem__(self, key, value):
+        # Only keys that may collide with a pending column need it built first
+        if self.columns and '[' in str(key):
+            self.materialize()
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self.materialize()._data[key]
+
+    def __iter__(self):
+        return iter(self.materialize()._data)
+
+    def __len__(self):
+        return len(self.materialize()._data)
+
+    def __bool__(self):
+        return bool(self._data) or any(
+            value is not _UNSET for fields in self.columns.values() for column in fields.values() for value in column
+        )
+
+    def clear(self):
+        self._data.clear()
+        self.columns = {}
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class _LoopScope:
+    """Current item of a FOR loop while its body runs"""
+    __slots__ = ('variable', 'collection_name', 'item', 'index', 'parent')
+
+    def __init__(self, variable, collection_name, item, index, parent):
+        self.variable = variable
+        self.collection_name = collection_name
+        self.item = item
+        self.index = index
+        self.parent = parent
+
+    def find(self, reference):
+        """Innermost scope whose loop variable the reference starts with"""
+        scope = self
+        while scope is not None:
+            if reference.startswith(scope.variable + '.'):
+                return scope
+            scope = scope.parent
+        return None
 
 
 class SimpleRuleEngine:
@@ -12,23 +128,35 @@ class SimpleRuleEngine:
     
     def __init__(self):
         self.context = {}
+        self._calls_deadline = None  # time.monotonic() by which action calls must be done
     
     def execute_rule(self, rule_definition: str, context_data: Dict[str, Any], 
-                    workflow_execution=None, workflow_rule=None, rule_execution=None) -> Dict[str, Any]:
+                    workflow_execution=None, workflow_rule=None, rule_execution=None,
+                    materialize_assignments=True, compiled=None, time_budget=None) -> Dict[str, Any]:
         """
         Execute a rule definition with given context data.
         Returns execution result with success/error status.
+        With materialize_assignments=False, FOR loop field assignments stay
+        column-wise (see RuleAssignments) until the caller reads them.
+        compiled is the rule's already compiled form, if the caller has it.
+        time_budget is the seconds the rule's action calls may take in total
+        (e.g. a sequence node's remaining budget): each sync call gets
+        min(what is left, the connector timeout). Async actions only start
+        their background polling and are not bounded by it.
         """
         start_time = time.time()
         
         try:
+            self._calls_deadline = time.monotonic() + time_budget if time_budget is not None else None
             self.context = context_data
             # Store logging context for action calls
             self.current_workflow_execution = workflow_execution
             self.current_workflow_rule = workflow_rule
             self.current_rule_execution = rule_execution
             
-            result = self._parse_and_execute(rule_definition)
+            result = self._parse_and_execute(rule_definition, compiled)
+            if materialize_assignments and isinstance(result.get('assignments'), RuleAssignments):
+                result['assignments'] = result['assignments'].to_dict()
             
             execution_time = int((time.time() - start_time) * 1000)
             
@@ -55,13 +183,292 @@ class SimpleRuleEngine:
                 'context_data': context_data
             }
     
-    def _parse_and_execute(self, rule_definition: str) -> Dict[str, Any]:
+    def _parse_and_execute(self, rule_definition: str, compiled=None) -> Dict[str, Any]:
         """
         Parse and execute the rule definition.
-        This is a simplified implementation for testing.
+        Rules are compiled once (see rule_dsl) and then only their statement tree
+        is walked; rules the parser rejects run on the regex interpreter.
         """
+        if getattr(settings, 'RULE_ENGINE_PARSER', 'ast') == 'regex' or not rule_definition or not rule_definition.strip():
+            return self._parse_and_execute_regex(rule_definition)
+        if compiled is not None:
+            return self._execute_compiled(compiled)
+
+        try:
+            compiled = compile_rule(rule_definition)
+        except RuleSyntaxError as e:
+            logger.info(f"Running rule on the regex interpreter: {str(e)}")
+            return self._parse_and_execute_regex(rule_definition)
+
+        return self._execute_compiled(compiled)
+
+    def _execute_compiled(self, compiled) -> Dict[str, Any]:
+        """Walk a compiled rule's statement tree"""
         result = {
-            'assignments': {},
+            'assignments': RuleAssignments(),
+            'errors': [],
+            'warnings': []
+        }
+
+        if not compiled.has_action_call:
+            result['action_logs'] = [{
+                'action_name': 'No Action Found',
+                'connector_name': 'N/A',
+                'status': 'not_found',
+                'params': {},
+                'response': {},
+                'error': f'No action call pattern matched in rule: {compiled.text[:200]}...',
+                'api_called': False
+            }]
+
+        self._execute_statements(compiled.statements, result, None)
+        return result
+
+    def _execute_statements(self, statements, result: Dict[str, Any], scope):
+        for statement in statements:
+            if isinstance(statement, If):
+                if self._evaluate_compiled_condition(statement.condition, scope):
+                    self._execute_statements(statement.body, result, scope)
+                else:
+                    self._execute_statements(statement.orelse, result, scope)
+            elif isinstance(statement, Assign):
+                self._execute_compiled_assign(statement, result, scope)
+            elif isinstance(statement, Error):
+                result['errors'].append(self._error_message(statement, scope))
+            elif isinstance(statement, For):
+                self._execute_compiled_for(statement, result, scope)
+            elif isinstance(statement, CallAction):
+                self._execute_compiled_calls([statement], result)
+            elif isinstance(statement, CallBatch):
+                self._execute_compiled_calls(statement.calls, result)
+
+    def _execute_compiled_calls(self, calls, result: Dict[str, Any]):
+        """
+        Run action calls - independent ones (a CallBatch) concurrently.
+        Each call maps its response into its own result; those are merged in
+        source order, so assignments, errors and logs come out as if the
+        calls had run one after another.
+        """
+        if len(calls) > 1 and getattr(settings, 'RULE_ACTION_MAX_WORKERS', 8) > 1:
+            # Assignments not yet copied into the context would be seen by later
+            # calls only when run in order
+            pending = {str(key).split('.')[0] for key, _ in result['assignments'].direct_items()}
+            concurrent = not any(call.reads & pending for call in calls[1:])
+        else:
+            concurrent = False
+
+        if not concurrent:
+            for call in calls:
+                action_result = self._execute_action_call(
+                    call.action_name, call.connector_name, call.params, call.mappings, result
+                )
+                # Later statements see the mapped response, as with the regex interpreter
+                if action_result:
+                    self.context.update(result['assignments'])
+                    self.context.update(result.get('temp_assignments', {}))
+            return
+
+        call_results = [{'assignments': {}, 'errors': [], 'warnings': []} for _ in calls]
+        futures = {}
+        for index in range(1, len(calls)):
+            if _action_call_slots.acquire(blocking=False):
+                futures[index] = _action_call_pool.submit(
+                    self._run_action_call_in_thread, calls[index], call_results[index]
+                )
+        # The first call, and any the pool had no slot for, run on this thread
+        outcomes = [None] * len(calls)
+        for index, call in enumerate(calls):
+            if index not in futures:
+                outcomes[index] = self._execute_action_call(
+                    call.action_name, call.connector_name, call.params, call.mappings, call_results[index]
+                )
+        for index, future in futures.items():
+            outcomes[index] = future.result()
+
+        for call_result in call_results:
+            for key, value in call_result['assignments'].items():
+                result['assignments'][key] = value
+            result['errors'].extend(call_result['errors'])
+            result['warnings'].extend(call_result['warnings'])
+            for key in ('action_logs', 'async_executions'):
+                if key in call_result:
+                    result.setdefault(key, []).extend(call_result[key])
+            if 'temp_assignments' in call_result:
+                result.setdefault('temp_assignments', {}).update(call_result['temp_assignments'])
+        if any(outcomes):
+            self.context.update(result['assignments'])
+            self.context.update(result.get('temp_assignments', {}))
+
+    def _run_action_call_in_thread(self, call, call_result):
+        """Pool entry point for an action call - releases its pool slot and DB connection when done"""
+        try:
+            return self._execute_action_call(
+                call.action_name, call.connector_name, call.params, call.mappings, call_result
+            )
+        finally:
+            _action_call_slots.release()
+            connections.close_all()
+
+    def _error_message(self, statement, scope) -> str:
+        return statement.message + ''.join(
+            '' if value is None else str(value)
+            for value in (self._resolve_operand(part, scope) for part in statement.parts)
+        )
+
+    def _evaluate_compiled_condition(self, condition, scope) -> bool:
+        """Evaluate a parsed condition; like _evaluate_condition, errors make it false"""
+        try:
+            return condition.predicate(self.context, scope)
+        except Exception:
+            return False
+
+    def _resolve_operand(self, text: str, scope) -> Any:
+        """Resolve one side of a condition (or an error message part)"""
+        loop = scope.find(text) if scope is not None else None
+        if loop is not None:
+            if isinstance(loop.item, Mapping):
+                return loop.item.get(text[len(loop.variable) + 1:], '')
+            return ''
+        # Attributes are substituted as text and re-parsed, so "100" compares as a number
+        return self._resolve_value(self._resolve_attributes(text))
+
+    def _execute_compiled_assign(self, statement, result: Dict[str, Any], scope):
+        if scope is None:
+            result['assignments'][statement.target] = self._resolve_value(statement.value.strip('"\''))
+            return
+
+        loop = scope.find(statement.target)
+        if loop is not None:
+            # Field of the current loop item, e.g. assign @doc.status = "OK"
+            field_name = statement.target[len(loop.variable) + 1:]
+            value = self._resolve_loop_value(statement.value, loop)
+            if isinstance(loop.item, dict):
+                loop.item[field_name] = value
+                result['assignments'][f'{loop.collection_name}[{loop.index}].{field_name}'] = value
+        else:
+            result['assignments'][statement.target] = self._resolve_loop_value(statement.value, scope)
+
+    def _resolve_loop_value(self, text: str, scope) -> Any:
+        loop = scope.find(text)
+        if loop is not None:
+            return self._resolve_operand(text, loop)
+        return self._resolve_value_in_context(text, scope.item, scope.index)
+
+    def _execute_compiled_for(self, statement, result: Dict[str, Any], scope):
+        try:
+            collection = self._resolve_value(statement.collection)
+            if not isinstance(collection, list):
+                result['errors'].append(f"FOR loop collection must be a list, got {type(collection).__name__}")
+                return
+
+            collection_name = statement.collection
+            if collection_name.startswith('{{') and collection_name.endswith('}}'):
+                collection_name = collection_name[2:-2].strip()
+            if statement.columnar and scope is None:
+                self._execute_columnar_for(statement, collection, collection_name, result)
+                return
+            for index, item in enumerate(collection):
+                loop = _LoopScope(statement.variable, collection_name, item, index, scope)
+                self._execute_statements(statement.body, result, loop)
+        except Exception as e:
+            result['errors'].append(f"FOR loop execution error: {str(e)}")
+
+    def _execute_columnar_for(self, statement, collection: list, collection_name: str, result: Dict[str, Any]):
+        """
+        Run a FOR loop body one statement at a time across all items.
+        Gives the same result as running it item by item: an item only reads
+        itself and the context, which if/assign/error cannot change, so only
+        the order of errors and of competing assignments has to be restored.
+        """
+        loop = _LoopScope(statement.variable, collection_name, None, None, None)
+        state = {
+            'position': 0,
+            'errors': [],  # (index, position, message)
+            'scalars': {},  # target -> ((index, position), value) of the last write
+        }
+        self._execute_columnar_statements(statement.body, list(range(len(collection))), loop, collection, result, state)
+
+        for _, _, message in sorted(state['errors'], key=lambda error: error[:2]):
+            result['errors'].append(message)
+        for target, (_, value) in sorted(state['scalars'].items(), key=lambda entry: entry[1][0]):
+            result['assignments'][target] = value
+
+    def _execute_columnar_statements(self, statements, indices, loop, collection, result, state):
+        for statement in statements:
+            # Source position, to order writes and errors of one item as a per-item run would
+            state['position'] += 1
+            position = state['position']
+
+            if isinstance(statement, If):
+                matched, unmatched = [], []
+                if indices and statement.condition.varies:
+                    for index in indices:
+                        self._bind_loop_item(loop, collection, index)
+                        (matched if self._evaluate_compiled_condition(statement.condition, loop) else unmatched).append(index)
+                elif indices:
+                    # Same outcome for every item
+                    self._bind_loop_item(loop, collection, indices[0])
+                    if self._evaluate_compiled_condition(statement.condition, loop):
+                        matched = indices
+                    else:
+                        unmatched = indices
+                # Both branches are walked even when empty to keep positions stable
+                self._execute_columnar_statements(statement.body, matched, loop, collection, result, state)
+                self._execute_columnar_statements(statement.orelse, unmatched, loop, collection, result, state)
+
+            elif not indices:
+                continue
+
+            elif isinstance(statement, Assign):
+                if loop.find(statement.target) is loop:
+                    field_name = statement.target[len(loop.variable) + 1:]
+                    targets = [index for index in indices if isinstance(collection[index], dict)]
+                    values = self._columnar_values(statement, targets, loop, collection)
+                    for index, value in zip(targets, values):
+                        collection[index][field_name] = value
+                    result['assignments'].set_column(loop.collection_name, field_name, targets, values)
+                else:
+                    # Only the last item's write survives
+                    index = indices[-1]
+                    value = self._resolve_loop_value(statement.value, self._bind_loop_item(loop, collection, index))
+                    current = state['scalars'].get(statement.target)
+                    if current is None or current[0] < (index, position):
+                        state['scalars'][statement.target] = ((index, position), value)
+
+            elif isinstance(statement, Error):
+                if statement.varies:
+                    for index in indices:
+                        message = self._error_message(statement, self._bind_loop_item(loop, collection, index))
+                        state['errors'].append((index, position, message))
+                else:
+                    message = self._error_message(statement, self._bind_loop_item(loop, collection, indices[0]))
+                    state['errors'].extend((index, position, message) for index in indices)
+
+    def _columnar_values(self, statement, indices, loop, collection) -> list:
+        """Values of an item field assignment for the items at indices"""
+        if not indices:
+            return []
+        if not statement.varies:
+            value = self._resolve_loop_value(statement.value, self._bind_loop_item(loop, collection, indices[0]))
+            return [value] * len(indices)
+        return [
+            self._resolve_loop_value(statement.value, self._bind_loop_item(loop, collection, index))
+            for index in indices
+        ]
+
+    @staticmethod
+    def _bind_loop_item(loop, collection, index):
+        loop.item = collection[index]
+        loop.index = index
+        return loop
+
+    def _parse_and_execute_regex(self, rule_definition: str) -> Dict[str, Any]:
+        """
+        Regex interpreter for rule definitions.
+        Fallback for rules the parser rejects (and RULE_ENGINE_PARSER=regex).
+        """
+        result = {
+            'assignments': RuleAssignments(),
             'errors': [],
             'warnings': []
         }
@@ -101,7 +508,7 @@ class SimpleRuleEngine:
         
         # Process ACTION calls
         action_matches = re.finditer(action_pattern, rule_text, re.IGNORECASE | re.DOTALL)
-        print(f"DEBUG: Looking for action calls in rule_text: {repr(rule_text)}")
+        logger.debug(f"Looking for action calls in rule_text: {repr(rule_text)}")
         
         action_found = False
         for match in action_matches:
@@ -111,8 +518,8 @@ class SimpleRuleEngine:
             params_str = match.group(3).strip()
             mappings_str = match.group(4).strip()
             
-            print(f"DEBUG: Found action call - Action: '{action_name}', Connector: '{connector_name}'")
-            print(f"DEBUG: Params: '{params_str}', Mappings: '{mappings_str}'")
+            logger.debug(f"Found action call - Action: '{action_name}', Connector: '{connector_name}'")
+            logger.debug(f"Params: '{params_str}', Mappings: '{mappings_str}'")
             
             # Track this span as processed
             processed_spans.append((match.start(), match.end()))
@@ -125,26 +532,25 @@ class SimpleRuleEngine:
             
             # Update with regular assignments
             if action_result and 'assignments' in result and result['assignments']:
-                print(f"DEBUG: Updating context with new assignments: {result['assignments']}")
+                logger.debug(f"Updating context with new assignments: {result['assignments']}")
                 for key, value in result['assignments'].items():
                     self.context[key] = value
                 context_updated = True
             
             # Update with temporary assignments
             if action_result and 'temp_assignments' in result and result['temp_assignments']:
-                print(f"DEBUG: Updating context with temporary assignments: {result['temp_assignments']}")
+                logger.debug(f"Updating context with temporary assignments: {result['temp_assignments']}")
                 for key, value in result['temp_assignments'].items():
                     self.context[key] = value
                 context_updated = True
             
             if context_updated:
-                print(f"DEBUG: Updated context now contains: {list(self.context.keys())}")
-                print(f"DEBUG: Full updated context: {self.context}")
+                logger.debug(f"Updated context now contains: {list(self.context.keys())}")
             else:
-                print(f"DEBUG: No assignments to update context with. action_result={bool(action_result)}, assignments={result.get('assignments', {})}, temp_assignments={result.get('temp_assignments', {})}")
+                logger.debug(f"No assignments to update context with. action_result={bool(action_result)}, assignments={result.get('assignments', {})}, temp_assignments={result.get('temp_assignments', {})}")
         
         if not action_found:
-            print(f"DEBUG: No action calls found in rule")
+            logger.debug("No action calls found in rule")
             # Add a log entry indicating no action was found
             if 'action_logs' not in result:
                 result['action_logs'] = []
@@ -199,7 +605,21 @@ class SimpleRuleEngine:
         return result
     
     def _evaluate_condition(self, condition: str) -> bool:
-        """Evaluate a condition string"""
+        """Evaluate a condition string (compiled once, see rule_dsl.compile_condition)"""
+        try:
+            predicate = compile_condition(condition)
+        except RuleSyntaxError as e:
+            # The text evaluator compares strings as strings and treats a bare
+            # operand as true, so its results can differ from compiled conditions
+            logger.warning(f"Evaluating condition {condition!r} without type-aware comparisons: {str(e)}")
+            return self._evaluate_condition_text(condition)
+        try:
+            return predicate(self.context, None)
+        except Exception:
+            return False
+
+    def _evaluate_condition_text(self, condition: str) -> bool:
+        """Evaluate a condition string by substituting attributes and splitting on the operator"""
         try:
             # Replace attribute placeholders with actual values
             resolved_condition = self._resolve_attributes(condition)
@@ -251,28 +671,26 @@ class SimpleRuleEngine:
                 result['errors'].append(f"FOR loop collection must be a list, got {type(collection).__name__}")
                 return
             
-            # Save original context for restoration
-            original_context = self.context.copy()
+            # Match the body's statements once, not per item
+            statements = []
+            for line in body.split('\n'):
+                line = line.strip()
+                if not line or line.startswith('//'):
+                    continue
+                statements.append((
+                    re.match(r'assign\s+(.+?)\s*=\s*(.+?)$', line, re.IGNORECASE),
+                    re.match(r'error\s+"([^"]+)"', line, re.IGNORECASE)
+                ))
             
             # Execute loop body for each item in collection
             for index, item in enumerate(collection):
-                # Create a temporary context with the loop variable
-                loop_context = original_context.copy()
-                
                 # Handle document assignments specially
                 if loop_var.startswith('@doc') and collection_expr == '{{documents}}':
                     # Set current document context for assignments
                     self._current_doc_index = index
                 
                 # Process assignments in loop body  
-                # Split body by lines to handle multi-line properly
-                for line in body.split('\n'):
-                    line = line.strip()
-                    if not line or line.startswith('//'):
-                        continue
-                    
-                    # Match assignment pattern
-                    assign_match = re.match(r'assign\s+(.+?)\s*=\s*(.+?)$', line, re.IGNORECASE)
+                for assign_match, error_match in statements:
                     if assign_match:
                         var_name = assign_match.group(1).strip()
                         var_value = assign_match.group(2).strip()
@@ -292,12 +710,9 @@ class SimpleRuleEngine:
                             result['assignments'][var_name] = resolved_value
                     
                     # Handle errors  
-                    error_match = re.match(r'error\s+"([^"]+)"', line, re.IGNORECASE)
                     if error_match:
                         error_msg = self._resolve_value_in_context(error_match.group(1), item, index)
                         result['errors'].append(error_msg)
-                
-                # All processing handled in the line loop above
             
             # Clean up
             if hasattr(self, '_current_doc_index'):
@@ -401,6 +816,16 @@ class SimpleRuleEngine:
                 print(f"  - custom_body_params: {parsed_params.get('body_params')}")
                 print(f"  - custom_path_params: {parsed_params.get('path_params')}")
 
+                # Stay within the caller's time budget
+                timeout = None
+                if self._calls_deadline is not None:
+                    remaining = self._calls_deadline - time.monotonic()
+                    if remaining <= 0:
+                        result['errors'].append(f"No time budget left for action '{action_name}'")
+                        return False
+                    if remaining < connector_service.timeout:
+                        timeout = round(remaining, 3)
+
                 action_result = connector_service.execute_action(
                     connector,
                     action,
@@ -411,7 +836,8 @@ class SimpleRuleEngine:
                     custom_path_params=parsed_params.get('path_params'),
                     workflow_execution=getattr(self, 'current_workflow_execution', None),
                     workflow_rule=getattr(self, 'current_workflow_rule', None),
-                    rule_execution=getattr(self, 'current_rule_execution', None)
+                    rule_execution=getattr(self, 'current_rule_execution', None),
+                    timeout=timeout
                 )
                 
                 print(f"DEBUG: Action execution result: {action_result}")
@@ -889,7 +1315,7 @@ class SimpleRuleEngine:
             value = self.context
             
             for key in keys:
-                if isinstance(value, dict):
+                if isinstance(value, Mapping):
                     value = value.get(key)
                 elif isinstance(value, list) and key.isdigit():
                     index = int(key)
@@ -912,6 +1338,88 @@ class SimpleRuleEngine:
         return if_count > close_count
 
 
+class RuleSetCache:
+    """
+    Per-process LRU of the active rules of a workflow at a trigger step
+
+    Entries map (workflow id, trigger step) to the rules in execution order,
+    each with its compiled form, tagged with the workflow's rules_version.
+    Saving or deleting a WorkflowRule drops the workflow's entries here and
+    bumps rules_version (see workflows.signals), which other processes notice
+    on their next lookup. Bulk queryset updates bypass the signals - call
+    invalidate() after those.
+
+    The cached WorkflowRule instances are shared by every thread and request
+    of the process: treat them as read-only, and re-fetch a rule before
+    changing and saving it.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._rule_sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, workflow_id, trigger_step):
+        """Return [(rule, compiled rule or None), ...] in execution order"""
+        from .models import Workflow
+
+        # The one query of a warm lookup. Read before the rules, so rules saved
+        # meanwhile leave the entry behind the stamp rather than ahead of it.
+        version = Workflow.objects.filter(pk=workflow_id).values_list('rules_version', flat=True).first()
+        key = (workflow_id, trigger_step)
+        if self.max_size > 0:
+            with self._lock:
+                entry = self._rule_sets.get(key)
+                if entry is not None and entry[0] == version:
+                    self._rule_sets.move_to_end(key)
+                    return entry[1]
+
+        # Load and compile outside the lock - concurrent misses just load twice
+        rule_set = self._load(workflow_id, trigger_step)
+        if self.max_size > 0 and version is not None:
+            with self._lock:
+                self._rule_sets[key] = (version, rule_set)
+                self._rule_sets.move_to_end(key)
+                while len(self._rule_sets) > self.max_size:
+                    self._rule_sets.popitem(last=False)
+        return rule_set
+
+    def _load(self, workflow_id, trigger_step):
+        from .models import WorkflowRule
+
+        rules = WorkflowRule.objects.filter(
+            workflow_id=workflow_id,
+            trigger_step=trigger_step,
+            is_active=True
+        ).order_by('execution_order')
+
+        rule_set = []
+        for rule in rules:
+            compiled = None
+            if rule.rule_definition and rule.rule_definition.strip():
+                try:
+                    compiled = compile_rule(rule.rule_definition)
+                except RuleSyntaxError:
+                    # Runs on the regex interpreter (see SimpleRuleEngine._parse_and_execute)
+                    pass
+            rule_set.append((rule, compiled))
+        return rule_set
+
+    def invalidate(self, workflow_id):
+        """Drop the cached rule sets of a workflow"""
+        with self._lock:
+            for key in [key for key in self._rule_sets if key[0] == workflow_id]:
+                del self._rule_sets[key]
+
+    def clear(self):
+        """Drop every cached rule set"""
+        with self._lock:
+            self._rule_sets.clear()
+
+
+rule_set_cache = RuleSetCache(getattr(settings, 'RULE_SET_CACHE_SIZE', 128))
+
+
 class WorkflowRuleService:
     """Service for executing workflow rules"""
     
@@ -920,20 +1428,17 @@ class WorkflowRuleService:
     
     def execute_workflow_rules(self, workflow_execution, trigger_step: int) -> List[Dict[str, Any]]:
         """Execute all active rules for a workflow at the specified trigger step"""
-        from .models import WorkflowRule, RuleExecution
+        from .models import RuleExecution
         
-        rules = WorkflowRule.objects.filter(
-            workflow=workflow_execution.workflow,
-            trigger_step=trigger_step,
-            is_active=True
-        ).order_by('execution_order')
+        # Cached per process, checked against the workflow's rules_version
+        rule_set = rule_set_cache.get(workflow_execution.workflow_id, trigger_step)
         
         results = []
         
         # Prepare context data
         context_data = self._prepare_context_data(workflow_execution)
         
-        for rule in rules:
+        for rule, compiled in rule_set:
             try:
                 # Create rule execution record first to get the ID for logging
                 rule_execution = RuleExecution.objects.create(
@@ -949,9 +1454,19 @@ class WorkflowRuleService:
                     context_data,
                     workflow_execution=workflow_execution,
                     workflow_rule=rule,
-                    rule_execution=rule_execution
+                    rule_execution=rule_execution,
+                    materialize_assignments=False,
+                    compiled=compiled
                 )
                 
+                # Apply rule assignments back to workflow execution
+                assignments = execution_result.get('result', {}).get('assignments')
+                if execution_result.get('success') and assignments:
+                    self._apply_assignments_to_workflow(workflow_execution, assignments)
+                if isinstance(assignments, RuleAssignments):
+                    # Loop field assignments become documents[i].field keys only for the record
+                    execution_result['result']['assignments'] = execution_result['assignments'] = assignments.to_dict()
+                
                 # Determine status
                 if execution_result['success']:
                     if execution_result['result'].get('errors'):
@@ -974,10 +1489,6 @@ class WorkflowRuleService:
                 rule_execution.execution_time_ms = execution_result.get('execution_time_ms')
                 rule_execution.save()
                 
-                # Apply rule assignments back to workflow execution
-                if execution_result.get('success') and execution_result.get('result', {}).get('assignments'):
-                    self._apply_assignments_to_workflow(workflow_execution, execution_result['result']['assignments'])
-                
                 results.append({
                     'rule_execution': rule_execution,
                     'result': execution_result
@@ -1003,7 +1514,11 @@ class WorkflowRuleService:
     def _apply_assignments_to_workflow(self, workflow_execution, assignments: Dict[str, Any]):
         """Apply rule assignments back to workflow execution context"""
         try:
-            print(f"DEBUG: Applying assignments to workflow: {assignments}")
+            # FOR loop field assignments still pending as columns (see RuleAssignments)
+            columns = getattr(assignments, 'columns', None) or {}
+            direct = assignments.direct_items() if isinstance(assignments, RuleAssignments) else assignments.items()
+            logger.debug(f"Applying {len(direct)} assignment(s) to workflow, "
+                         f"loop fields: { {name: list(fields) for name, fields in columns.items()} }")
             
             # Initialize step2_data if it doesn't exist
             if not workflow_execution.step2_data:
@@ -1019,7 +1534,21 @@ class WorkflowRuleService:
             # Apply assignments to the first document (or workflow context)
             document = workflow_execution.step2_data[0]
             
-            for field_name, field_value in assignments.items():
+            # Columns are written field by field in one pass over the documents
+            for collection_name, fields in columns.items():
+                for field_name, column in fields.items():
+                    if collection_name == 'documents':
+                        while len(workflow_execution.step2_data) < len(column):
+                            workflow_execution.step2_data.append({})
+                        for doc_index, field_value in enumerate(column):
+                            if field_value is not _UNSET:
+                                workflow_execution.step2_data[doc_index][field_name] = field_value
+                    else:
+                        for doc_index, field_value in enumerate(column):
+                            if field_value is not _UNSET:
+                                document[f'{collection_name}[{doc_index}].{field_name}'] = field_value
+            
+            for field_name, field_value in direct:
                 # Handle document-specific assignments (documents[0].field_name)
                 if field_name.startswith('documents[') and '].' in field_name:
                     # Extract index and field name from "documents[0].field_name"
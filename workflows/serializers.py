@@ -15,6 +15,7 @@ class WorkflowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Workflow
         fields = '__all__'
+        read_only_fields = ['rules_version']
     
     def get_rules_count(self, obj):
         return obj.rules.filter(is_active=True).count()
@@ -0,0 +1,25 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Workflow, WorkflowRule
+from .rule_engine_service import rule_set_cache
+
+
+@receiver(pre_save, sender=WorkflowRule)
+def remember_previous_workflow(sender, instance, **kwargs):
+    """Note the workflow the rule belongs to in the database, so moving it invalidates both workflows"""
+    instance._previous_workflow_id = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._previous_workflow_id = WorkflowRule.objects.filter(
+            pk=instance.pk
+        ).values_list('workflow_id', flat=True).first()
+
+
+@receiver(post_save, sender=WorkflowRule)
+@receiver(post_delete, sender=WorkflowRule)
+def invalidate_workflow_rule_sets(sender, instance, **kwargs):
+    """Drop this process's cached rule sets of the workflow and bump its rules_version for the others"""
+    workflow_ids = {instance.workflow_id, getattr(instance, '_previous_workflow_id', None)} - {None}
+    for workflow_id in workflow_ids:
+        rule_set_cache.invalidate(workflow_id)
+    Workflow.objects.filter(pk__in=workflow_ids).update(rules_version=F('rules_version') + 1)
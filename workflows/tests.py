@@ -0,0 +1,369 @@
+import threading
+import time
+from unittest import mock
+
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .management.commands.benchmark_rule_parser import SAMPLE_RULES, build_context, stub_action_call
+from .models import RuleExecution, Workflow, WorkflowExecution, WorkflowRule
+from .rule_dsl import CallBatch, compile_condition, compile_rule, parse_rule, RuleSyntaxError
+from .rule_engine_service import rule_set_cache, RuleAssignments, SimpleRuleEngine, WorkflowRuleService
+from .serializers import WorkflowSerializer
+
+DOCUMENT_LOOP_RULE = '''for (@doc in {{documents}}) {
+    if (@doc.document_id == "DOC1") {
+        assign @doc.document_status = "SKIPPED"
+        error "Skipped " + @doc.document_id
+    } else {
+        assign @doc.document_status = "CHECKED"
+        assign last_checked = @doc.document_id
+    }
+    assign @doc.invitee_name = {{customer_id}}
+}'''
+
+
+def run_both_paths(rule):
+    """(regex interpreter result, compiled rule result) of a rule on the same starting context"""
+    engine = SimpleRuleEngine()
+    engine._execute_action_call = stub_action_call
+    engine.context = build_context()
+    expected = engine._parse_and_execute_regex(rule)
+    engine.context = build_context()
+    actual = engine._execute_compiled(parse_rule(rule))
+    return expected, actual
+
+
+class RuleParserTests(SimpleTestCase):
+    """The compiled rule engine against the regex interpreter it replaces"""
+
+    def test_compiled_rules_match_the_regex_interpreter(self):
+        rules = {
+            name: SAMPLE_RULES[name]
+            for name in ('sample_document_check', 'sample_get_document', 'sample_structured_params')
+        }
+        rules['single_assignment'] = 'assign status = "OK"'
+        for name, rule in rules.items():
+            with self.subTest(rule=name):
+                expected, actual = run_both_paths(rule)
+                self.assertEqual(actual['assignments'], expected['assignments'])
+                self.assertEqual(actual['errors'], expected['errors'])
+
+    def test_compiled_rules_fix_regex_interpreter_quirks(self):
+        # The regex interpreter raises errors of if-blocks whose condition is false
+        expected, actual = run_both_paths(SAMPLE_RULES['sample_validation'])
+        self.assertEqual(expected['errors'], ['Customer ID is required', 'Stamp amount must be at least 100'])
+        self.assertEqual(actual['errors'], [])
+
+        # ...and reads an assignment value up to the closing brace of its block
+        expected, actual = run_both_paths(SAMPLE_RULES['sample_simple'])
+        self.assertEqual(dict(expected['assignments']), {'{{discount}}': '10 }'})
+        self.assertEqual(dict(actual['assignments']), {'{{discount}}': 10})
+
+        # ...and into the next statement
+        expected, actual = run_both_paths('assign status = "OK"\nassign count = 3')
+        self.assertEqual(dict(expected['assignments']), {'status': 'OK" assign count = 3'})
+        self.assertEqual(dict(actual['assignments']), {'status': 'OK', 'count': 3})
+
+        # ...and raises the error of a true if-block twice
+        expected, actual = run_both_paths('if ({{customer_id}} == "PREMIUM_CUSTOMER") {\n    error "premium"\n}')
+        self.assertEqual(expected['errors'], ['premium', 'premium'])
+        self.assertEqual(actual['errors'], ['premium'])
+
+    def test_rules_are_compiled_once(self):
+        rule = 'assign cached = "yes"'
+        self.assertIs(compile_rule(rule), compile_rule(rule))
+
+    def test_cached_syntax_errors_are_raised_fresh(self):
+        rule = 'assign x = 1\nif ({{x}} > 1) {'
+        errors = []
+        for _ in range(2):
+            with self.assertRaises(RuleSyntaxError) as raised:
+                compile_rule(rule)
+            errors.append(raised.exception)
+        self.assertIsNot(errors[0], errors[1])
+        self.assertEqual((str(errors[0]), errors[0].line), (str(errors[1]), errors[1].line))
+        self.assertIsNone(errors[1].__context__)
+
+    def test_unparseable_rules_run_on_the_regex_interpreter(self):
+        rule = 'if ({{stamp_amount}} > 100) {\n    assign big = "yes"\n'
+        with self.assertRaises(RuleSyntaxError):
+            parse_rule(rule)
+        engine = SimpleRuleEngine()
+        with mock.patch.object(engine, '_parse_and_execute_regex', return_value={'assignments': {}, 'errors': []}) as regex:
+            engine.execute_rule(rule, build_context())
+        regex.assert_called_once_with(rule)
+
+    @override_settings(RULE_ENGINE_PARSER='regex')
+    def test_parser_setting_selects_the_regex_interpreter(self):
+        engine = SimpleRuleEngine()
+        with mock.patch.object(engine, '_parse_and_execute_regex', return_value={'assignments': {}, 'errors': []}) as regex:
+            engine.execute_rule('assign x = 1', {})
+        regex.assert_called_once_with('assign x = 1')
+
+
+class ConditionSemanticsTests(SimpleTestCase):
+    """Typed comparisons of compiled conditions and the text fallback they replace"""
+
+    def setUp(self):
+        self.engine = SimpleRuleEngine()
+        self.engine.context = {'amount': '10', 'limit': '9', 'count': 10, 'flag': '', 'name': 'abc'}
+
+    def evaluate(self, condition):
+        return self.engine._evaluate_condition(condition)
+
+    def test_numeric_strings_compare_as_numbers(self):
+        self.assertFalse(self.evaluate('"10" < "9"'))
+        self.assertFalse(self.evaluate('{{amount}} < {{limit}}'))
+        self.assertTrue(self.evaluate('{{amount}} > 5'))
+
+    def test_number_equals_numeric_string(self):
+        self.assertTrue(self.evaluate('{{count}} == "10"'))
+        self.assertFalse(self.evaluate('{{count}} != "10"'))
+
+    def test_bare_operand_is_true_only_when_truthy(self):
+        self.assertFalse(self.evaluate('{{flag}}'))
+        self.assertTrue(self.evaluate('{{name}}'))
+
+    def test_is_null(self):
+        self.assertTrue(self.evaluate('{{flag}} is_null'))
+        self.assertFalse(self.evaluate('{{name}} is_null'))
+
+    def test_and_or_not(self):
+        self.assertTrue(self.evaluate('{{amount}} > 5 && {{name}} == "abc"'))
+        self.assertTrue(self.evaluate('{{flag}} || {{count}} >= 10'))
+        self.assertTrue(self.evaluate('!({{amount}} < 5)'))
+
+    def test_incomparable_types_are_false(self):
+        self.assertFalse(self.evaluate('{{name}} > 5'))
+
+    def test_text_evaluator_compares_strings_as_strings(self):
+        self.assertTrue(self.engine._evaluate_condition_text('"10" < "9"'))
+        self.assertTrue(self.engine._evaluate_condition_text('{{flag}}'))
+
+    def test_uncompilable_condition_falls_back_with_a_warning(self):
+        with self.assertRaises(RuleSyntaxError):
+            compile_condition('{{flag}} ||')
+        with self.assertLogs('workflows.rule_engine_service', level='WARNING') as logs:
+            # Text fallback: a bare operand is true whatever its value
+            self.assertTrue(self.evaluate('{{flag}} ||'))
+        self.assertIn('without type-aware comparisons', logs.output[0])
+
+
+TWO_CALL_RULE = '''call action "Slow" from connector "api" with {
+    "customer": "{{customer_id}}"
+} map response {
+    "id" to a_id
+}
+call action "Fast" from connector "api" with {
+    "customer": "{{customer_id}}"
+} map response {
+    "id" to b_id
+}'''
+
+
+class ConcurrentActionCallTests(SimpleTestCase):
+    """Independent action calls of a rule run at once but are applied in source order"""
+
+    def setUp(self):
+        self.engine = SimpleRuleEngine()
+        self.engine.context = build_context()
+        self.engine._execute_action_call = self.fake_action_call
+        self.delays = {'Slow': 0.2, 'Fast': 0}
+        self.completed = []
+        self.seen_params = {}
+        self.lock = threading.Lock()
+
+    def fake_action_call(self, action_name, connector_name, params_str, mappings_str, result):
+        """Maps every response field to f'{action_name}-id' after the action's delay"""
+        time.sleep(self.delays.get(action_name, 0))
+        self.seen_params[action_name] = self.engine._resolve_attributes(params_str)
+        for pair in mappings_str.split(','):
+            result['assignments'][pair.split(' to ', 1)[1].strip()] = f'{action_name}-id'
+        result['errors'].append(f'{action_name} warning')
+        result.setdefault('action_logs', []).append({'action_name': action_name, 'status': 'success'})
+        with self.lock:
+            self.completed.append(action_name)
+        return True
+
+    def test_independent_calls_are_applied_in_source_order(self):
+        compiled = parse_rule(TWO_CALL_RULE)
+        self.assertIsInstance(compiled.statements[0], CallBatch)
+
+        result = self.engine._execute_compiled(compiled)
+
+        self.assertEqual(self.completed, ['Fast', 'Slow'])
+        self.assertEqual(list(result['assignments'].items()), [('a_id', 'Slow-id'), ('b_id', 'Fast-id')])
+        self.assertEqual(result['errors'], ['Slow warning', 'Fast warning'])
+        self.assertEqual([log['action_name'] for log in result['action_logs']], ['Slow', 'Fast'])
+        self.assertEqual((self.engine.context['a_id'], self.engine.context['b_id']), ('Slow-id', 'Fast-id'))
+
+    def test_dependent_call_runs_after_the_call_it_reads(self):
+        rule = TWO_CALL_RULE.replace('"customer": "{{customer_id}}"\n} map response {\n    "id" to b_id',
+                                     '"customer": "{{a_id}}"\n} map response {\n    "id" to b_id')
+        compiled = parse_rule(rule)
+        self.assertNotIsInstance(compiled.statements[0], CallBatch)
+
+        self.engine._execute_compiled(compiled)
+
+        self.assertEqual(self.completed, ['Slow', 'Fast'])
+        self.assertIn('Slow-id', self.seen_params['Fast'])
+
+    @override_settings(RULE_ACTION_MAX_WORKERS=1)
+    def test_calls_run_in_order_without_workers(self):
+        self.engine._execute_compiled(parse_rule(TWO_CALL_RULE))
+        self.assertEqual(self.completed, ['Slow', 'Fast'])
+
+
+class ColumnarLoopTests(TestCase):
+    """FOR loops run column-wise against the same loops run item by item"""
+
+    def run_loop(self, columnar):
+        engine = SimpleRuleEngine()
+        engine.context = build_context()
+        compiled = parse_rule(DOCUMENT_LOOP_RULE)
+        self.assertTrue(compiled.statements[0].columnar)
+        compiled.statements[0].columnar = columnar
+        return engine._execute_compiled(compiled), engine.context['documents']
+
+    def test_columnar_loop_matches_per_item_loop(self):
+        columnar, columnar_documents = self.run_loop(True)
+        per_item, per_item_documents = self.run_loop(False)
+        self.assertTrue(columnar['assignments'].columns)
+        self.assertEqual(columnar['assignments'], per_item['assignments'])
+        self.assertEqual(columnar['errors'], per_item['errors'])
+        self.assertEqual(columnar_documents, per_item_documents)
+        self.assertEqual(
+            [document['document_status'] for document in columnar_documents],
+            ['CHECKED', 'SKIPPED', 'CHECKED', 'CHECKED', 'CHECKED'],
+        )
+        self.assertEqual(columnar['assignments']['last_checked'], 'DOC4')
+        self.assertEqual(columnar['errors'], ['Skipped DOC1'])
+
+    def test_columns_materialize_into_document_keys(self):
+        assignments = RuleAssignments(status='OK')
+        assignments.set_column('documents', 'document_status', [0, 2], ['A', 'C'])
+        self.assertTrue(assignments)
+        self.assertEqual(assignments, {
+            'status': 'OK',
+            'documents[0].document_status': 'A',
+            'documents[2].document_status': 'C',
+        })
+        self.assertEqual(assignments.columns, {})
+
+    def test_pending_columns_do_not_survive_clear(self):
+        assignments = RuleAssignments(status='OK')
+        assignments.set_column('documents', 'document_status', [1], ['B'])
+        self.assertEqual(dict(assignments.direct_items()), {'status': 'OK'})
+        self.assertTrue(assignments.columns)
+
+        assignments.clear()
+
+        self.assertFalse(assignments)
+        self.assertEqual(dict(assignments), {})
+        self.assertEqual(assignments.to_dict(), {})
+
+    def test_columns_are_written_back_to_workflow_documents(self):
+        workflow = Workflow.objects.create(name='Documents')
+        # Assignments of rules that raise errors are not applied, so this one has none
+        rule = DOCUMENT_LOOP_RULE.replace('        error "Skipped " + @doc.document_id\n', '')
+        WorkflowRule.objects.create(workflow=workflow, name='Check documents', rule_definition=rule, trigger_step=2)
+        execution = WorkflowExecution.objects.create(
+            workflow=workflow, customer_id='PREMIUM_CUSTOMER', step2_data=build_context()['documents'][:3]
+        )
+
+        WorkflowRuleService().execute_workflow_rules(execution, trigger_step=2)
+
+        execution.refresh_from_db()
+        self.assertEqual(
+            [(document['document_status'], document['invitee_name']) for document in execution.step2_data],
+            [('CHECKED', 'PREMIUM_CUSTOMER'), ('SKIPPED', 'PREMIUM_CUSTOMER'), ('CHECKED', 'PREMIUM_CUSTOMER')],
+        )
+        self.assertEqual(execution.step2_data[0]['last_checked'], 'DOC2')
+
+        # The stored result still lists loop fields as documents[i].field keys
+        rule_execution = RuleExecution.objects.get(workflow_execution=execution)
+        self.assertEqual(rule_execution.status, 'success')
+        assignments = rule_execution.execution_result['result']['assignments']
+        self.assertEqual(assignments['documents[1].document_status'], 'SKIPPED')
+        self.assertEqual(assignments['documents[2].invitee_name'], 'PREMIUM_CUSTOMER')
+
+
+class RuleSetCacheTests(TestCase):
+    """Per-process rule set cache and its rules_version stamp"""
+
+    def setUp(self):
+        rule_set_cache.clear()
+        self.workflow = Workflow.objects.create(name='Cached')
+        self.rule = WorkflowRule.objects.create(
+            workflow=self.workflow, name='Status', rule_definition='assign status = "OK"', trigger_step=2
+        )
+
+    def definitions(self):
+        return [rule.rule_definition for rule, _ in rule_set_cache.get(self.workflow.pk, 2)]
+
+    def test_warm_lookup_does_not_query_rules(self):
+        self.definitions()
+        with CaptureQueriesContext(connection) as queries:
+            rule_set = rule_set_cache.get(self.workflow.pk, 2)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('workflows_workflowrule', queries[0]['sql'])
+        self.assertIs(rule_set[0][1], compile_rule('assign status = "OK"'))
+
+    def test_saving_a_rule_invalidates(self):
+        self.definitions()
+        self.rule.rule_definition = 'assign status = "DONE"'
+        self.rule.save()
+        self.assertEqual(self.definitions(), ['assign status = "DONE"'])
+
+        WorkflowRule.objects.create(
+            workflow=self.workflow, name='Priority', rule_definition='assign priority = 1',
+            trigger_step=2, execution_order=2
+        )
+        self.assertEqual(self.definitions(), ['assign status = "DONE"', 'assign priority = 1'])
+
+    def test_deleting_a_rule_invalidates(self):
+        self.definitions()
+        self.rule.delete()
+        self.assertEqual(self.definitions(), [])
+
+    def test_moving_a_rule_invalidates_both_workflows(self):
+        other = Workflow.objects.create(name='Other')
+        self.definitions()
+        self.assertEqual(rule_set_cache.get(other.pk, 2), [])
+        versions = dict(Workflow.objects.values_list('pk', 'rules_version'))
+
+        self.rule.workflow = other
+        self.rule.save()
+
+        self.assertEqual(self.definitions(), [])
+        self.assertEqual([rule.pk for rule, _ in rule_set_cache.get(other.pk, 2)], [self.rule.pk])
+        self.assertEqual(dict(Workflow.objects.values_list('pk', 'rules_version')),
+                         {pk: version + 1 for pk, version in versions.items()})
+
+    def test_rules_version_is_read_only_in_the_api(self):
+        serializer = WorkflowSerializer(self.workflow, data={'name': 'Cached', 'rules_version': 0}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        self.assertNotIn('rules_version', serializer.validated_data)
+        self.assertTrue(WorkflowSerializer().fields['rules_version'].read_only)
+
+    def test_version_bump_from_another_process_reloads(self):
+        self.definitions()
+        # Another process saving the rule: no signal here, only the bumped version
+        WorkflowRule.objects.filter(pk=self.rule.pk).update(rule_definition='assign status = "REMOTE"')
+        self.assertEqual(self.definitions(), ['assign status = "OK"'])
+        Workflow.objects.filter(pk=self.workflow.pk).update(rules_version=F('rules_version') + 1)
+        self.assertEqual(self.definitions(), ['assign status = "REMOTE"'])
+
+    def test_stale_workflow_save_keeps_rules_version(self):
+        stale = Workflow.objects.get(pk=self.workflow.pk)
+        self.rule.save()
+        version = Workflow.objects.get(pk=self.workflow.pk).rules_version
+        self.assertEqual(version, stale.rules_version + 1)
+
+        stale.name = 'Renamed'
+        stale.save()
+        self.workflow.refresh_from_db()
+        self.assertEqual((self.workflow.name, self.workflow.rules_version), ('Renamed', version))